@@ -61,7 +61,7 @@ $(document).ready(function() {
       update_sendmail_count();
    });
 
-   $('input.mailcheckbox').change(function() {
+   $(document).on('change', 'input.mailcheckbox', function() {
       update_sendmail_count();
    });
 
@@ -86,7 +86,7 @@ $(document).ready(function() {
       update_assign_count();
    });
 
-   $('input.assigncheckbox').change(function() {
+   $(document).on('change', 'input.assigncheckbox', function() {
       update_assign_count();
    });
 
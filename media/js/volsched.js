@@ -125,6 +125,44 @@ function setup_datatable() {
 var allVolunteers;
 var is_admin;
 var regid;
+var scheduleVersion;
+
+function update_slots(data) {
+    $.each(data.slots, function(idx, slot) {
+        update_slot_info(slot, regid, is_admin, is_volunteer);
+    });
+    $.each(data.deleted, function(idx, slotid) {
+        $('tr.slot-row[data-slotid="' + slotid + '"]').remove();
+    });
+
+    if (data.full) {
+        /* Anything not in the full schedule has been deleted */
+        var slotids = data.slots.map(function(slot) { return slot.id; });
+        $('tr.slot-row').each(function(idx, row) {
+            if (!slotids.includes($(row).data('slotid')))
+                $(row).remove();
+        });
+    }
+}
+
+/*
+ * Apply a set of changed slots from the server, unless we have already seen
+ * a newer version (which can happen when a poll and an update cross).
+ */
+function apply_changes(data) {
+    if (!data.slots || data.version <= scheduleVersion)
+        return;
+    scheduleVersion = data.version;
+    update_slots(data);
+    if (data.stats)
+        update_stats(data.stats);
+}
+
+function poll_changes() {
+    $.get('api/', {'since': scheduleVersion}).success(function(data, status, xhr) {
+        apply_changes(data);
+    });
+}
 
 $(function() {
     setup_datatable();
@@ -138,9 +176,9 @@ $(function() {
             'op': op,
             'slotid': slotid,
             'volid': volid,
+            'since': scheduleVersion,
         }).success(function(data, status, xhr) {
-            update_slot_info(data.slot, regid, is_admin, is_volunteer);
-            update_stats(data.stats);
+            apply_changes(data);
         }).fail(function(xhr) {
             try {
                 alert('Failed to update volunteer schedule: ' + $.parseJSON(xhr.responseText).err);
@@ -160,10 +198,10 @@ $(function() {
             'op': 'add',
             'slotid': slotid,
             'volid': event.target.value,
+            'since': scheduleVersion,
             'dataType': 'json',
         }).success(function(data, status, xhr) {
-            update_slot_info(data.slot, regid, is_admin, is_volunteer);
-            update_stats(data.stats);
+            apply_changes(data);
         }).fail(function(xhr) {
             try {
                 alert('Failed to add volunteer: ' + $.parseJSON(xhr.responseText).err);
@@ -177,14 +215,16 @@ $(function() {
     });
 
     $.get('api/').success(function(data, status, xhr) {
-        $.each(data.slots, function(idx, slot) {
-            allVolunteers = data.volunteers;
-            is_admin = data.meta.isadmin;
-            is_volunteer = data.meta.isvolunteer;
-            regid = data.meta.regid;
-            update_slot_info(slot, regid, is_admin, is_volunteer);
-            update_stats(data.stats);
-        });
+        allVolunteers = data.volunteers;
+        is_admin = data.meta.isadmin;
+        is_volunteer = data.meta.isvolunteer;
+        regid = data.meta.regid;
+        scheduleVersion = data.version;
+        update_slots(data);
+        update_stats(data.stats);
+
+        /* Pick up changes made by others */
+        setInterval(poll_changes, 30000);
     }).fail(function(data, status, xhr) {
         alert('Failed to get volunteer slot data. Volunteer schedule will not work.');
     });
@@ -47,7 +47,7 @@ class ObjectAdmin(admin.ModelAdmin):
 
 
 class YearAdmin(admin.ModelAdmin):
-    readonly_fields = ('year',)
+    readonly_fields = ('year', 'lastseq', )
 
 
 admin.site.register(AccountClass, AccountClassAdmin)
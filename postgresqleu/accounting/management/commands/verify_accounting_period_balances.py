@@ -0,0 +1,44 @@
+#
+# Verify that the per-account period balances, which are maintained by
+# triggers and used for the accounting reports, match a full recomputation
+# from all the journal items.
+#
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from datetime import time
+
+from postgresqleu.accounting.util import get_period_balance_mismatches, rebuild_period_balances
+
+
+class Command(BaseCommand):
+    help = 'Verify accounting period balances'
+
+    class ScheduledJob:
+        scheduled_times = [time(3, 17), ]
+        internal = True
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Rebuild the period balances if they do not match')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        mismatches = get_period_balance_mismatches()
+        if not mismatches:
+            return
+
+        for m in mismatches:
+            self.stdout.write("Year {0}, period {1}, account {2}: closed {3} (stored {4}), open {5} (stored {6}), items {7}/{8} (stored {9}/{10})".format(
+                m['year'], m['period'], m['account'],
+                m['computed_closed'], m['stored_closed'],
+                m['computed_open'], m['stored_open'],
+                m['computed_closedcount'], m['computed_opencount'],
+                m['stored_closedcount'], m['stored_opencount'],
+            ))
+
+        if options['rebuild']:
+            rebuild_period_balances()
+            self.stdout.write("Period balances rebuilt.")
+        else:
+            raise CommandError("{0} accounting period balances do not match the journal. Run with --rebuild to fix.".format(len(mismatches)))
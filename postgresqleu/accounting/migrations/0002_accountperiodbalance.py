@@ -0,0 +1,117 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountPeriodBalance',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of month')),
+                ('closedamount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('openamount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('closedcount', models.IntegerField(default=0)),
+                ('opencount', models.IntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounting.account', to_field='num')),
+                ('year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounting.year')),
+            ],
+            options={
+                'unique_together': {('year', 'period', 'account')},
+            },
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION accounting_adjust_period_balance(_year int, _date date, _account int, _closed boolean, _amount numeric, _count int) RETURNS void AS $$
+INSERT INTO accounting_accountperiodbalance (year_id, period, account_id, closedamount, openamount, closedcount, opencount)
+VALUES (_year, date_trunc('month', _date)::date, _account,
+        CASE WHEN _closed THEN _amount ELSE 0 END,
+        CASE WHEN _closed THEN 0 ELSE _amount END,
+        CASE WHEN _closed THEN _count ELSE 0 END,
+        CASE WHEN _closed THEN 0 ELSE _count END)
+ON CONFLICT (year_id, period, account_id) DO UPDATE SET
+        closedamount=accounting_accountperiodbalance.closedamount+EXCLUDED.closedamount,
+        openamount=accounting_accountperiodbalance.openamount+EXCLUDED.openamount,
+        closedcount=accounting_accountperiodbalance.closedcount+EXCLUDED.closedcount,
+        opencount=accounting_accountperiodbalance.opencount+EXCLUDED.opencount
+$$ LANGUAGE sql
+            """,
+            "DROP FUNCTION accounting_adjust_period_balance(int, date, int, boolean, numeric, int)",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION accounting_journalitem_period_balance() RETURNS trigger AS $$
+BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                PERFORM accounting_adjust_period_balance(je.year_id, je.date, OLD.account_id, je.closed, -OLD.amount, -1)
+                   FROM accounting_journalentry je WHERE je.id=OLD.journal_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM accounting_adjust_period_balance(je.year_id, je.date, NEW.account_id, je.closed, NEW.amount, 1)
+                   FROM accounting_journalentry je WHERE je.id=NEW.journal_id;
+        END IF;
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION accounting_journalitem_period_balance()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER accounting_journalitem_period_balance_trigger
+AFTER INSERT OR UPDATE OR DELETE ON accounting_journalitem
+FOR EACH ROW EXECUTE FUNCTION accounting_journalitem_period_balance()
+            """,
+            "DROP TRIGGER accounting_journalitem_period_balance_trigger ON accounting_journalitem",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION accounting_journalentry_period_balance() RETURNS trigger AS $$
+BEGIN
+        PERFORM accounting_adjust_period_balance(OLD.year_id, OLD.date, account_id, OLD.closed, -sum(amount), -count(*)::int)
+           FROM accounting_journalitem WHERE journal_id=OLD.id GROUP BY account_id;
+        PERFORM accounting_adjust_period_balance(NEW.year_id, NEW.date, account_id, NEW.closed, sum(amount), count(*)::int)
+           FROM accounting_journalitem WHERE journal_id=NEW.id GROUP BY account_id;
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION accounting_journalentry_period_balance()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER accounting_journalentry_period_balance_trigger
+AFTER UPDATE OF year_id, date, closed ON accounting_journalentry
+FOR EACH ROW
+WHEN (OLD.year_id IS DISTINCT FROM NEW.year_id OR OLD.date IS DISTINCT FROM NEW.date OR OLD.closed IS DISTINCT FROM NEW.closed)
+EXECUTE FUNCTION accounting_journalentry_period_balance()
+            """,
+            "DROP TRIGGER accounting_journalentry_period_balance_trigger ON accounting_journalentry",
+        ),
+
+        migrations.RunSQL(
+            """
+INSERT INTO accounting_accountperiodbalance (year_id, period, account_id, closedamount, openamount, closedcount, opencount)
+SELECT je.year_id, date_trunc('month', je.date)::date, ji.account_id,
+       COALESCE(sum(ji.amount) FILTER (WHERE je.closed), 0),
+       COALESCE(sum(ji.amount) FILTER (WHERE NOT je.closed), 0),
+       count(*) FILTER (WHERE je.closed),
+       count(*) FILTER (WHERE NOT je.closed)
+FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON je.id=ji.journal_id
+GROUP BY je.year_id, date_trunc('month', je.date), ji.account_id
+            """,
+            "",
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounting', '0002_accountperiodbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='year',
+            name='lastseq',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            "UPDATE accounting_year y SET lastseq=COALESCE((SELECT max(seq) FROM accounting_journalentry e WHERE e.year_id=y.year), 0)",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -65,6 +65,8 @@ class Account(models.Model):
 class Year(models.Model):
     year = models.IntegerField(primary_key=True)
     isopen = models.BooleanField(null=False, blank=False)
+    # Last journal entry number used in the year, see allocate_journal_seq()
+    lastseq = models.IntegerField(null=False, blank=False, default=0)
 
     def __str__(self):
         if self.isopen:
@@ -139,3 +141,19 @@ class JournalUrl(models.Model):
 
     def __str__(self):
         return self.url
+
+
+class AccountPeriodBalance(models.Model):
+    # Sum of all journal items per account and month, kept separately for
+    # closed and open entries. This table is maintained by triggers on the
+    # journal tables, and should never be modified from the application.
+    year = models.ForeignKey(Year, null=False, blank=False, on_delete=models.CASCADE)
+    period = models.DateField(null=False, blank=False, help_text="First day of month")
+    account = models.ForeignKey(Account, to_field='num', null=False, blank=False, on_delete=models.CASCADE)
+    closedamount = models.DecimalField(max_digits=12, decimal_places=2, null=False, blank=False, default=0)
+    openamount = models.DecimalField(max_digits=12, decimal_places=2, null=False, blank=False, default=0)
+    closedcount = models.IntegerField(null=False, blank=False, default=0)
+    opencount = models.IntegerField(null=False, blank=False, default=0)
+
+    class Meta:
+        unique_together = (('year', 'period', 'account'), )
@@ -3,13 +3,13 @@
 #
 
 from django.db import connection, transaction
-from django.db.models import Max
 from django.conf import settings
 
 from decimal import Decimal
 
 from postgresqleu.mailqueue.util import send_simple_mail
 from postgresqleu.util.time import today_global
+from postgresqleu.util.db import exec_to_dict, exec_no_result, exec_to_scalar
 
 from .models import JournalEntry, JournalItem, JournalUrl
 from .models import Object, Account, Year
@@ -29,25 +29,49 @@ def create_accounting_entry(items,
     # Entries must be balanced unless leaveopen is set to True
     # Any urls listed in urllist must exist and be correct, no verification
     # is done.
+    entries = create_accounting_entries([(items, leaveopen, urllist), ])
+    if entries:
+        return entries[0]
+    return None
+
+
+def create_accounting_entries(entries):
+    # Create multiple accounting entries in one go. entries must be an
+    # array of tuples in the format (items, leaveopen, urllist), with the
+    # same meaning as the parameters to create_accounting_entry(). All
+    # accounts and objects are looked up once for the whole batch, and all
+    # entries, items and urls inserted in one statement each.
+    # Either all entries are created or, if any of them is invalid, none.
+    # Returns the list of created entries in the same order.
 
     if not settings.ENABLE_AUTO_ACCOUNTING:
-        return
+        return None
 
     date = today_global()
 
     sid = transaction.savepoint()
     try:
         # Start by some simple validation
-        for r in items:
-            if r[2] == 0:
-                raise AccountingException("Submitted accounting journal entry has a zero sum entry!")
-            if Decimal(r[2]).as_tuple().exponent < -2:
-                raise AccountingException("Submitted accounting journal entry has items that are not rounded off to two decimal points ({0})!".format(r[2]))
-
-        debitsum = sum([r[2] for r in items if r[2] > 0])
-        creditsum = -sum([r[2] for r in items if r[2] < 0])
-        if debitsum != creditsum and not leaveopen:
-            raise AccountingException("Submitted accounting journal entry is not balanced!")
+        for items, leaveopen, urllist in entries:
+            for r in items:
+                if r[2] == 0:
+                    raise AccountingException("Submitted accounting journal entry has a zero sum entry!")
+                if Decimal(r[2]).as_tuple().exponent < -2:
+                    raise AccountingException("Submitted accounting journal entry has items that are not rounded off to two decimal points ({0})!".format(r[2]))
+
+            debitsum = sum([r[2] for r in items if r[2] > 0])
+            creditsum = -sum([r[2] for r in items if r[2] < 0])
+            if debitsum != creditsum and not leaveopen:
+                raise AccountingException("Submitted accounting journal entry is not balanced!")
+
+        accounts = {a.num: a for a in Account.objects.filter(num__in=set(r[0] for items, leaveopen, urllist in entries for r in items))}
+        objects = {o.name: o for o in Object.objects.filter(name__in=set(r[3] for items, leaveopen, urllist in entries for r in items if r[3]))}
+        for items, leaveopen, urllist in entries:
+            for accountnum, description, amount, objectname in items:
+                if int(accountnum) not in accounts:
+                    raise AccountingException("Account %s does not exist!" % accountnum)
+                if objectname and objectname not in objects:
+                    raise AccountingException("Object %s does not exist!" % objectname)
 
         try:
             year = Year.objects.get(year=date.year)
@@ -72,58 +96,57 @@ and the year manually!
         if not year.isopen:
             # If the year exists but is closed, then it's actually an error.
             raise AccountingException("Year %s is not open for new entries!" % date.year)
-        seq = JournalEntry.objects.filter(year=year).aggregate(Max('seq'))['seq__max']
-        if seq is None:
-            seq = 0
-
-        # We assume the rest is correct and start building the db entries,
-        # since we'll just roll it back if referenced data is missing.
-
-        entry = JournalEntry(year=year, seq=seq + 1, date=date, closed=False)
-        entry.save()
-
-        for accountnum, description, amount, objectname in items:
-            try:
-                account = Account.objects.get(num=accountnum)
-                if objectname:
-                    obj = Object.objects.get(name=objectname)
-                else:
-                    obj = None
-                JournalItem(journal=entry,
-                            account=account,
-                            amount=amount,
-                            object=obj,
-                            description=description[:200]).save()
-            except Account.DoesNotExist:
-                raise AccountingException("Account %s does not exist!" % accountnum)
-            except Object.DoesNotExist:
-                raise AccountingException("Object %s does not exist!" % objectname)
 
-        # If there are any URLs to attach, do so now
-        if urllist:
-            for url in urllist:
-                JournalUrl(journal=entry, url=url).save()
+        # Entries are created directly in their final state, since we
+        # verified above that the closed ones are balanced.
+        firstseq = allocate_journal_seq(year, len(entries))
+        journalentries = JournalEntry.objects.bulk_create([
+            JournalEntry(year=year, seq=firstseq + n, date=date, closed=not leaveopen)
+            for n, (items, leaveopen, urllist) in enumerate(entries)
+        ])
+
+        JournalItem.objects.bulk_create([
+            JournalItem(journal=entry,
+                        account=accounts[int(accountnum)],
+                        amount=amount,
+                        object=objects[objectname] if objectname else None,
+                        description=description[:200])
+            for entry, (items, leaveopen, urllist) in zip(journalentries, entries)
+            for accountnum, description, amount, objectname in items
+        ])
 
-        # All items saved correct. Close the entry if we have to. We verified
-        # above that it's valid...
-        if not leaveopen:
-            entry.closed = True
-            entry.save()
+        # If there are any URLs to attach, do so now
+        JournalUrl.objects.bulk_create([
+            JournalUrl(journal=entry, url=url)
+            for entry, (items, leaveopen, urllist) in zip(journalentries, entries)
+            for url in (urllist or [])
+        ])
 
         # Ok, it seems it worked...
         transaction.savepoint_commit(sid)
 
-        return entry
+        return journalentries
     except Exception as e:
         transaction.savepoint_rollback(sid)
         raise
 
 
+def allocate_journal_seq(year, num=1):
+    # Allocate num consecutive journal entry numbers in the year, returning
+    # the first one. The counter row for the year stays locked until the
+    # transaction ends, so concurrent allocations are serialized.
+    return exec_to_scalar("UPDATE accounting_year SET lastseq=lastseq+%(num)s WHERE year=%(year)s RETURNING lastseq", {
+        'num': num,
+        'year': year.year,
+    }) - num + 1
+
+
 def get_latest_account_balance(accountid):
     # Start from the year with the first incoming balance (meaning that the previous year
     # was closed and it was transferred) and sum up all accounting entries for the specified
     # account since then. We intentionally include open items, so we can track pending transfers
-    # between the banks.
+    # between the banks. The sums are read from the period balance table, so we don't
+    # have to look at every journal item.
     cursor = connection.cursor()
 
     cursor.execute("""WITH incoming_balance(incoming_year, incoming_amount) AS (
@@ -131,10 +154,10 @@ def get_latest_account_balance(accountid):
   UNION ALL VALUES (0,0)
   ORDER BY year_id DESC LIMIT 1
 )
-SELECT sum(amount)+COALESCE((SELECT incoming_amount FROM incoming_balance),0)
- FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON ji.journal_id=je.id
+SELECT sum(closedamount+openamount)+COALESCE((SELECT incoming_amount FROM incoming_balance),0)
+ FROM accounting_accountperiodbalance
   WHERE account_id=%(account)s
-   AND  je.year_id >= (SELECT incoming_year FROM incoming_balance)""",
+   AND  year_id >= (SELECT incoming_year FROM incoming_balance)""",
                    {
                        'account': accountid,
                    })
@@ -144,3 +167,40 @@ SELECT sum(amount)+COALESCE((SELECT incoming_amount FROM incoming_balance),0)
 
 def get_account_choices():
     return [(a.num, str(a)) for a in Account.objects.all()]
+
+
+# Full recomputation of the period balances from the journal, in the same format as
+# the accounting_accountperiodbalance table that is maintained by triggers.
+_period_balance_query = """SELECT je.year_id, date_trunc('month', je.date)::date AS period, ji.account_id,
+       COALESCE(sum(ji.amount) FILTER (WHERE je.closed), 0) AS closedamount,
+       COALESCE(sum(ji.amount) FILTER (WHERE NOT je.closed), 0) AS openamount,
+       count(*) FILTER (WHERE je.closed) AS closedcount,
+       count(*) FILTER (WHERE NOT je.closed) AS opencount
+FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON je.id=ji.journal_id
+GROUP BY je.year_id, date_trunc('month', je.date), ji.account_id"""
+
+
+def get_period_balance_mismatches():
+    # Compare the period balance table with a full recomputation from the journal
+    # items, and return all rows that differ. Rows that sum up to zero are considered
+    # the same as missing rows.
+    return exec_to_dict("""WITH computed AS (
+{}
+)
+SELECT COALESCE(c.year_id, b.year_id) AS year, COALESCE(c.period, b.period) AS period, COALESCE(c.account_id, b.account_id) AS account,
+       c.closedamount AS computed_closed, b.closedamount AS stored_closed,
+       c.openamount AS computed_open, b.openamount AS stored_open,
+       c.closedcount AS computed_closedcount, b.closedcount AS stored_closedcount,
+       c.opencount AS computed_opencount, b.opencount AS stored_opencount
+FROM computed c
+FULL OUTER JOIN accounting_accountperiodbalance b ON b.year_id=c.year_id AND b.period=c.period AND b.account_id=c.account_id
+WHERE (COALESCE(c.closedamount, 0), COALESCE(c.openamount, 0), COALESCE(c.closedcount, 0), COALESCE(c.opencount, 0))
+  IS DISTINCT FROM (COALESCE(b.closedamount, 0), COALESCE(b.openamount, 0), COALESCE(b.closedcount, 0), COALESCE(b.opencount, 0))
+ORDER BY 1, 2, 3""".format(_period_balance_query))
+
+
+def rebuild_period_balances():
+    # Lock out any concurrent updates from the triggers while we rebuild
+    exec_no_result("LOCK TABLE accounting_accountperiodbalance IN EXCLUSIVE MODE")
+    exec_no_result("DELETE FROM accounting_accountperiodbalance")
+    exec_no_result("INSERT INTO accounting_accountperiodbalance (year_id, period, account_id, closedamount, openamount, closedcount, opencount)\n{}".format(_period_balance_query))
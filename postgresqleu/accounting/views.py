@@ -2,11 +2,10 @@ from django.http import HttpResponseRedirect, Http404, HttpResponse
 from django.contrib import messages
 from django.shortcuts import render, get_object_or_404
 from django.forms.models import inlineformset_factory
-from django.db.models import Max
 from django.db import connection, transaction
 from django.core.paginator import Paginator
 
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 
 from postgresqleu.util.request import get_int_or_error
 from postgresqleu.util.auth import authenticate_backend_group
@@ -16,6 +15,7 @@ from .models import JournalEntry, JournalItem, JournalUrl, Year, Object
 from .models import IncomingBalance, Account
 from .forms import JournalEntryForm, JournalItemForm, JournalItemFormset, JournalUrlForm
 from .forms import CloseYearForm
+from .util import allocate_journal_seq
 
 
 def index(request):
@@ -120,10 +120,7 @@ def new(request, year):
         d = date(year, 1, 1)
 
     year = get_object_or_404(Year, year=year)
-    highseq = JournalEntry.objects.filter(year=year).aggregate(Max('seq'))['seq__max']
-    if highseq is None:
-        highseq = 0
-    entry = JournalEntry(year=year, seq=highseq + 1, date=d, closed=False)
+    entry = JournalEntry(year=year, seq=allocate_journal_seq(year), date=d, closed=False)
     entry.save()
 
     # Disable any search query to make sure we can actually see
@@ -203,9 +200,53 @@ def entry(request, entryid):
         })
 
 
+def _get_period_query(objstr=''):
+    # Get the closed and open amounts, and the number of closed and open items,
+    # per account for the year up until and including the end date. Whole months
+    # are read from the period balance table, and only the days of the last month
+    # that are not fully covered are summed from the journal items. The period
+    # balances are not tracked per object, so if filtering on object we have to
+    # sum it all up from the journal items.
+    q = """SELECT accountnum, sum(closedamount) AS closedamount, sum(openamount) AS openamount, sum(closedcount) AS closedcount, sum(opencount) AS opencount FROM (
+ SELECT ji.account_id AS accountnum, sum(ji.amount) FILTER (WHERE je.closed) AS closedamount, sum(ji.amount) FILTER (WHERE NOT je.closed) AS openamount, count(*) FILTER (WHERE je.closed) AS closedcount, count(*) FILTER (WHERE NOT je.closed) AS opencount
+ FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON ji.journal_id=je.id
+ WHERE je.year_id=%(year)s AND je.date <= %(enddate)s """ + objstr
+    if objstr:
+        q += """
+ GROUP BY ji.account_id"""
+    else:
+        q += """ AND je.date >= %(partialstart)s
+ GROUP BY ji.account_id
+ UNION ALL
+ SELECT account_id, closedamount, openamount, closedcount, opencount
+ FROM accounting_accountperiodbalance
+ WHERE year_id=%(year)s AND period < %(partialstart)s"""
+    q += """
+) p GROUP BY accountnum"""
+    return q
+
+
+def _get_period_params(year, enddate, **kwargs):
+    # Everything before partialstart, which is always the first day of a month, is
+    # read from the period balance table.
+    nextday = enddate + timedelta(days=1)
+    if nextday.day == 1:
+        partialstart = nextday
+    else:
+        partialstart = enddate.replace(day=1)
+
+    params = {
+        'year': year.year,
+        'enddate': enddate,
+        'partialstart': partialstart,
+    }
+    params.update(kwargs)
+    return params
+
+
 def _get_balance_query(objstr='', includeopen=False):
     q = """WITH currentyear AS (
- SELECT account_id AS accountnum, sum(amount) FILTER (WHERE je.closed) as closedamount, sum(amount) FILTER (WHERE NOT je.closed) as openamount FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON ji.journal_id=je.id WHERE je.year_id=%(year)s AND je.date <= %(enddate)s """ + objstr + """ GROUP BY account_id
+ """ + _get_period_query(objstr) + """
 ),incoming AS (
  SELECT account_id AS accountnum, amount FROM accounting_incomingbalance WHERE year_id=%(year)s
 ), fullbalance AS (
@@ -324,7 +365,7 @@ def closeyear(request, year):
     # the recalculations required specifically to the balancenegative
     # field.
     curs.execute("""WITH currentyear AS (
- SELECT account_id AS accountnum, sum(amount) as amount FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON ji.journal_id=je.id WHERE je.year_id=%(year)s AND je.date <= %(enddate)s AND je.closed GROUP BY account_id
+ SELECT accountnum, closedamount AS amount FROM (""" + _get_period_query() + """) p
 ), incoming AS (
  SELECT account_id AS accountnum, amount FROM accounting_incomingbalance WHERE year_id=%(year)s
 ), fullbalance AS (
@@ -339,12 +380,9 @@ SELECT ac.name AS acname, ag.name AS agname, anum, a.name,
  sum(currentamount) over () as currenttotal,
  sum((incomingamount+currentamount)) over () as outgoingtotal
  FROM accounting_accountclass ac INNER JOIN accounting_accountgroup ag ON ac.id=ag.accountclass_id INNER JOIN accounting_account a ON ag.id=a.group_id INNER JOIN fullbalance ON fullbalance.anum=a.num WHERE ac.inbalance AND (incomingamount != 0 OR currentamount != 0) ORDER BY anum
-        """, {
-        'year': year.year,
-        'enddate': date(year.year, 12, 31),
-        })
+        """, _get_period_params(year, date(year.year, 12, 31)))
     balance = [dict(list(zip([col[0] for col in curs.description], row))) for row in curs.fetchall()]
-    curs.execute("SELECT sum(-amount) FROM accounting_journalitem ji INNER JOIN accounting_journalentry je ON ji.journal_id=je.id INNER JOIN accounting_account a ON ji.account_id=a.num INNER JOIN accounting_accountgroup ag ON ag.id=a.group_id INNER JOIN accounting_accountclass ac ON ac.id=ag.accountclass_id WHERE je.year_id=%(year)s AND NOT inbalance", {
+    curs.execute("SELECT sum(-(closedamount+openamount)) FROM accounting_accountperiodbalance pb INNER JOIN accounting_account a ON pb.account_id=a.num INNER JOIN accounting_accountgroup ag ON ag.id=a.group_id INNER JOIN accounting_accountclass ac ON ac.id=ag.accountclass_id WHERE pb.year_id=%(year)s AND NOT inbalance", {
         'year': year.year,
     })
     yearresult = curs.fetchall()[0][0]
@@ -371,7 +409,7 @@ SELECT ac.name AS acname, ag.name AS agname, anum, a.name,
                                     ).save()
             # Then close the year
             year.isopen = False
-            year.save()
+            year.save(update_fields=['isopen'])
 
             return HttpResponseRedirect('/accounting/%s/' % year.year)
     else:
@@ -487,24 +525,21 @@ def report(request, year, reporttype):
         # We only show accounts that have had some transactions on them.
         # Note! Probably sync up much of this query with the object report!
         (results, totalresult) = _collate_results(
-            """WITH t AS (
+            """WITH p AS (
+{0}
+), t AS (
 SELECT ac.name as acname,
        ag.name as agname,
        ag.foldable,
        a.num as anum,
        a.name,
-       sum(-ji.amount) as amount
+       -(COALESCE(p.closedamount, 0) + CASE WHEN %(includeopen)s THEN COALESCE(p.openamount, 0) ELSE 0 END) as amount
 FROM accounting_accountclass ac
 INNER JOIN accounting_accountgroup ag ON ac.id=ag.accountclass_id
 INNER JOIN accounting_account a ON ag.id=a.group_id
-INNER JOIN accounting_journalitem ji ON ji.account_id=a.num
-INNER JOIN accounting_journalentry je ON je.id=ji.journal_id
-WHERE je.year_id=%(year)s
-  AND je.date <= %(enddate)s
-  AND (je.closed or %(includeopen)s)
+INNER JOIN p ON p.accountnum=a.num
+WHERE (p.closedcount > 0 OR (%(includeopen)s AND p.opencount > 0))
   AND NOT ac.inbalance
-{0}
-GROUP BY ac.name, ag.name, ag.foldable, a.id, a.name
 )
 SELECT acname,
        agname,
@@ -516,12 +551,8 @@ SELECT acname,
        amount,
        sum(amount) OVER ()
 FROM t
-ORDER BY anum""".format(objstr),
-            {
-                'year': year.year,
-                'enddate': enddate,
-                'includeopen': includeopen,
-            },
+ORDER BY anum""".format(_get_period_query(objstr)),
+            _get_period_params(year, enddate, includeopen=includeopen),
             1
         )
         title = 'Results report'
@@ -544,10 +575,8 @@ ORDER BY anum""".format(objstr),
         else:
             valheaders = ['Incoming', 'Period', 'Outgoing']
         (results, totalresult) = _collate_results(
-            _get_balance_query(objstr, includeopen), {
-                'year': year.year,
-                'enddate': enddate,
-            },
+            _get_balance_query(objstr, includeopen),
+            _get_period_params(year, enddate),
             len(valheaders)
         )
         title = 'Balance report'
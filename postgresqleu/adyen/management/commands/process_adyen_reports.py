@@ -23,7 +23,7 @@ from decimal import Decimal
 
 from postgresqleu.adyen.models import AdyenLog, Report, TransactionStatus
 from postgresqleu.mailqueue.util import send_simple_mail
-from postgresqleu.accounting.util import create_accounting_entry
+from postgresqleu.accounting.util import create_accounting_entry, create_accounting_entries
 from postgresqleu.invoices.util import is_managed_bank_account
 from postgresqleu.invoices.util import register_pending_bank_matcher
 
@@ -94,62 +94,78 @@ class Command(BaseCommand):
         method = report.paymentmethod
         pm = method.get_implementation()
 
+        # SentForSettle is what we call capture, so we track that
+        # Settled is when we actually receive the money
+        # Changes in Sep 2015 means Settled is sometimes SettledBulk
+        # Everything else we ignore
         sio = io.StringIO(report.contents)
-        reader = csv.DictReader(sio, delimiter=',')
-        for line in reader:
-            # SentForSettle is what we call capture, so we track that
-            # Settled is when we actually receive the money
-            # Changes in Sep 2015 means Settled is sometimes SettledBulk
-            # Everything else we ignore
-            if line['Record Type'] == 'SentForSettle' or line['Record Type'] == 'Settled' or line['Record Type'] == 'SettledBulk':
-                # Find the actual payment
-                pspref = line['Psp Reference']
-                bookdate = line['Booking Date']
-                try:
-                    trans = TransactionStatus.objects.get(pspReference=pspref, paymentmethod=method)
-                except TransactionStatus.DoesNotExist:
-                    # Yes, for now we rollback the whole processing of this one
-                    raise Exception('Transaction %s not found!' % pspref)
-                if line['Record Type'] == 'SentForSettle':
-                    # If this is a POS transaction, it typically received a
-                    # separate CAPTURE notification, in which case the capture
-                    # date is already set. But if not, we'll set it to the
-                    # sent for settle date.
-                    if not trans.capturedat:
-                        trans.capturedat = bookdate
-                        trans.method = line['Payment Method']
-                        trans.save()
-                        AdyenLog(message='Transaction %s captured at %s' % (pspref, bookdate), error=False, paymentmethod=method).save()
-                        if self.verbose:
-                            self.stdout.write("Sent for settle on {0}".format(pspref))
-                elif line['Record Type'] in ('Settled', 'SettledBulk'):
-                    if trans.settledat is not None:
-                        # Transaction already settled. But we might be reprocessing
-                        # the report, so verify if the previously settled one is
-                        # *identical*.
-                        if trans.settledamount == Decimal(line['Main Amount']).quantize(Decimal('0.01')):
-                            self.stderr.write("Transaction {0} already settled at {1}, ignoring (NOT creating accounting record)!".format(pspref, trans.settledat))
-                            continue
-                        else:
-                            raise CommandError('Transaction {0} settled more than once with a different amount?!'.format(pspref))
-                    if not trans.capturedat:
-                        trans.capturedat = bookdate
-
-                    trans.settledat = bookdate
-                    trans.settledamount = Decimal(line['Main Amount']).quantize(Decimal('0.01'))
-                    trans.save()
+        lines = [line for line in csv.DictReader(sio, delimiter=',') if line['Record Type'] in ('SentForSettle', 'Settled', 'SettledBulk')]
+
+        # Settlement reports can be very large, so we look up all the
+        # transactions at once, process all the lines in memory, and then
+        # write back all the changes in bulk at the end. If anything fails,
+        # the whole report is rolled back as before.
+        transactions = {t.pspReference: t for t in TransactionStatus.objects.filter(
+            paymentmethod=method,
+            pspReference__in=set(line['Psp Reference'] for line in lines),
+        )}
+        modified = {}
+        logs = []
+        accountingentries = []
+
+        for line in lines:
+            # Find the actual payment
+            pspref = line['Psp Reference']
+            bookdate = line['Booking Date']
+            if pspref not in transactions:
+                # Yes, for now we rollback the whole processing of this one
+                raise Exception('Transaction %s not found!' % pspref)
+            trans = transactions[pspref]
+            if line['Record Type'] == 'SentForSettle':
+                # If this is a POS transaction, it typically received a
+                # separate CAPTURE notification, in which case the capture
+                # date is already set. But if not, we'll set it to the
+                # sent for settle date.
+                if not trans.capturedat:
+                    trans.capturedat = bookdate
+                    trans.method = line['Payment Method']
+                    modified[trans.id] = trans
+                    logs.append(AdyenLog(message='Transaction %s captured at %s' % (pspref, bookdate), error=False, paymentmethod=method))
                     if self.verbose:
-                        self.stdout.write("Settled {0}, total amount {1}".format(pspref, trans.settledamount))
-                    AdyenLog(message='Transaction %s settled at %s' % (pspref, bookdate), error=False, paymentmethod=method).save()
-
-                    # Settled transactions create a booking entry
-                    accstr = "Adyen settlement %s" % pspref
-                    accrows = [
-                        (pm.config('accounting_authorized'), accstr, -trans.amount, None),
-                        (pm.config('accounting_payable'), accstr, trans.settledamount, None),
-                        (pm.config('accounting_fee'), accstr, trans.amount - trans.settledamount, trans.accounting_object),
-                        ]
-                    create_accounting_entry(accrows, False)
+                        self.stdout.write("Sent for settle on {0}".format(pspref))
+            elif line['Record Type'] in ('Settled', 'SettledBulk'):
+                if trans.settledat is not None:
+                    # Transaction already settled. But we might be reprocessing
+                    # the report, so verify if the previously settled one is
+                    # *identical*.
+                    if trans.settledamount == Decimal(line['Main Amount']).quantize(Decimal('0.01')):
+                        self.stderr.write("Transaction {0} already settled at {1}, ignoring (NOT creating accounting record)!".format(pspref, trans.settledat))
+                        continue
+                    else:
+                        raise CommandError('Transaction {0} settled more than once with a different amount?!'.format(pspref))
+                if not trans.capturedat:
+                    trans.capturedat = bookdate
+
+                trans.settledat = bookdate
+                trans.settledamount = Decimal(line['Main Amount']).quantize(Decimal('0.01'))
+                modified[trans.id] = trans
+                if self.verbose:
+                    self.stdout.write("Settled {0}, total amount {1}".format(pspref, trans.settledamount))
+                logs.append(AdyenLog(message='Transaction %s settled at %s' % (pspref, bookdate), error=False, paymentmethod=method))
+
+                # Settled transactions create a booking entry
+                accstr = "Adyen settlement %s" % pspref
+                accrows = [
+                    (pm.config('accounting_authorized'), accstr, -trans.amount, None),
+                    (pm.config('accounting_payable'), accstr, trans.settledamount, None),
+                    (pm.config('accounting_fee'), accstr, trans.amount - trans.settledamount, trans.accounting_object),
+                    ]
+                accountingentries.append((accrows, False, None))
+
+        TransactionStatus.objects.bulk_update(modified.values(), ['capturedat', 'method', 'settledat', 'settledamount'], batch_size=1000)
+        AdyenLog.objects.bulk_create(logs, batch_size=1000)
+        if accountingentries:
+            create_accounting_entries(accountingentries)
 
     def process_received_payments_report(self, report):
         # We don't currently do anything with this report, but we store the contents
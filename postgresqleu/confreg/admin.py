@@ -495,7 +495,7 @@ class PendingAdditionalOrderAdmin(admin.ModelAdmin):
 class VolunteerSlotAdminForm(ConcurrentProtectedModelForm):
     class Meta:
         model = VolunteerSlot
-        exclude = []
+        exclude = ['version', ]
         widgets = {
             'timerange': RangeWidget(admin.widgets.AdminSplitDateTime()),
         }
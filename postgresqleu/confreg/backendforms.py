@@ -856,6 +856,7 @@ class BackendConferenceSessionForm(BackendForm):
     copy_transform_form = BackendTransformConferenceDateTimeForm
     auto_cascade_delete_to = ['conferencesession_speaker', 'conferencesessionvote']
     allow_email = True
+    list_serverside = True
 
     class Meta:
         model = ConferenceSession
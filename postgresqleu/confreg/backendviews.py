@@ -3,13 +3,14 @@ from django.db import transaction, connection
 from django.db.models import Count
 from django.core.exceptions import PermissionDenied
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse, HttpResponseRedirect, Http404
+from django.http import HttpResponse, HttpResponseRedirect, HttpResponseNotModified, Http404
 from django.contrib import messages
 from django.utils import timezone
 from django.conf import settings
 
 import csv
 import json
+from Cryptodome.Hash import SHA256
 from collections import OrderedDict
 
 from postgresqleu.util.db import exec_to_list, exec_to_dict, exec_no_result
@@ -20,6 +21,7 @@ from postgresqleu.util.backendviews import backend_list_editor, backend_process_
 from postgresqleu.util.jsonutil import JsonSerializer
 from postgresqleu.confreg.util import get_authenticated_conference, get_authenticated_series
 from postgresqleu.util.request import get_int_or_error
+from postgresqleu.scheduler.util import trigger_immediate_job_run
 
 from .jinjafunc import JINJA_TEMPLATE_ROOT
 from .jinjapdf import render_jinja_ticket, render_jinja_badges
@@ -35,6 +37,7 @@ from .models import ShirtSize
 from .models import PendingAdditionalOrder
 from .models import ConferenceTweetQueue
 from .models import MessagingProvider
+from .models import BadgeBuildJob
 
 from postgresqleu.invoices.models import Invoice
 from postgresqleu.invoices.util import InvoiceManager
@@ -70,6 +73,9 @@ from .views import _scheduledata
 
 from .campaigns import get_campaign_from_id
 
+# Requests for more badges than this are built by a background job
+BADGE_BACKGROUND_THRESHOLD = 50
+
 
 #######################
 # Simple editing views
@@ -429,14 +435,48 @@ def view_multi_registration_badge(request, urlname):
             messages.warning(request, 'No badges have been generated due to previous error(s)')
         return HttpResponseRedirect("../")
 
+    if len(regs) > BADGE_BACKGROUND_THRESHOLD:
+        # Too many to render while the user waits, so hand it off to the
+        # background job and show the progress.
+        job = BadgeBuildJob(
+            conference=conference,
+            createdby=request.user,
+            registrations=[r.id for r in regs],
+            numbadges=len(regs),
+        )
+        job.save()
+        trigger_immediate_job_run('confreg_build_badges')
+        return HttpResponseRedirect("../badgejob/{}/".format(job.id))
+
     resp = HttpResponse(content_type='application/pdf')
     try:
-        render_jinja_badges(conference, settings.REGISTER_FONTS, [r.safe_export() for r in regs], resp, False, False)
+        render_jinja_badges(conference, settings.REGISTER_FONTS, ConferenceRegistration.safe_export_multiple(conference, [r.id for r in regs]), resp, False, False)
     except Exception as e:
         return HttpResponse("Exception rendering badges: {}".format(e.__repr__()), content_type='text/plain')
     return resp
 
 
+def view_badge_build_job(request, urlname, jobid):
+    conference = get_authenticated_conference(request, urlname)
+    job = get_object_or_404(BadgeBuildJob.objects.defer('pdf'), conference=conference, pk=jobid)
+
+    return render(request, 'confreg/admin_badge_job.html', {
+        'conference': conference,
+        'job': job,
+        'percent': job.numbadges and job.completedbadges * 100 // job.numbadges,
+        'breadcrumbs': (('/events/admin/{}/regdashboard/list/'.format(conference.urlname), 'Registration list'), ),
+    })
+
+
+def download_badge_build_job(request, urlname, jobid):
+    conference = get_authenticated_conference(request, urlname)
+    job = get_object_or_404(BadgeBuildJob, conference=conference, pk=jobid, finishedat__isnull=False, pdf__isnull=False)
+
+    resp = HttpResponse(bytes(job.pdf), content_type='application/pdf')
+    resp['Content-Disposition'] = 'attachment; filename="badges_{}_{}.pdf"'.format(conference.urlname, job.id)
+    return resp
+
+
 def pendinginvoices(request, urlname):
     conference = get_authenticated_conference(request, urlname)
 
@@ -883,17 +923,26 @@ class YamlWriter(JsonWriter):
         return r
 
 
-def _structured_tokendata(tokendata, dataformat):
+def _structured_tokendata(request, tokendata, dataformat):
     if dataformat == 'json':
-        return HttpResponse(json.dumps(tokendata,
-                                       cls=JsonSerializer,
-                                       indent=2),
-                            content_type='application/json')
+        content = json.dumps(tokendata, cls=JsonSerializer, indent=2)
+        content_type = 'application/json'
     elif dataformat == 'yaml':
         import yaml
-        return HttpResponse(yaml.dump(tokendata),
-                            content_type='application/yaml')
-    raise Http404()
+        content = yaml.dump(tokendata)
+        content_type = 'application/yaml'
+    else:
+        raise Http404()
+
+    # Static site builds fetch this data over and over again, so let them
+    # avoid transferring it when nothing has changed.
+    etag = '"{}"'.format(SHA256.new(content.encode('utf8')).hexdigest())
+    if request.headers.get('If-None-Match', None) == etag:
+        return HttpResponseNotModified()
+
+    r = HttpResponse(content, content_type=content_type)
+    r['ETag'] = etag
+    return r
 
 
 def tokendata(request, urlname, token, datatype, dataformat, subrequest=None):
@@ -968,14 +1017,14 @@ FROM direct
 LEFT JOIN pending ON direct.id=pending.id
 ORDER BY name""", {'confid': conference.id})
     elif datatype == 'schedule':
-        return _structured_tokendata(_scheduledata(request, conference), dataformat)
+        return _structured_tokendata(request, _scheduledata(request, conference), dataformat)
     elif datatype == 'sponsorlevels':
-        return _structured_tokendata(sponsorleveldata(conference), dataformat)
+        return _structured_tokendata(request, sponsorleveldata(conference), dataformat)
     elif datatype == 'sponsorclaims':
         if subrequest is not None:
             return sponsorclaimsfile(conference, subrequest.lstrip('/'))
         else:
-            return _structured_tokendata(sponsorclaimsdata(conference), dataformat)
+            return _structured_tokendata(request, sponsorclaimsdata(conference), dataformat)
     else:
         raise Http404()
 
@@ -1,43 +1,77 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.db.models import Count
-from django.db import connection
 
-from .models import ConferenceFeedbackAnswer
+from .models import ConferenceFeedbackAnswer, ConferenceFeedbackQuestion
 from postgresqleu.confreg.util import get_authenticated_conference
 from postgresqleu.util.request import get_int_or_error
+from postgresqleu.util.db import exec_to_list
+from postgresqleu.util.pagination import simple_pagination
 
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 
 
-def build_graphdata(answers, options):
+# Number of freetext answers to show per question on the main report page,
+# the rest are available on a paginated page per question.
+FREETEXT_ANSWERS_ON_REPORT = 25
+
+TOPLIST_KEYS = ('topic_importance', 'content_quality', 'speaker_knowledge', 'speaker_quality')
+
+
+def build_graphdata(counts, options):
     optionhash = OrderedDict(list(zip(options, [0] * len(options))))
-    if answers:
-        for a in answers:
-            optionhash[a] += 1
+    for a, n in counts.items():
+        optionhash[a] = optionhash.get(a, 0) + n
     return optionhash
 
 
 def feedback_report(request, confname):
     conference = get_authenticated_conference(request, confname)
 
+    # Count the answers for all choice and rating questions in the database,
+    # so we never have to pull the individual answers in.
+    histograms = defaultdict(dict)
+    for questionid, textanswer, rateanswer, num in exec_to_list(
+            """SELECT a.question_id,
+ CASE WHEN q.isfreetext THEN a.textanswer END AS textanswer,
+ CASE WHEN NOT q.isfreetext THEN a.rateanswer END AS rateanswer,
+ count(*)
+FROM confreg_conferencefeedbackanswer a
+INNER JOIN confreg_conferencefeedbackquestion q ON q.id=a.question_id
+WHERE q.conference_id=%(confid)s AND (
+ (q.isfreetext AND q.textchoices != '' AND a.textanswer != '') OR
+ (NOT q.isfreetext AND a.rateanswer IS NOT NULL)
+)
+GROUP BY 1, 2, 3""", {
+                'confid': conference.id,
+            }):
+        histograms[questionid][textanswer if textanswer is not None else rateanswer] = num
+
+    # For pure freetext questions, only get the first set of answers here
+    textanswers = defaultdict(list)
+    for questionid, textanswer in exec_to_list(
+            """SELECT question_id, textanswer FROM (
+ SELECT a.question_id, a.textanswer, row_number() OVER (PARTITION BY a.question_id ORDER BY a.id) AS rownum
+ FROM confreg_conferencefeedbackanswer a
+ INNER JOIN confreg_conferencefeedbackquestion q ON q.id=a.question_id
+ WHERE q.conference_id=%(confid)s AND q.isfreetext AND q.textchoices='' AND a.textanswer != ''
+) x
+WHERE rownum <= %(num)s
+ORDER BY question_id, rownum""", {
+                'confid': conference.id,
+                'num': FREETEXT_ANSWERS_ON_REPORT,
+            }):
+        textanswers[questionid].append(textanswer)
+
     sections = []
-    # Get the global conference feedback. Actually pusing down the counting of options would
-    # make this more efficient, but at least we're down to a single query now.
-    curs = connection.cursor()
-    curs.execute(
-        """SELECT q.id, q.newfieldset, q.question, q.isfreetext, q.textchoices,
- array_agg(a.textanswer) FILTER (WHERE a.textanswer != '') AS textanswers,
- array_agg(a.rateanswer) FILTER (WHERE a.rateanswer IS NOT NULL) AS rateanswers
+    currentsection = {}
+    for questionid, newfieldset, question, isfreetext, textchoices, numtextanswers in exec_to_list(
+            """SELECT q.id, q.newfieldset, q.question, q.isfreetext, q.textchoices,
+ (SELECT count(*) FROM confreg_conferencefeedbackanswer a WHERE a.question_id=q.id AND a.textanswer != '') AS numtextanswers
 FROM confreg_conferencefeedbackquestion q
-LEFT JOIN confreg_conferencefeedbackanswer a ON a.question_id=q.id
 WHERE q.conference_id=%(confid)s
-GROUP BY q.id
 ORDER BY sortkey""", {
-            'confid': conference.id,
-        })
-
-    currentsection = {}
-    for questionid, newfieldset, question, isfreetext, textchoices, textanswers, rateanswers in curs.fetchall():
+                'confid': conference.id,
+            }):
         if newfieldset:
             if currentsection:
                 sections.append(currentsection)
@@ -54,11 +88,12 @@ ORDER BY sortkey""", {
         if isfreetext:
             if textchoices:
                 # This is actually a set of choices, even if freetext is set
-                r['graphdata'] = build_graphdata(textanswers, textchoices.split(';'))
+                r['graphdata'] = build_graphdata(histograms[questionid], textchoices.split(';'))
             else:
-                r['textanswers'] = textanswers
+                r['textanswers'] = textanswers[questionid]
+                r['numtextanswers'] = numtextanswers
         else:
-            r['graphdata'] = build_graphdata(rateanswers, list(range(0, 6)))
+            r['graphdata'] = build_graphdata(histograms[questionid], list(range(0, 6)))
 
         if 'questions' in currentsection:
             currentsection['questions'].append(r)
@@ -75,22 +110,76 @@ ORDER BY sortkey""", {
     })
 
 
-def build_toplists(what, query):
-    cursor = connection.cursor()
-    for k in ('topic_importance', 'content_quality', 'speaker_knowledge', 'speaker_quality'):
-        tl = {'title': '%s by %s' % (what, k.replace('_', ' ').title())}
-        cursor.execute(query.replace('{{key}}', k))
-        tl['list'] = cursor.fetchall()
-        yield tl
+def feedback_report_question(request, confname, questionid):
+    conference = get_authenticated_conference(request, confname)
+    question = get_object_or_404(ConferenceFeedbackQuestion, conference=conference, pk=questionid, isfreetext=True)
+
+    answer_objects = ConferenceFeedbackAnswer.objects.filter(question=question).exclude(textanswer='').order_by('id').values_list('textanswer', flat=True)
+    (answers, paginator, page_range) = simple_pagination(request, answer_objects, 100)
+
+    return render(request, 'confreg/admin_conference_feedback_question.html', {
+        'conference': conference,
+        'question': question,
+        'answers': answers,
+        'page_range': page_range,
+        'breadcrumbs': (('/events/admin/{0}/reports/feedback/'.format(conference.urlname), 'Feedback'), ),
+        'helplink': 'feedback',
+    })
+
+
+def build_toplists(conference, minvotes):
+    # Calculate all toplists, for both sessions and speakers and for all the
+    # different keys, in a single pass over the feedback.
+    lists = OrderedDict()
+    for what, key, title, avg, votes, stddev in exec_to_list(
+            """WITH fb AS (
+ SELECT fb.session_id, k.key, k.val
+ FROM confreg_conferencesessionfeedback fb
+ CROSS JOIN LATERAL (VALUES
+  ('topic_importance', fb.topic_importance),
+  ('content_quality', fb.content_quality),
+  ('speaker_knowledge', fb.speaker_knowledge),
+  ('speaker_quality', fb.speaker_quality)
+ ) k(key, val)
+ WHERE fb.conference_id=%(confid)s AND k.val > 0
+), sess AS (
+ SELECT s.id, s.title, (SELECT string_agg(fullname, ', ') FROM confreg_speaker spk INNER JOIN confreg_conferencesession_speaker css ON css.speaker_id=spk.id WHERE css.conferencesession_id=s.id) AS speakers
+ FROM confreg_conferencesession s
+ WHERE s.conference_id=%(confid)s
+)
+SELECT what, key, title, avg, votes, stddev FROM (
+ SELECT 1 AS whatnum, 'Sessions' AS what, fb.key, sess.title || COALESCE(' (' || sess.speakers || ')', '') AS title,
+  avg(fb.val) AS avg, count(*) AS votes, stddev(fb.val) AS stddev
+ FROM fb INNER JOIN sess ON sess.id=fb.session_id
+ GROUP BY fb.key, sess.id, sess.title, sess.speakers
+ UNION ALL
+ SELECT 2, 'Speakers', fb.key, sess.speakers, avg(fb.val), count(*), stddev(fb.val)
+ FROM fb INNER JOIN sess ON sess.id=fb.session_id
+ GROUP BY fb.key, sess.speakers
+) x
+WHERE votes >= %(minvotes)s
+ORDER BY whatnum, array_position(%(keys)s, key), avg DESC""", {
+                'confid': conference.id,
+                'minvotes': minvotes,
+                'keys': list(TOPLIST_KEYS),
+            }):
+        lists.setdefault((what, key), []).append((title, avg, votes, stddev))
+
+    for what in ('Sessions', 'Speakers'):
+        for k in TOPLIST_KEYS:
+            yield {
+                'title': '%s by %s' % (what, k.replace('_', ' ').title()),
+                'list': lists.get((what, k), []),
+            }
 
 
 def feedback_sessions(request, confname):
     conference = get_authenticated_conference(request, confname)
 
     # Get all sessions that have actual comments on them
-    cursor = connection.cursor()
-    cursor.execute("SELECT concat(s.title, ' (' || (SELECT string_agg(fullname, ', ') FROM confreg_speaker spk INNER JOIN confreg_conferencesession_speaker css ON css.speaker_id=spk.id WHERE css.conferencesession_id=s.id) || ')'), conference_feedback FROM confreg_conferencesessionfeedback fb INNER JOIN confreg_conferencesession s ON fb.session_id=s.id WHERE s.conference_id=%s AND NOT conference_feedback='' ORDER BY 1,2" % (conference.id,))
-    commented_sessions = cursor.fetchall()
+    commented_sessions = exec_to_list("SELECT concat(s.title, ' (' || (SELECT string_agg(fullname, ', ') FROM confreg_speaker spk INNER JOIN confreg_conferencesession_speaker css ON css.speaker_id=spk.id WHERE css.conferencesession_id=s.id) || ')'), conference_feedback FROM confreg_conferencesessionfeedback fb INNER JOIN confreg_conferencesession s ON fb.session_id=s.id WHERE s.conference_id=%(confid)s AND NOT conference_feedback='' ORDER BY 1,2", {
+        'confid': conference.id,
+    })
 
     # Now for all of our fancy toplists
     # The django ORM just can't do this...
@@ -98,13 +187,7 @@ def feedback_sessions(request, confname):
     if request.method == 'POST':
         minvotes = get_int_or_error(request.POST, 'minvotes')
 
-    toplists = []
-
-    # Start with top sessions
-    toplists.extend(build_toplists('Sessions', "SELECT s.title || COALESCE(' (' || (SELECT string_agg(fullname, ', ') FROM confreg_speaker spk INNER JOIN confreg_conferencesession_speaker css ON css.speaker_id=spk.id WHERE css.conferencesession_id=s.id) || ')', ''), avg(fb.{{key}}), count(*), stddev(fb.{{key}}) FROM confreg_conferencesessionfeedback fb INNER JOIN confreg_conferencesession s ON fb.session_id=s.id WHERE s.conference_id=%s AND fb.{{key}}>0 GROUP BY s.id HAVING count(*)>=%s ORDER BY 2 DESC" % (conference.id, minvotes)))
-
-    # Now let's do the speakers
-    toplists.extend(build_toplists('Speakers', "SELECT (SELECT string_agg(fullname, ', ') FROM confreg_speaker spk INNER JOIN confreg_conferencesession_speaker css ON css.speaker_id=spk.id WHERE css.conferencesession_id=s.id) AS speakername, avg(fb.{{key}}), count(*), stddev(fb.{{key}}) FROM confreg_conferencesessionfeedback fb INNER JOIN confreg_conferencesession s ON fb.session_id=s.id WHERE s.conference_id=%s AND fb.{{key}}>0 GROUP BY speakername HAVING count(*)>=%s ORDER BY 2 DESC" % (conference.id, minvotes)))
+    toplists = list(build_toplists(conference, minvotes))
 
     return render(request, 'confreg/admin_session_feedback.html', {
         'conference': conference,
@@ -23,6 +23,7 @@ from postgresqleu.confreg.templatetags.formutil import field_class
 from postgresqleu.util.templatetags import svgcharts
 from postgresqleu.util.templatetags.assets import do_render_asset
 from postgresqleu.util.messaging import get_messaging_class_from_typename
+from postgresqleu.util.markup import pgmarkdown
 
 import markupsafe
 import jinja2
@@ -32,7 +33,6 @@ try:
 except ImportError:
     # Try Jinja2 2.x version
     from jinja2 import contextfilter as pass_context
-import markdown
 
 
 from .contextutil import load_all_context
@@ -320,7 +320,7 @@ extra_filters = {
     'timesince': timesince,
     'groupby_sort': filter_groupby_sort,
     'leadingnbsp': leadingnbsp,
-    'markdown': lambda t: markupsafe.Markup(markdown.markdown(t, extensions=['tables', ])),
+    'markdown': lambda t: markupsafe.Markup(pgmarkdown(t)),
     'shuffle': filter_shuffle,
     'slugify': slugify,
     'yesno': lambda b, v: v.split(',')[not b],
@@ -6,12 +6,14 @@ import argparse
 import sys
 import re
 import operator
+import functools
+from io import BytesIO
 
 from reportlab.lib.units import mm
 from reportlab.lib.pagesizes import A4, LETTER, landscape
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_RIGHT
-from reportlab.pdfbase.pdfmetrics import registerFont
+from reportlab.pdfbase.pdfmetrics import registerFont, stringWidth
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
 from reportlab.platypus.flowables import Flowable
@@ -47,6 +49,54 @@ def getmm(struct, key):
     return struct[key] * mm
 
 
+# Fonts that have already been registered in this process, mapping font name
+# to font file. Loading and parsing the TTF files is expensive, and when building
+# badges in chunks we create many renderers in the same process.
+_registered_fonts = {}
+
+
+def register_fonts(fonts):
+    for font, fontfile in fonts:
+        if _registered_fonts.get(font, None) != fontfile:
+            registerFont(TTFont(font, fontfile))
+            _registered_fonts[font] = fontfile
+            # Any cached text sizes may have been calculated with a different font
+            fit_fontsize.cache_clear()
+
+
+@functools.lru_cache(maxsize=1024)
+def get_qr_image(s, ver):
+    import qrcode
+
+    qrimage = qrcode.make(s, version=ver, border=0)
+    if qrimage.size[0] != 500:
+        if qrimage.size[0] < 500:
+            size = (500 // qrimage.size[0]) * qrimage.size[0]
+        else:
+            size = qrimage.size[0] // (qrimage.size[0] // 500 + 1)
+        qrimage = qrimage.resize((size, size), Image.NEAREST)
+    return qrimage
+
+
+# Find the largest font size below maxfontsize (and at least 3) where all the lines
+# fit within the width. The width of a string grows with the font size, so we can
+# do a binary search for the first size that does not fit, which gives the same
+# result as trying every size in order.
+@functools.lru_cache(maxsize=4096)
+def fit_fontsize(lines, fontname, maxfontsize, width):
+    if maxfontsize <= 4:
+        raise Exception("Paragraph is too small to fit any text")
+
+    lo, hi = 4, maxfontsize
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if max([stringWidth(line, fontname, mid) for line in lines]) > width:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo - 1
+
+
 class JinjaFlowable(Flowable):
     def __init__(self, js, imgpath):
         self.js = js
@@ -166,9 +216,7 @@ class JinjaFlowable(Flowable):
             raise Exception("String too long for QR encode")
 
         try:
-            import qrcode
-
-            qrimage = qrcode.make(s, version=ver, border=0)
+            qrimage = get_qr_image(s, ver)
         except ImportError:
             raise
             try:
@@ -182,13 +230,6 @@ class JinjaFlowable(Flowable):
                 self.draw_paragraph(o2)
                 return
 
-        if qrimage.size[0] != 500:
-            if qrimage.size[0] < 500:
-                size = (500 // qrimage.size[0]) * qrimage.size[0]
-            else:
-                size = qrimage.size[0] // (qrimage.size[0] // 500 + 1)
-            qrimage = qrimage.resize((size, size), Image.NEAREST)
-
         self.canv.drawImage(ImageReader(qrimage),
                             getmm(o, 'x'),
                             self.calc_y(o),
@@ -222,11 +263,7 @@ class JinjaFlowable(Flowable):
             maxfontsize = min(maxsize, maxfont_height)
         else:
             maxfontsize = maxfont_height
-        for fontsize in range(4, maxfontsize):
-            maxwidth = max([self.canv.stringWidth(line, fontname, fontsize) for line in lines])
-            if maxwidth > getmm(o, 'width'):
-                fontsize -= 1
-                break
+        fontsize = fit_fontsize(tuple(lines), fontname, maxfontsize, getmm(o, 'width'))
 
         if o.get('verticalcenter', False):
             yoffset = (getmm(o, 'height') - (len(lines) * fontsize)) // 2
@@ -270,8 +307,7 @@ class JinjaRenderer(object):
 
         self.border = self.pagebreaks = False
 
-        for font, fontfile in fonts:
-            registerFont(TTFont(font, fontfile))
+        register_fonts(fonts)
 
         if self.templatedir and os.path.exists(os.path.join(self.templatedir, templatefile)):
             template = os.path.join(self.templatedir, templatefile)
@@ -375,6 +411,19 @@ def render_jinja_badges(conference, fonts, registrations, output, border, pagebr
     renderer.render(output)
 
 
+# Render one chunk of badges to a PDF, from already exported data. This is
+# used by the background badge builder, and does not touch the database.
+def render_jinja_badge_chunk(jinjadir, fonts, registrations, conference, border=False, pagebreaks=False):
+    renderer = JinjaBadgeRenderer(jinjadir, fonts, border=border, pagebreaks=pagebreaks)
+
+    for reg in registrations:
+        renderer.add_badge(reg, conference)
+
+    output = BytesIO()
+    renderer.render(output)
+    return output.getvalue()
+
+
 def render_jinja_ticket(registration, output, systemroot, fonts):
     renderer = JinjaTicketRenderer(registration.conference.jinjadir, fonts, systemroot=systemroot)
     renderer.add_reg(registration.safe_export(), registration.conference.safe_export())
@@ -0,0 +1,159 @@
+#
+# Benchmark some of the hot code paths against a conference, normally
+# one generated by confreg_generate_synthetic, recording both the wall
+# time and the number of queries for each.
+#
+# Everything is run in a transaction that is rolled back at the end, so
+# benchmarks that modify data (such as enqueueing emails) leave no trace.
+#
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.client import RequestFactory
+from django.conf import settings
+
+from io import BytesIO
+import json
+import statistics
+import time
+
+from postgresqleu.confreg.models import Conference, ConferenceRegistration
+from postgresqleu.confreg.views import _scheduledata
+from postgresqleu.confreg.checkin import api as checkin_api
+from postgresqleu.confreg.reports import AttendeeReportManager
+from postgresqleu.confreg.jinjapdf import render_jinja_badges
+from postgresqleu.mailqueue.util import send_simple_mail
+from postgresqleu.util.db import QueryRecorder
+
+
+class Command(BaseCommand):
+    help = 'Benchmark hot code paths against a conference'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urlname', type=str, default='synthetic', help='URL name of conference to benchmark against')
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--only', type=str, nargs='+', help='Only run the specified benchmarks')
+        parser.add_argument('--json', action='store_true', help='Write the results as JSON, for comparing between runs')
+
+    def handle(self, *args, **options):
+        try:
+            self.conference = Conference.objects.get(urlname=options['urlname'])
+        except Conference.DoesNotExist:
+            raise CommandError("Conference {} not found".format(options['urlname']))
+
+        self.factory = RequestFactory()
+        self.regids = list(ConferenceRegistration.objects.filter(
+            conference=self.conference,
+            payconfirmedat__isnull=False,
+            canceledat__isnull=True,
+        ).order_by('id').values_list('id', flat=True))
+        if not self.regids:
+            raise CommandError("Conference has no confirmed registrations")
+
+        processor = self.conference.checkinprocessors.first()
+        self.checkintoken = processor.regtoken if processor else None
+        benchmarks = [
+            ('schedule', self.bench_schedule),
+            ('checkin_lookup', self.bench_checkin_lookup if processor else None),
+            ('checkin_search', self.bench_checkin_search if processor else None),
+            ('checkin_stats', self.bench_checkin_stats if processor else None),
+            ('report_csv', self.bench_report_csv),
+            ('report_json', self.bench_report_json),
+            ('badges', self.bench_badges if self.conference.jinjadir else None),
+            ('mail_enqueue', self.bench_mail_enqueue),
+        ]
+        if options['only']:
+            unknown = set(options['only']) - set(b[0] for b in benchmarks)
+            if unknown:
+                raise CommandError("Unknown benchmark(s): {}".format(", ".join(unknown)))
+            benchmarks = [b for b in benchmarks if b[0] in options['only']]
+
+        results = []
+        with transaction.atomic():
+            for name, f in benchmarks:
+                if not f:
+                    if not options['json']:
+                        self.stdout.write("{:<16} skipped".format(name))
+                    continue
+                results.append(self.run_benchmark(name, f, options['iterations']))
+                if not options['json']:
+                    self.stdout.write("{name:<16} {min:>9.1f} {median:>9.1f} {max:>9.1f} ms {queries:>7} queries".format(**results[-1]))
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'conference': self.conference.urlname,
+                'registrations': len(self.regids),
+                'iterations': options['iterations'],
+                'results': results,
+            }, indent=2))
+
+    def run_benchmark(self, name, f, iterations):
+        # Run once to warm up any caches, so the timings are for the steady
+        # state. The query count is taken from the last run.
+        f()
+
+        times = []
+        for i in range(iterations):
+            with QueryRecorder() as recorder:
+                start = time.perf_counter()
+                f()
+                times.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'name': name,
+            'min': min(times),
+            'median': statistics.median(times),
+            'max': max(times),
+            'queries': recorder.numqueries,
+        }
+
+    def _check(self, resp):
+        if resp.status_code != 200:
+            raise CommandError("Got status {}: {}".format(resp.status_code, resp.content[:200]))
+        return resp
+
+    def bench_schedule(self):
+        _scheduledata(self.factory.get('/'), self.conference)
+
+    def bench_checkin_lookup(self):
+        reg = ConferenceRegistration.objects.get(pk=self.regids[len(self.regids) // 2])
+        self._check(checkin_api(self.factory.get('/', {'lookup': reg.fullidtoken}), self.conference.urlname, self.checkintoken, 'lookup'))
+
+    def bench_checkin_search(self):
+        self._check(checkin_api(self.factory.get('/', {'search': 'an'}), self.conference.urlname, self.checkintoken, 'search'))
+
+    def bench_checkin_stats(self):
+        self._check(checkin_api(self.factory.get('/'), self.conference.urlname, self.checkintoken, 'stats'))
+
+    def _report(self, format):
+        return self._check(AttendeeReportManager(self.conference).build_attendee_report(self.factory.get('/'), {
+            'reportdata': json.dumps({'fields': ['lastname', 'firstname', 'email', 'company', 'regtype', 'additionaloptions']}),
+            'title': 'Benchmark',
+            'format': format,
+            'orientation': 'portrait',
+            'additionalcols': '',
+            'orderby1': 'lastname',
+            'orderby2': 'firstname',
+            'rids': ','.join(map(str, self.regids)),
+        }))
+
+    def bench_report_csv(self):
+        self._report('csv')
+
+    def bench_report_json(self):
+        self._report('json')
+
+    def bench_badges(self):
+        render_jinja_badges(self.conference, settings.REGISTER_FONTS, ConferenceRegistration.safe_export_multiple(self.conference, self.regids), BytesIO(), False, False)
+
+    def bench_mail_enqueue(self):
+        for r in ConferenceRegistration.objects.filter(pk__in=self.regids[:100]):
+            send_simple_mail(
+                self.conference.contactaddr,
+                r.email,
+                'Benchmark',
+                'This is a benchmark email to {}'.format(r.fullname),
+                sendername=self.conference.conferencename,
+                receivername=r.fullname,
+            )
@@ -0,0 +1,90 @@
+#
+# Build badges requested from the registration list in the background
+#
+# Badges are rendered in chunks using a pool of processes, and the
+# resulting PDFs merged into one (if the fitz library is available).
+#
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from django.conf import settings
+
+from datetime import timedelta
+import math
+import multiprocessing
+
+from postgresqleu.confreg.models import BadgeBuildJob, ConferenceRegistration
+from postgresqleu.confreg.jinjapdf import render_jinja_badge_chunk
+
+
+# Never split into chunks smaller than this, since each chunk starts on a new page.
+MIN_CHUNK_SIZE = 100
+
+
+def _render_chunk(args):
+    return render_jinja_badge_chunk(*args)
+
+
+class Command(BaseCommand):
+    help = 'Build requested badges'
+
+    class ScheduledJob:
+        scheduled_interval = timedelta(hours=1)
+        timeout = 60
+
+        @classmethod
+        def should_run(self):
+            return BadgeBuildJob.objects.filter(finishedat__isnull=True).exists() or \
+                BadgeBuildJob.objects.filter(createdat__lt=timezone.now() - timedelta(days=7)).exists()
+
+    def handle(self, *args, **options):
+        # Built badges are only kept around for a week
+        BadgeBuildJob.objects.filter(createdat__lt=timezone.now() - timedelta(days=7)).delete()
+
+        for job in BadgeBuildJob.objects.select_related('conference').filter(finishedat__isnull=True).order_by('createdat'):
+            try:
+                job.pdf = self.build_badges(job)
+            except Exception as e:
+                job.error = str(e)
+                self.stderr.write("Failed to build badges for {}: {}".format(job.conference, e))
+            job.finishedat = timezone.now()
+            job.save(update_fields=['pdf', 'error', 'finishedat'])
+
+    def build_badges(self, job):
+        conference = job.conference.safe_export()
+        regs = ConferenceRegistration.safe_export_multiple(job.conference, job.registrations)
+
+        try:
+            import fitz
+            numchunks = min(multiprocessing.cpu_count(), math.ceil(len(regs) / MIN_CHUNK_SIZE))
+        except ImportError:
+            # Without fitz we cannot merge the results, so render it all in one go
+            numchunks = 1
+
+        if numchunks <= 1:
+            pdf = render_jinja_badge_chunk(job.conference.jinjadir, settings.REGISTER_FONTS, regs, conference)
+            BadgeBuildJob.objects.filter(pk=job.pk).update(completedbadges=len(regs))
+            return pdf
+
+        chunksize = math.ceil(len(regs) / numchunks)
+        chunks = [
+            (job.conference.jinjadir, settings.REGISTER_FONTS, regs[i:i + chunksize], conference)
+            for i in range(0, len(regs), chunksize)
+        ]
+
+        # The worker processes never access the database, but make sure they
+        # don't inherit our connection either. It is reopened when needed.
+        connection.close()
+
+        merged = fitz.open()
+        completed = 0
+        with multiprocessing.Pool(numchunks) as pool:
+            # imap returns the results in order, so the badges stay in the
+            # same order as in a single document.
+            for chunk, pdf in zip(chunks, pool.imap(_render_chunk, chunks)):
+                merged.insert_pdf(fitz.open('pdf', pdf))
+                completed += len(chunk[2])
+                BadgeBuildJob.objects.filter(pk=job.pk).update(completedbadges=completed)
+
+        return merged.write()
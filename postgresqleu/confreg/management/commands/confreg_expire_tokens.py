@@ -5,20 +5,26 @@
 # and cleaned up on API calls, so this script will only clean up tokens
 # of aborted sessions. Because of that, we don't have to run it very often.
 #
+# Also prune old volunteer slot deletions, which are only needed for
+# clients of the volunteer schedule that haven't seen them yet.
+#
 
 # Copyright (C) 2021, PostgreSQL Europe
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 
 from datetime import timedelta
 
-from postgresqleu.confreg.models import ConferenceRegistrationTemporaryToken
+from postgresqleu.confreg.models import Conference, ConferenceRegistrationTemporaryToken
+from postgresqleu.confreg.models import VolunteerSlotDeletion, VolunteerScheduleVersion
+from postgresqleu.util.db import exec_no_result
 
 
 class Command(BaseCommand):
-    help = 'Remove expired temporary tokens'
+    help = 'Remove expired temporary tokens and old volunteer slot deletions'
 
     class ScheduledJob:
         scheduled_interval = timedelta(hours=24)
@@ -26,8 +32,28 @@ class Command(BaseCommand):
 
         @classmethod
         def should_run(self):
-            return ConferenceRegistrationTemporaryToken.objects.filter(expires__lt=timezone.now() - timedelta(minutes=30)).exists()
+            return ConferenceRegistrationTemporaryToken.objects.filter(expires__lt=timezone.now() - timedelta(minutes=30)).exists() or \
+                VolunteerSlotDeletion.objects.filter(deletedat__lt=timezone.now() - timedelta(days=7)).exists() or \
+                VolunteerScheduleVersion.objects.filter(~Exists(Conference.objects.filter(pk=OuterRef('conference_id')))).exists() or \
+                VolunteerSlotDeletion.objects.filter(~Exists(Conference.objects.filter(pk=OuterRef('conference_id')))).exists()
 
     @transaction.atomic
     def handle(self, *args, **options):
         ConferenceRegistrationTemporaryToken.objects.filter(expires__lt=timezone.now() - timedelta(minutes=30)).delete()
+
+        # Record the last pruned version, so clients that haven't seen the
+        # pruned deletions get the full schedule.
+        exec_no_result("""WITH d AS (
+ DELETE FROM confreg_volunteerslotdeletion WHERE deletedat < %(cutoff)s
+ RETURNING conference_id, version
+)
+UPDATE confreg_volunteerscheduleversion v SET prunedversion=greatest(v.prunedversion, d.version)
+FROM (SELECT conference_id, max(version) AS version FROM d GROUP BY conference_id) d
+WHERE v.conference_id=d.conference_id""", {
+            'cutoff': timezone.now() - timedelta(days=7),
+        })
+
+        # There is no foreign key on these, so remove any left over after a
+        # conference has been deleted.
+        exec_no_result("DELETE FROM confreg_volunteerslotdeletion d WHERE NOT EXISTS (SELECT 1 FROM confreg_conference c WHERE c.id=d.conference_id)")
+        exec_no_result("DELETE FROM confreg_volunteerscheduleversion v WHERE NOT EXISTS (SELECT 1 FROM confreg_conference c WHERE c.id=v.conference_id)")
@@ -0,0 +1,276 @@
+#
+# Generate a synthetic conference with attendees, sessions, speakers,
+# sponsors and invoices, to be used for benchmarking (see the
+# confreg_benchmark command).
+#
+# This will write lots of junk into the database, so it can only be run
+# on installations running with DEBUG enabled.
+#
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.conf import settings
+
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+import random
+
+from postgresqleu.confreg.models import Conference, ConferenceSeries
+from postgresqleu.confreg.models import RegistrationClass, RegistrationType, RegistrationDay
+from postgresqleu.confreg.models import ConferenceAdditionalOption, ConferenceRegistration
+from postgresqleu.confreg.models import Speaker, ConferenceSession, Track, Room
+from postgresqleu.confsponsor.models import Sponsor, SponsorshipLevel
+from postgresqleu.invoices.models import Invoice, InvoiceRow
+from postgresqleu.util.random import generate_random_token
+
+
+FIRSTNAMES = ['Alice', 'Bob', 'Carol', 'David', 'Erin', 'Frank', 'Grace', 'Heidi', 'Ivan', 'Judy', 'Mallory', 'Niaj', 'Olivia', 'Peggy', 'Rupert', 'Sybil', 'Trent', 'Victor', 'Walter', 'Zoë']
+LASTNAMES = ['Andersson', 'Berg', 'Castro', 'Dubois', 'Eriksen', 'Fischer', 'García', 'Horvat', 'Ivanova', 'Jensen', 'Kowalski', 'Lindqvist', 'Müller', 'Novak', "O'Brien", 'Papadopoulos', 'Rossi', 'Schmidt', 'Tanaka', 'Virtanen']
+COMPANIES = ['', 'Example Inc', 'Sample Corp', 'Test & Co', 'Postgres Consulting', 'Database Services Ltd']
+WORDS = ['scaling', 'postgres', 'indexes', 'replication', 'vacuum', 'partitioning', 'planner', 'extensions', 'backups', 'monitoring', 'json', 'performance', 'security', 'upgrades', 'logical', 'decoding']
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic conference for benchmarking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urlname', type=str, default='synthetic', help='URL name of conference to create')
+        parser.add_argument('--attendees', type=int, default=1000)
+        parser.add_argument('--sessions', type=int, default=150)
+        parser.add_argument('--speakers', type=int, default=120)
+        parser.add_argument('--sponsors', type=int, default=25)
+        parser.add_argument('--invoices', type=int, default=None, help='Number of registrations with invoices (default all confirmed)')
+        parser.add_argument('--days', type=int, default=3)
+        parser.add_argument('--rooms', type=int, default=5)
+        parser.add_argument('--jinjadir', type=str, help='Jinja directory to use, required to benchmark badges')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed generates the same conference')
+        parser.add_argument('--replace', action='store_true', help='Remove an existing conference with the same URL name first')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError("Synthetic conferences can only be generated with DEBUG enabled")
+
+        self.rand = random.Random(options['seed'])
+
+        with transaction.atomic():
+            existing = Conference.objects.filter(urlname=options['urlname']).first()
+            if existing:
+                if not options['replace']:
+                    raise CommandError("Conference {} already exists, use --replace to replace it".format(options['urlname']))
+                self._remove_conference(existing)
+
+            self.user, created = User.objects.get_or_create(username='synthetic_admin', defaults={
+                'email': 'synthetic_admin@example.org',
+                'first_name': 'Synthetic',
+                'last_name': 'Admin',
+            })
+
+            conference = self.create_conference(options)
+            regs = self.create_registrations(conference, options['attendees'])
+            ninvoices = self.create_invoices(conference, regs, options['invoices'])
+            self.create_sessions(conference, options['sessions'], options['speakers'], options['days'], options['rooms'])
+            self.create_sponsors(conference, options['sponsors'])
+
+        self.stdout.write("Created conference {} with {} registrations, {} invoices, {} sessions, {} speakers and {} sponsors.".format(
+            conference.urlname,
+            len(regs),
+            ninvoices,
+            options['sessions'],
+            options['speakers'],
+            options['sponsors'],
+        ))
+
+    def _remove_conference(self, conference):
+        # Objects not owned by the conference need to be removed explicitly
+        Invoice.objects.filter(conferenceregistration__conference=conference).delete()
+        Invoice.objects.filter(sponsor__conference=conference).delete()
+        Speaker.objects.filter(conferencesession__conference=conference).delete()
+        conference.delete()
+
+    def _name(self):
+        return self.rand.choice(FIRSTNAMES), self.rand.choice(LASTNAMES)
+
+    def _title(self, words):
+        return " ".join(self.rand.choice(WORDS) for i in range(words)).capitalize()
+
+    def create_conference(self, options):
+        startdate = date.today() + timedelta(days=30)
+        conference = Conference(
+            urlname=options['urlname'],
+            conferencename='Synthetic conference {}'.format(options['urlname']),
+            startdate=startdate,
+            enddate=startdate + timedelta(days=options['days'] - 1),
+            location='Nowhere',
+            contactaddr='synthetic@example.org',
+            sponsoraddr='synthetic@example.org',
+            notifyaddr='synthetic@example.org',
+            confurl='https://example.org/',
+            series=ConferenceSeries.objects.get_or_create(name='Synthetic')[0],
+            jinjadir=options['jinjadir'],
+            scheduleactive=True,
+            sessionsactive=True,
+            checkinactive=True,
+            queuepartitioning=1,
+        )
+        conference.save()
+        conference.administrators.add(self.user)
+
+        self.days = [RegistrationDay.objects.create(conference=conference, day=conference.startdate + timedelta(days=i)) for i in range(options['days'])]
+
+        classes = [
+            RegistrationClass.objects.create(conference=conference, regclass='Attendee', badgecolor='#ffffff'),
+            RegistrationClass.objects.create(conference=conference, regclass='Speaker', badgecolor='#00ff00'),
+            RegistrationClass.objects.create(conference=conference, regclass='Staff', badgecolor='#ff0000'),
+        ]
+        self.regtypes = []
+        for i, (name, cost, regclass) in enumerate((('Conference', 300, 0), ('Conference day 1', 150, 0), ('Speaker', 0, 1), ('Staff', 0, 2))):
+            rt = RegistrationType.objects.create(conference=conference, regtype=name, regclass=classes[regclass], cost=Decimal(cost), sortkey=i)
+            rt.days.set(self.days[:1] if name.endswith('day 1') else self.days)
+            self.regtypes.append(rt)
+
+        self.options = [
+            ConferenceAdditionalOption.objects.create(conference=conference, name='Training {}'.format(i + 1), cost=Decimal(100), maxcount=0, sortkey=i)
+            for i in range(3)
+        ]
+
+        return conference
+
+    def create_registrations(self, conference, num):
+        now = timezone.now()
+        regs = []
+        for i in range(num):
+            firstname, lastname = self._name()
+            paid = self.rand.random() < 0.9
+            regs.append(ConferenceRegistration(
+                conference=conference,
+                regtype=self.rand.choices(self.regtypes, weights=(70, 20, 5, 5))[0],
+                attendee=self.user if i == 0 else None,
+                registrator=self.user,
+                firstname=firstname,
+                lastname=lastname,
+                email='attendee{}@example.org'.format(i),
+                company=self.rand.choice(COMPANIES),
+                created=now - timedelta(days=self.rand.randint(1, 120)),
+                payconfirmedat=now if paid else None,
+                payconfirmedby='synthetic' if paid else None,
+                canceledat=now if paid and self.rand.random() < 0.02 else None,
+                regtoken=generate_random_token(),
+                idtoken=generate_random_token(),
+                publictoken=generate_random_token(),
+            ))
+        regs = ConferenceRegistration.objects.bulk_create(regs)
+
+        # The first registration belongs to the synthetic admin user, and is
+        # used for check-in processing.
+        conference.checkinprocessors.add(regs[0])
+
+        ConferenceRegistration.additionaloptions.through.objects.bulk_create([
+            ConferenceRegistration.additionaloptions.through(conferenceregistration=r, conferenceadditionaloption=o)
+            for r in regs for o in self.options if self.rand.random() < 0.1
+        ])
+
+        return regs
+
+    def create_invoices(self, conference, regs, num):
+        paidregs = [r for r in regs if r.payconfirmedat and r.regtype.cost > 0]
+        if num is not None:
+            paidregs = paidregs[:num]
+
+        now = timezone.now()
+        invoices = Invoice.objects.bulk_create([
+            Invoice(
+                recipient_email=r.email,
+                recipient_name=r.fullname,
+                recipient_address='{}\n{}'.format(r.fullname, r.company),
+                title='{} - {}'.format(conference.conferencename, r.email),
+                invoicedate=r.created,
+                duedate=r.created + timedelta(days=5),
+                total_amount=r.regtype.cost,
+                finalized=True,
+                paidat=now,
+                paymentdetails='Synthetic',
+            ) for r in paidregs
+        ])
+        InvoiceRow.objects.bulk_create([
+            InvoiceRow(invoice=i, rowtext='Registration for {}'.format(r.email), rowamount=r.regtype.cost)
+            for r, i in zip(paidregs, invoices)
+        ])
+        for r, i in zip(paidregs, invoices):
+            r.invoice = i
+        ConferenceRegistration.objects.bulk_update(paidregs, ['invoice'])
+
+        return len(invoices)
+
+    def create_sessions(self, conference, numsessions, numspeakers, numdays, numrooms):
+        tracks = [
+            Track.objects.create(conference=conference, trackname=name, color=color, sortkey=i)
+            for i, (name, color) in enumerate((('Development', '#d0e0ff'), ('Operations', '#ffe0d0'), ('Case studies', '#e0ffd0'), ('Internals', '#f0f0f0')))
+        ]
+        rooms = [
+            Room.objects.create(conference=conference, roomname='Room {}'.format(i + 1), capacity=self.rand.choice((50, 100, 300)), sortkey=i)
+            for i in range(numrooms)
+        ]
+
+        speakers = Speaker.objects.bulk_create([
+            Speaker(
+                fullname=" ".join(self._name()),
+                company=self.rand.choice(COMPANIES),
+                abstract=self._title(40),
+                speakertoken=generate_random_token(),
+            ) for i in range(numspeakers)
+        ])
+
+        # Fill the schedule from 09:00 with 45 minute sessions and 15 minute
+        # breaks in all rooms, and leave any sessions that don't fit unscheduled.
+        slots = [
+            (datetime.combine(conference.startdate + timedelta(days=d), time(9, 0)) + timedelta(hours=h), room)
+            for d in range(numdays) for h in range(8) for room in rooms
+        ]
+        sessions = []
+        for i in range(numsessions):
+            s = ConferenceSession(
+                conference=conference,
+                title=self._title(5),
+                abstract=self._title(60),
+                status=self.rand.choices((1, 0, 2, 3), weights=(70, 10, 15, 5))[0],
+                track=self.rand.choice(tracks),
+                skill_level=self.rand.randint(0, 2),
+                initialsubmit=timezone.now(),
+            )
+            if s.status == 1 and slots:
+                starttime, s.room = slots.pop(0)
+                s.starttime = conference.localize_datetime(starttime)
+                s.endtime = s.starttime + timedelta(minutes=45)
+            sessions.append(s)
+        sessions = ConferenceSession.objects.bulk_create(sessions)
+
+        if speakers:
+            ConferenceSession.speaker.through.objects.bulk_create([
+                ConferenceSession.speaker.through(conferencesession=s, speaker=spk)
+                for s in sessions for spk in self.rand.sample(speakers, min(len(speakers), self.rand.choice((1, 1, 1, 2))))
+            ])
+
+    def create_sponsors(self, conference, num):
+        levels = [
+            SponsorshipLevel.objects.create(conference=conference, levelname=name, urlname=name.lower(), levelcost=cost, paymentdueby=conference.startdate)
+            for name, cost in (('Platinum', 10000), ('Gold', 5000), ('Silver', 2000))
+        ]
+        sponsors = Sponsor.objects.bulk_create([
+            Sponsor(
+                conference=conference,
+                name='Sponsor {}'.format(i + 1),
+                displayname='Sponsor {}'.format(i + 1),
+                invoiceaddr='Sponsor street {}'.format(i + 1),
+                url='https://example.org/sponsor{}'.format(i + 1),
+                level=self.rand.choice(levels),
+                confirmed=True,
+                confirmedat=timezone.now(),
+                confirmedby='synthetic',
+                signupat=timezone.now(),
+            ) for i in range(num)
+        ])
+        Sponsor.managers.through.objects.bulk_create([
+            Sponsor.managers.through(sponsor=s, user=self.user) for s in sponsors
+        ])
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:36
+
+from django.conf import settings
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('confreg', '0117_pronouns'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BadgeBuildJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('createdat', models.DateTimeField(auto_now_add=True)),
+                ('registrations', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), size=None)),
+                ('numbadges', models.IntegerField()),
+                ('completedbadges', models.IntegerField(default=0)),
+                ('finishedat', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('conference', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='confreg.conference')),
+                ('createdby', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confreg', '0118_badgebuildjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConferenceSessionFavoriteCount',
+            fields=[
+                ('session', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='confreg.conferencesession')),
+                ('num', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConferenceSessionFavorite',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='confreg.conferenceregistration')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='confreg.conferencesession')),
+            ],
+            options={
+                'unique_together': {('registration', 'session')},
+            },
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION confreg_sessionfavorite_count() RETURNS trigger AS $$
+BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE confreg_conferencesessionfavoritecount SET num=num-1 WHERE session_id=OLD.session_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO confreg_conferencesessionfavoritecount (session_id, num) VALUES (NEW.session_id, 1)
+                ON CONFLICT (session_id) DO UPDATE SET num=confreg_conferencesessionfavoritecount.num+1;
+        END IF;
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION confreg_sessionfavorite_count()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER confreg_sessionfavorite_count_trigger
+AFTER INSERT OR UPDATE OF session_id OR DELETE ON confreg_conferencesessionfavorite
+FOR EACH ROW EXECUTE FUNCTION confreg_sessionfavorite_count()
+            """,
+            "DROP TRIGGER confreg_sessionfavorite_count_trigger ON confreg_conferencesessionfavorite",
+        ),
+
+        # Move the existing favorites over from the array, skipping any
+        # sessions that have since been removed. The counts are filled in
+        # by the trigger.
+        migrations.RunSQL(
+            """
+INSERT INTO confreg_conferencesessionfavorite (registration_id, session_id)
+SELECT DISTINCT r.id, s.id
+FROM confreg_conferenceregistration r
+CROSS JOIN unnest(r.favs) AS f(sid)
+INNER JOIN confreg_conferencesession s ON s.id=f.sid
+            """,
+            """
+UPDATE confreg_conferenceregistration r SET favs=f.favs
+FROM (SELECT registration_id, array_agg(session_id ORDER BY session_id) AS favs FROM confreg_conferencesessionfavorite GROUP BY registration_id) f
+WHERE f.registration_id=r.id
+            """,
+        ),
+
+        migrations.RemoveField(
+            model_name='conferenceregistration',
+            name='favs',
+        ),
+    ]
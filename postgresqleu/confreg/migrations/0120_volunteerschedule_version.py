@@ -0,0 +1,83 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confreg', '0119_sessionfavorites'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VolunteerScheduleVersion',
+            fields=[
+                ('conference', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='confreg.conference')),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='volunteerslot',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION confreg_volunteerslot_version() RETURNS trigger AS $$
+BEGIN
+        INSERT INTO confreg_volunteerscheduleversion (conference_id, version) VALUES (NEW.conference_id, 1)
+        ON CONFLICT (conference_id) DO UPDATE SET version=confreg_volunteerscheduleversion.version+1
+        RETURNING version INTO NEW.version;
+        RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION confreg_volunteerslot_version()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER confreg_volunteerslot_version_trigger
+BEFORE INSERT OR UPDATE ON confreg_volunteerslot
+FOR EACH ROW EXECUTE FUNCTION confreg_volunteerslot_version()
+            """,
+            "DROP TRIGGER confreg_volunteerslot_version_trigger ON confreg_volunteerslot",
+        ),
+
+        # Any change to an assignment touches the slot(s) it belongs to, which
+        # gives them a new version through the trigger above.
+        migrations.RunSQL(
+            """
+CREATE FUNCTION confreg_volunteerassignment_version() RETURNS trigger AS $$
+BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE confreg_volunteerslot SET version=version WHERE id=OLD.slot_id;
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.slot_id != OLD.slot_id) THEN
+                UPDATE confreg_volunteerslot SET version=version WHERE id=NEW.slot_id;
+        END IF;
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION confreg_volunteerassignment_version()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER confreg_volunteerassignment_version_trigger
+AFTER INSERT OR UPDATE OR DELETE ON confreg_volunteerassignment
+FOR EACH ROW EXECUTE FUNCTION confreg_volunteerassignment_version()
+            """,
+            "DROP TRIGGER confreg_volunteerassignment_version_trigger ON confreg_volunteerassignment",
+        ),
+
+        # Give all existing slots a version
+        migrations.RunSQL(
+            "UPDATE confreg_volunteerslot SET version=version",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confreg', '0120_volunteerschedule_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VolunteerSlotDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slotid', models.IntegerField()),
+                ('version', models.BigIntegerField()),
+                ('conference', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='confreg.conference')),
+            ],
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE FUNCTION confreg_volunteerslot_deletion() RETURNS trigger AS $$
+DECLARE
+        v bigint;
+BEGIN
+        INSERT INTO confreg_volunteerscheduleversion (conference_id, version) VALUES (OLD.conference_id, 1)
+        ON CONFLICT (conference_id) DO UPDATE SET version=confreg_volunteerscheduleversion.version+1
+        RETURNING version INTO v;
+        INSERT INTO confreg_volunteerslotdeletion (conference_id, slotid, version) VALUES (OLD.conference_id, OLD.id, v);
+        RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+            """,
+            "DROP FUNCTION confreg_volunteerslot_deletion()",
+        ),
+
+        migrations.RunSQL(
+            """
+CREATE TRIGGER confreg_volunteerslot_deletion_trigger
+AFTER DELETE ON confreg_volunteerslot
+FOR EACH ROW EXECUTE FUNCTION confreg_volunteerslot_deletion()
+            """,
+            "DROP TRIGGER confreg_volunteerslot_deletion_trigger ON confreg_volunteerslot",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:23
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('confreg', '0121_volunteerslot_deletion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='volunteerscheduleversion',
+            name='prunedversion',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='volunteerslotdeletion',
+            name='deletedat',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+
+        # These rows are created by triggers, which don't set these columns
+        migrations.RunSQL(
+            "ALTER TABLE confreg_volunteerscheduleversion ALTER COLUMN prunedversion SET DEFAULT 0",
+            "ALTER TABLE confreg_volunteerscheduleversion ALTER COLUMN prunedversion DROP DEFAULT",
+        ),
+        migrations.RunSQL(
+            "ALTER TABLE confreg_volunteerslotdeletion ALTER COLUMN deletedat SET DEFAULT CURRENT_TIMESTAMP",
+            "ALTER TABLE confreg_volunteerslotdeletion ALTER COLUMN deletedat DROP DEFAULT",
+        ),
+    ]
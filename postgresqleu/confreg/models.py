@@ -24,7 +24,7 @@ from postgresqleu.util.validators import color_validator
 from postgresqleu.util.forms import ChoiceArrayField
 from postgresqleu.util.fields import LowercaseEmailField, ImageBinaryField, PdfBinaryField
 from postgresqleu.util.time import today_conference
-from postgresqleu.util.db import exec_no_result
+from postgresqleu.util.db import exec_no_result, exec_to_dict
 from postgresqleu.util.image import rescale_image_bytes
 from postgresqleu.util.currency import format_currency
 from postgresqleu.util.messaging import get_messaging_class, get_messaging_class_from_typename
@@ -665,9 +665,6 @@ class ConferenceRegistration(models.Model):
     # Extra dynamic properties configured at a conference level
     dynaprops = models.JSONField(null=False, blank=True, default=dict)
 
-    # Favorite-marked sessions
-    favs = ArrayField(models.IntegerField(), null=False, blank=True, default=list)
-
     class Meta:
         unique_together = (
             ('attendee_id', 'conference_id'),
@@ -840,8 +837,10 @@ class ConferenceRegistration(models.Model):
 
     @property
     def regdatestr(self):
-        days = self.alldays
+        return self._regdatestr(self.alldays)
 
+    @staticmethod
+    def _regdatestr(days):
         if not days:
             return None
 
@@ -900,15 +899,93 @@ class ConferenceRegistration(models.Model):
         return "%s: %s %s <%s>" % (self.conference, self.firstname, self.lastname, self.email)
 
     # For exporting "safe attributes" to external systems
+    _safe_export_attribs = ['firstname', 'lastname', 'email', 'company', 'address', 'country', 'countryname', 'phone', 'shirtsize', 'dietary', 'twittername', 'nick', 'pronouns', 'pronounstext', 'badgescan', 'shareemail', 'fullidtoken', 'fullpublictoken', 'queuepartition', 'alldays', 'regdatestr', 'vouchercode', 'is_talkvoter', 'is_volunteer', 'is_admin']
+
     def safe_export(self):
-        attribs = ['firstname', 'lastname', 'email', 'company', 'address', 'country', 'countryname', 'phone', 'shirtsize', 'dietary', 'twittername', 'nick', 'pronouns', 'pronounstext', 'badgescan', 'shareemail', 'fullidtoken', 'fullpublictoken', 'queuepartition', 'alldays', 'regdatestr', 'vouchercode', 'is_talkvoter', 'is_volunteer', 'is_admin']
-        d = dict((a, getattr(self, a) and str(getattr(self, a))) for a in attribs)
-        if self.regtype:
-            d['regtype'] = self.regtype.safe_export()
-        else:
-            d['regtype'] = None
-        d['additionaloptions'] = [{'id': ao.id, 'name': ao.name} for ao in self.additionaloptions.all()]
-        return d
+        return ConferenceRegistration.safe_export_multiple(self.conference, [self.id])[0]
+
+    # Export "safe attributes" for a whole set of registrations, returning them
+    # in the same order as the list of ids. Everything is fetched in a single
+    # query, instead of following regtype, days and additional options for each
+    # registration, since this is used for rendering hundreds of badges at once.
+    @classmethod
+    def safe_export_multiple(cls, conference, regids):
+        rows = exec_to_dict("""SELECT r.id, r.firstname, r.lastname, r.email, r.company, r.address, r.phone, r.dietary,
+  r.twittername, r.nick, r.pronouns, r.badgescan, r.shareemail, r.idtoken, r.publictoken, r.vouchercode,
+  country.name AS countryname, country.printable_name AS country, s.shirtsize,
+  rt.id AS regtypeid, rt.regtype, rt.specialtype,
+  rc.id AS regclassid, rc.regclass, rc.badgecolor, rc.badgeforegroundcolor,
+  (SELECT array_agg(rd.day ORDER BY rd.day) FROM confreg_registrationday rd
+   INNER JOIN confreg_registrationtype_days rtd ON rtd.registrationday_id=rd.id
+   WHERE rtd.registrationtype_id=rt.id) AS regtypedays,
+  (SELECT array_agg(DISTINCT rd.day ORDER BY rd.day) FROM confreg_registrationday rd WHERE rd.id IN (
+     SELECT rtd.registrationday_id FROM confreg_registrationtype_days rtd WHERE rtd.registrationtype_id=r.regtype_id
+     UNION
+     SELECT aod.registrationday_id FROM confreg_conferenceadditionaloption_additionaldays aod
+     INNER JOIN confreg_conferenceregistration_additionaloptions crao ON crao.conferenceadditionaloption_id=aod.conferenceadditionaloption_id
+     WHERE crao.conferenceregistration_id=r.id
+  )) AS alldays,
+  (SELECT COALESCE(json_agg(json_build_object('id', ao.id, 'name', ao.name) ORDER BY ao.sortkey, ao.name), '[]')
+   FROM confreg_conferenceadditionaloption ao
+   INNER JOIN confreg_conferenceregistration_additionaloptions crao ON crao.conferenceadditionaloption_id=ao.id
+   WHERE crao.conferenceregistration_id=r.id) AS additionaloptions,
+  r.attendee_id IS NOT NULL AND EXISTS (SELECT 1 FROM confreg_conference_talkvoters tv WHERE tv.user_id=r.attendee_id) AS is_talkvoter,
+  EXISTS (SELECT 1 FROM confreg_conference_volunteers v WHERE v.conferenceregistration_id=r.id) AS is_volunteer,
+  r.attendee_id IS NOT NULL AND EXISTS (SELECT 1 FROM confreg_conference_administrators a WHERE a.conference_id=r.conference_id AND a.user_id=r.attendee_id) AS is_admin
+FROM confreg_conferenceregistration r
+LEFT JOIN confreg_registrationtype rt ON rt.id=r.regtype_id
+LEFT JOIN confreg_registrationclass rc ON rc.id=rt.regclass_id
+LEFT JOIN country ON country.iso=r.country_id
+LEFT JOIN confreg_shirtsize s ON s.id=r.shirtsize_id
+WHERE r.conference_id=%(confid)s AND r.id=ANY(%(regids)s)""", {
+            'confid': conference.id,
+            'regids': list(regids),
+        })
+
+        regclasses = {}
+        exported = {}
+        for r in rows:
+            if conference.queuepartitioning == 1:
+                k = r['lastname'][0].upper()
+            elif conference.queuepartitioning == 2:
+                k = r['firstname'][0].upper()
+            else:
+                k = None
+            if k is not None and not (k >= 'A' and k <= 'Z'):
+                k = "Other"
+
+            alldays = [RegistrationDay(day=d) for d in (r['alldays'] or [])]
+            values = {
+                'countryname': r['countryname'] or '',
+                'pronounstext': PRONOUNS_TEXT[r['pronouns']] if conference.askpronouns and r['pronouns'] != 4 else '',
+                'fullidtoken': "{}/t/id/{}/".format(settings.SITEBASE, r['idtoken']) if r['idtoken'] else '',
+                'fullpublictoken': "{}/t/at/{}/".format(settings.SITEBASE, r['publictoken']) if r['publictoken'] else '',
+                'queuepartition': k,
+                'alldays': alldays,
+                'regdatestr': cls._regdatestr(alldays),
+            }
+            d = dict((a, values[a] if a in values else r[a]) for a in cls._safe_export_attribs)
+            d = dict((a, v and str(v)) for a, v in d.items())
+
+            if r['regtypeid']:
+                if r['regclassid'] and r['regclassid'] not in regclasses:
+                    regclasses[r['regclassid']] = RegistrationClass(
+                        regclass=r['regclass'],
+                        badgecolor=r['badgecolor'],
+                        badgeforegroundcolor=r['badgeforegroundcolor'],
+                    ).safe_export()
+                d['regtype'] = {
+                    'regtype': r['regtype'] and str(r['regtype']),
+                    'specialtype': r['specialtype'] and str(r['specialtype']),
+                    'regclass': regclasses.get(r['regclassid'], None),
+                    'days': [dd.strftime('%Y-%m-%d') for dd in (r['regtypedays'] or [])],
+                }
+            else:
+                d['regtype'] = None
+            d['additionaloptions'] = r['additionaloptions']
+            exported[r['id']] = d
+
+        return [exported[i] for i in regids if i in exported]
 
 
 class ConferenceRegistrationLog(models.Model):
@@ -1275,6 +1352,21 @@ class ConferenceSessionVote(models.Model):
         unique_together = (('session', 'voter',), )
 
 
+class ConferenceSessionFavorite(models.Model):
+    registration = models.ForeignKey(ConferenceRegistration, null=False, blank=False, on_delete=models.CASCADE)
+    session = models.ForeignKey(ConferenceSession, null=False, blank=False, on_delete=models.CASCADE)
+
+    class Meta:
+        unique_together = (('registration', 'session', ), )
+
+
+class ConferenceSessionFavoriteCount(models.Model):
+    # Number of favorites per session, maintained by a trigger on
+    # ConferenceSessionFavorite.
+    session = models.OneToOneField(ConferenceSession, null=False, blank=False, primary_key=True, on_delete=models.CASCADE)
+    num = models.IntegerField(null=False, blank=False, default=0)
+
+
 class ConferenceSessionFeedback(models.Model):
     conference = models.ForeignKey(Conference, null=False, blank=False, on_delete=models.CASCADE)
     session = models.ForeignKey(ConferenceSession, null=False, blank=False, on_delete=models.CASCADE)
@@ -1332,6 +1424,9 @@ class VolunteerSlot(models.Model):
     title = models.CharField(max_length=50, null=False, blank=False)
     min_staff = models.IntegerField(null=False, blank=False, default=1, validators=[MinValueValidator(1)])
     max_staff = models.IntegerField(null=False, blank=False, default=1, validators=[MinValueValidator(1)])
+    # Set by trigger from VolunteerScheduleVersion whenever the slot or any
+    # of its assignments change.
+    version = models.BigIntegerField(null=False, default=0)
 
     class Meta:
         ordering = ['timerange', ]
@@ -1372,6 +1467,30 @@ class VolunteerAssignment(models.Model):
     _safe_attributes = ('id', 'slot', 'reg', 'vol_confirmed', 'org_confirmed')
 
 
+class VolunteerScheduleVersion(models.Model):
+    # Current version of the volunteer schedule, maintained by triggers. The
+    # row is locked by every change to the schedule until it commits, so the
+    # versions are assigned in commit order. There is no foreign key in the
+    # database, since deleting a conference also deletes its assignments,
+    # which may recreate this row after it has been deleted.
+    conference = models.OneToOneField(Conference, null=False, blank=False, primary_key=True, on_delete=models.CASCADE, db_constraint=False)
+    version = models.BigIntegerField(null=False, default=0)
+    # Deletions up to this version have been pruned from VolunteerSlotDeletion,
+    # so clients that haven't seen it yet need the full schedule.
+    prunedversion = models.BigIntegerField(null=False, default=0)
+
+
+class VolunteerSlotDeletion(models.Model):
+    # Slots deleted from the volunteer schedule, recorded by trigger with the
+    # schedule version they were deleted in, so clients fetching changes can
+    # remove them. No foreign key in the database for the same reason as on
+    # VolunteerScheduleVersion.
+    conference = models.ForeignKey(Conference, null=False, blank=False, on_delete=models.CASCADE, db_constraint=False)
+    slotid = models.IntegerField(null=False, blank=False)
+    version = models.BigIntegerField(null=False, blank=False)
+    deletedat = models.DateTimeField(null=False, blank=False, default=timezone.now)
+
+
 class PrepaidBatch(models.Model):
     conference = models.ForeignKey(Conference, null=False, blank=False, on_delete=models.CASCADE)
     regtype = models.ForeignKey(RegistrationType, null=False, blank=False, on_delete=models.CASCADE)
@@ -1893,3 +2012,15 @@ class ConferenceRemovedData(models.Model):
             ('urlname', 'description'),
         )
         ordering = ('urlname', 'description')
+
+
+class BadgeBuildJob(models.Model):
+    conference = models.ForeignKey(Conference, null=False, blank=False, on_delete=models.CASCADE)
+    createdby = models.ForeignKey(User, null=False, blank=False, on_delete=models.CASCADE)
+    createdat = models.DateTimeField(null=False, blank=False, auto_now_add=True)
+    registrations = ArrayField(models.IntegerField(), null=False, blank=False)
+    numbadges = models.IntegerField(null=False, blank=False)
+    completedbadges = models.IntegerField(null=False, blank=False, default=0)
+    finishedat = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(null=False, blank=True)
+    pdf = models.BinaryField(null=True, blank=True)
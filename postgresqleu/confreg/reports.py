@@ -539,71 +539,30 @@ class AttendeeReportManager:
         if format not in ('json', 'badge'):
             # Regular reports, so we control all fields
             rfields = [self.fieldmap[f] for f in fields]
-
-            # Columns to actually select (including expressions)
-            cols = [f.get_select_name() for f in rfields]
-
-            # Table to join in to get the required columns
-            joins = [j.get_join() for j in rfields if j.get_join()]
-
-            # There could be more joins needed for the order by
-            joins.extend([j.get_join() for j in ofields if j.get_join() and j.get_join() not in joins])
-            joinstr = "\n".join(joins)
-            if joinstr:
-                joinstr = "\n" + joinstr
-
-            query = "SELECT r.id,{}\nFROM confreg_conferenceregistration r INNER JOIN confreg_conference conference ON conference.id=r.conference_id{}\nWHERE r.conference_id=%(conference_id)s {}\nORDER BY {}".format(
-                ", ".join(cols),
-                joinstr,
-                where,
-                ", ".join([o.get_orderby_field() for o in ofields]),
-            )
         else:
-            # For json and badge, we have a mostly hardcoded query, but we still get the filter from
-            # above.
-            # We do this hardcoded because the django ORM can't even begin to understand what we're
-            # doing here, and generates a horrible loop of queries.
-            def _get_table_aliased_field(fieldname):
-                # If we have aliased a table, we have to map it in the orderby field as well. So the list of
-                # table aliases here has to match that in the below query
-                if '.' not in fieldname:
-                    return fieldname
-                (table, _f) = fieldname.split('.')
-                return '{}.{}'.format({
-                    'confreg_conferenceregistration': 'r',
-                    'confreg_conference': 'conference',
-                    'confreg_registrationtype': 'rt',
-                    'confreg_registrationclass': 'rc',
-                    'confreg_conferenceregistration_additionaloptions': 'crao',
-                    'confreg_conferenceadditionaloption': 'ao',
-                    'confreg_shirtsize': 's',
-                }.get(table, table), _f)
-
-            query = """SELECT r.id, firstname, lastname, email, company, address, phone, dietary, twittername, nick, badgescan, shareemail, vouchercode,
-  country.name AS countryname, country.printable_name AS country,
-  s.shirtsize,
-  '{}/t/id/' || idtoken || '/' AS fullidtoken,
-  '{}/t/at/' || publictoken || '/' AS fullpublictoken,
-  regexp_replace(upper(substring(CASE WHEN conference.queuepartitioning=1 THEN lastname WHEN conference.queuepartitioning=2 THEN firstname END, 1, 1)), '[^A-Z]', 'Other') AS queuepartition,
-  json_build_object('regtype', rt.regtype, 'specialtype', rt.specialtype,
-    'days', (SELECT array_agg(day) FROM confreg_registrationday rd INNER JOIN confreg_registrationtype_days rtd ON rtd.registrationday_id=rd.id WHERE rtd.registrationtype_id=rt.id),
-  'regclass', json_build_object('regclass', rc.regclass, 'badgecolor', rc.badgecolor, 'badgeforegroundcolor', rc.badgeforegroundcolor,
-        'bgcolortuplestr', CASE WHEN badgecolor!='' THEN ('x'||substring(badgecolor, 2, 2))::bit(8)::int || ',' || ('x'||substring(badgecolor, 4, 2))::bit(8)::int || ',' || ('x'||substring(badgecolor, 6, 2))::bit(8)::int END,
-        'fgcolortuplestr', CASE WHEN badgeforegroundcolor!='' THEN ('x'||substring(badgeforegroundcolor, 2, 2))::bit(8)::int || ',' || ('x'||substring(badgeforegroundcolor, 4, 2))::bit(8)::int || ',' || ('x'||substring(badgeforegroundcolor, 6, 2))::bit(8)::int END
+            # For json and badge, the fields are fixed by the safe export of the
+            # registrations, so we only need the filtered and ordered list of ids
+            # here.
+            rfields = []
+
+        # Columns to actually select (including expressions)
+        cols = ["r.id"] + [f.get_select_name() for f in rfields]
+
+        # Table to join in to get the required columns
+        joins = [j.get_join() for j in rfields if j.get_join()]
+
+        # There could be more joins needed for the order by
+        joins.extend([j.get_join() for j in ofields if j.get_join() and j.get_join() not in joins])
+        joinstr = "\n".join(joins)
+        if joinstr:
+            joinstr = "\n" + joinstr
+
+        query = "SELECT {}\nFROM confreg_conferenceregistration r INNER JOIN confreg_conference conference ON conference.id=r.conference_id{}\nWHERE r.conference_id=%(conference_id)s {}\nORDER BY {}".format(
+            ", ".join(cols),
+            joinstr,
+            where,
+            ", ".join([o.get_orderby_field() for o in ofields]),
         )
-  ) AS regtype,
-  COALESCE(json_agg(json_build_object('id', ao.id, 'name', ao.name)) FILTER (WHERE ao.id IS NOT NULL), '[]') AS additionaloptions
-FROM confreg_conferenceregistration r
-INNER JOIN confreg_conference conference ON conference.id=r.conference_id
-INNER JOIN confreg_registrationtype rt ON rt.id=r.regtype_id
-INNER JOIN confreg_registrationclass rc ON rc.id=rt.regclass_id
-LEFT JOIN confreg_conferenceregistration_additionaloptions crao ON crao.conferenceregistration_id=r.id
-LEFT JOIN confreg_conferenceadditionaloption ao ON crao.conferenceadditionaloption_id=ao.id
-LEFT JOIN country ON country.iso=r.country_id
-LEFT JOIN confreg_shirtsize s ON s.id=r.shirtsize_id
-WHERE r.conference_id=%(conference_id)s {}
-GROUP BY r.id, conference.id, rt.id, rc.id, country.iso, s.id
-ORDER BY {}""".format(settings.SITEBASE, settings.SITEBASE, where, ", ".join([_get_table_aliased_field(o.get_orderby_field()) for o in ofields]))
 
         with ensure_conference_timezone(self.conference):
             result = exec_to_dict(query, params)
@@ -616,13 +575,14 @@ ORDER BY {}""".format(settings.SITEBASE, settings.SITEBASE, where, ", ".join([_g
         elif format == 'csv':
             writer = ReportWriterCsv(request, self.conference, title, borders)
         elif format == 'json':
+            ids = [r['id'] for r in result]
             resp = HttpResponse(content_type='application/json')
-            json.dump(result, resp, indent=2)
+            json.dump([dict(id=i, **d) for i, d in zip(ids, ConferenceRegistration.safe_export_multiple(self.conference, ids))], resp, indent=2)
             return resp
         elif format == 'badge':
             try:
                 resp = HttpResponse(content_type='application/pdf')
-                render_jinja_badges(self.conference, settings.REGISTER_FONTS, result, resp, borders, pagebreaks, orientation, pagesize)
+                render_jinja_badges(self.conference, settings.REGISTER_FONTS, ConferenceRegistration.safe_export_multiple(self.conference, [r['id'] for r in result]), resp, borders, pagebreaks, orientation, pagesize)
                 return resp
             except Exception as e:
                 return HttpResponse("Exception occured: %s" % e, content_type='text/plain')
@@ -807,14 +767,9 @@ ORDER BY 1,3""",
 s.title AS \"Session title\",
 COALESCE(num, 0) AS \"Votes\"
 FROM confreg_conferencesession s
-LEFT JOIN (
-  SELECT unnest(favs) AS sid, count(*) AS num
-  FROM confreg_conferenceregistration r
-  WHERE r.conference_id=%(confid)s
-  GROUP BY sid
-) t ON t.sid=s.id
+LEFT JOIN confreg_conferencesessionfavoritecount t ON t.session_id=s.id
 WHERE s.conference_id=%(confid)s AND s.status=1
-ORDER BY num DESC NULLS LAST, title
+ORDER BY COALESCE(num, 0) DESC, title
 """,
     'queuepartitions': QueuePartitionForm,
 
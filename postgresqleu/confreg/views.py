@@ -20,7 +20,7 @@ from django.views.decorators.csrf import csrf_exempt
 from .models import Conference, ConferenceRegistration, ConferenceSession, ConferenceSeries
 from .models import ConferenceRegistrationLog
 from .models import ConferenceSessionSlides, ConferenceSessionVote, GlobalOptOut
-from .models import ConferenceSessionFeedback, Speaker
+from .models import ConferenceSessionFeedback, ConferenceSessionFavorite, Speaker
 from .models import ConferenceSessionTag
 from .models import ConferenceFeedbackQuestion, ConferenceFeedbackAnswer
 from .models import RegistrationType, PrepaidVoucher, PrepaidBatch, RefundPattern
@@ -79,6 +79,7 @@ from postgresqleu.util.db import exec_to_dict, exec_to_grouped_dict, exec_to_key
 from postgresqleu.util.db import exec_no_result, exec_to_list, exec_to_scalar, conditional_exec_to_scalar
 from postgresqleu.util.db import ensure_conference_timezone
 from postgresqleu.util.qr import generate_base64_qr
+from postgresqleu.util.markup import render_markdown
 from postgresqleu.scheduler.util import trigger_immediate_job_run
 
 from decimal import Decimal
@@ -93,7 +94,6 @@ from io import StringIO
 import xml.etree.ElementTree as ET
 
 import json
-import markdown
 
 
 def _get_registration_signups(conference, reg):
@@ -260,7 +260,7 @@ def news_json(request, confname):
             'titleslug': slugify(n.title),
             'datetime': timezone.localtime(n.datetime),
             'authorname': n.author.fullname,
-            'summary': markdown.markdown(n.summary),
+            'summary': render_markdown(n.summary),
             'inrss': n.inrss,
             'url': '{}/events/{}/news/{}-{}/'.format(settings.SITEBASE, conference.urlname, slugify(n.title), n.id),
         } for n in news]
@@ -1421,7 +1421,7 @@ def schedule_favorite(request, confname):
         if not conference.testers.filter(pk=request.user.id):
             return HttpResponse("Schedule publishing not active", status=403)
 
-    reg = get_object_or_404(ConferenceRegistration.objects.only('id', 'favs'), conference=conference, attendee=request.user)
+    reg = get_object_or_404(ConferenceRegistration.objects.only('id'), conference=conference, attendee=request.user)
 
     def _validate_added_sessions(conference, idlist):
         if ConferenceSession.objects.filter(id__in=idlist).count() != len(idlist):
@@ -1431,10 +1431,13 @@ def schedule_favorite(request, confname):
             return "Attempting to favorite a session that's not approved for this conference"
         return None
 
+    def _get_favs():
+        return list(ConferenceSessionFavorite.objects.filter(registration=reg).order_by('session_id').values_list('session_id', flat=True))
+
     if request.method == 'GET':
         return HttpResponse(
             json.dumps({
-                'favs': reg.favs,
+                'favs': _get_favs(),
             }),
             content_type='application/json',
         )
@@ -1446,6 +1449,7 @@ def schedule_favorite(request, confname):
         except Exception:
             return HttpResponse("Invalid JSON format posted", status=400)
 
+        favs = set(_get_favs())
         if 'favs' in j:
             # Full list of favorites to replace
             if not isinstance(j['favs'], list):
@@ -1454,43 +1458,44 @@ def schedule_favorite(request, confname):
                 if not isinstance(v, int):
                     return HttpResponse("Invalid entry in favs", status=400)
 
-            # Validate all sessions exist
-            if err := _validate_added_sessions(conference, j['favs']):
-                return HttpResponse(err, status=400)
-
-            if reg.favs != sorted(j['favs']):
-                reg.favs = sorted(j['favs'])
-                reg.save(update_fields=['favs'])
+            added = set(j['favs']) - favs
+            removed = favs - set(j['favs'])
         elif 'changes' in j:
             if not isinstance(j['changes'], dict):
                 return HttpResponse("Changes is not an object", status=400)
 
-            modified = False
-            added = []
+            added = set()
+            removed = set()
             for k, v in j['changes'].items():
                 if not k.isnumeric():
-                    return HttpResopnse("Invalid key in favs item", status=400)
+                    return HttpResponse("Invalid key in favs item", status=400)
                 if not isinstance(v, bool):
                     return HttpResponse("Invalid value type for favs item", status=400)
-                if v and int(k) not in reg.favs:
-                    reg.favs.append(int(k))
-                    added.append(int(k))
-                    modified = True
-                elif int(k) in reg.favs and not v:
-                    reg.favs.remove(int(k))
-                    modified = True
-            if modified:
-                if err := _validate_added_sessions(conference, added):
-                    return HttpResponse(err, status=400)
-
-                reg.favs = sorted(reg.favs)
-                reg.save(update_fields=['favs'])
+                if v and int(k) not in favs:
+                    added.add(int(k))
+                elif int(k) in favs and not v:
+                    removed.add(int(k))
         else:
             return HttpResponse("Keys missing", status=400)
 
+        # Validate all added sessions exist
+        if added:
+            if err := _validate_added_sessions(conference, added):
+                return HttpResponse(err, status=400)
+
+        # Only the changed favorites are written, and the per-session counts
+        # are updated by a trigger.
+        with transaction.atomic():
+            if removed:
+                ConferenceSessionFavorite.objects.filter(registration=reg, session_id__in=removed).delete()
+            if added:
+                ConferenceSessionFavorite.objects.bulk_create([
+                    ConferenceSessionFavorite(registration=reg, session_id=sid) for sid in added
+                ], ignore_conflicts=True)
+
         return HttpResponse(
             json.dumps({
-                'favs': reg.favs,
+                'favs': sorted((favs | added) - removed),
             }),
             content_type='application/json',
         )
@@ -3089,30 +3094,58 @@ def createschedule(request, confname):
         if not request.user.is_superuser and not is_admin:
             raise PermissionDenied('Only administrators can save!')
 
-        # Remove all the existing mappings, and add new ones
-        # Yes, we do this horribly inefficiently, but it doesn't run very
-        # often at all...
+        # Parse the complete slot map once, into sessionid -> (roomid, slotid).
+        # Slot ids on the page are encoded as roomid * 1000000 + slotid.
         re_slot = re.compile(r'^slot(\d+)$')
-        for sess in conference.conferencesession_set.all():
-            found = False
-            for k, v in list(request.POST.items()):
-                if v == "sess%s" % sess.id:
-                    sm = re_slot.match(k)
-                    if not sm:
-                        raise Exception("Could not find slot, invalid data in POST")
-                    roomid = int(int(sm.group(1)) // 1000000)
-                    slotid = int(sm.group(1)) % 1000000
-                    if sess.tentativeroom is None or sess.tentativeroom.id != roomid or sess.tentativescheduleslot is None or sess.tentativescheduleslot.id != slotid:
-                        sess.tentativeroom = Room.objects.get(pk=roomid)
-                        sess.tentativescheduleslot = ConferenceSessionScheduleSlot.objects.get(pk=slotid)
-                        sess.save()
-                    found = True
-                    break
-            if not found:
-                if sess.tentativescheduleslot:
-                    sess.tentativescheduleslot = None
-                    sess.save()
-        return HttpResponse("OK")
+        re_sess = re.compile(r'^sess(\d+)$')
+        wanted = {}
+        for k, v in request.POST.items():
+            if k == 'csrfmiddlewaretoken':
+                continue
+            sm = re_slot.match(k)
+            ssm = re_sess.match(v)
+            if not sm or not ssm:
+                raise Exception("Could not find slot, invalid data in POST")
+            wanted[int(ssm.group(1))] = (int(sm.group(1)) // 1000000, int(sm.group(1)) % 1000000)
+
+        # Resolve all referenced rooms and slots in bulk, and make sure they
+        # actually belong to this conference.
+        roomids = set(r for r, s in wanted.values())
+        slotids = set(s for r, s in wanted.values())
+        if len(roomids) != Room.objects.filter(conference=conference, pk__in=roomids).count():
+            raise Exception("Invalid room specified in POST")
+        if len(slotids) != ConferenceSessionScheduleSlot.objects.filter(conference=conference, pk__in=slotids).count():
+            raise Exception("Invalid slot specified in POST")
+
+        # Compare against the current state and only write the sessions
+        # whose tentative assignment actually changed.
+        now = timezone.now()
+        changed = []
+        delta = {}
+        for sess in conference.conferencesession_set.only('id', 'tentativeroom_id', 'tentativescheduleslot_id'):
+            if sess.id in wanted:
+                roomid, slotid = wanted.pop(sess.id)
+                if sess.tentativeroom_id != roomid or sess.tentativescheduleslot_id != slotid:
+                    sess.tentativeroom_id = roomid
+                    sess.tentativescheduleslot_id = slotid
+                    sess.lastmodified = now
+                    changed.append(sess)
+                    delta['sess{}'.format(sess.id)] = 'slot{}'.format(roomid * 1000000 + slotid)
+            elif sess.tentativescheduleslot_id:
+                sess.tentativescheduleslot_id = None
+                sess.lastmodified = now
+                changed.append(sess)
+                delta['sess{}'.format(sess.id)] = None
+
+        if wanted:
+            raise Exception("Invalid session specified in POST")
+
+        if changed:
+            ConferenceSession.objects.bulk_update(changed, ['tentativeroom', 'tentativescheduleslot', 'lastmodified'])
+
+        # Return only what changed, so the client can save after every
+        # single move without having to reload the whole schedule.
+        return HttpResponse(json.dumps(delta), content_type="application/json")
 
     # Not post - so generate the page
 
@@ -3135,12 +3168,7 @@ def createschedule(request, confname):
 FROM confreg_conferencesession s
 LEFT JOIN confreg_conferencesession_speaker csp ON csp.conferencesession_id=s.id
 LEFT JOIN confreg_speaker spk ON spk.id=csp.speaker_id
-LEFT JOIN (
-  SELECT unnest(favs) AS sid, count(*) AS num
-  FROM confreg_conferenceregistration r
-  WHERE r.conference_id=%(confid)s
-  GROUP BY sid
-) t ON t.sid=s.id
+LEFT JOIN confreg_conferencesessionfavoritecount t ON t.session_id=s.id
 WHERE conference_id=%(confid)s AND status IN (1,3) AND NOT cross_schedule
 GROUP BY s.id
 ORDER BY starttime, id""", {
@@ -12,7 +12,7 @@ from postgresqleu.util.db import exec_to_dict
 from postgresqleu.util.request import get_int_or_error
 
 from .models import ConferenceRegistration
-from .models import VolunteerSlot, VolunteerAssignment
+from .models import VolunteerSlot, VolunteerAssignment, VolunteerScheduleVersion, VolunteerSlotDeletion
 from .util import send_conference_notification_template, get_conference_or_404
 
 
@@ -91,6 +91,36 @@ def _slot_return_data(slot):
     }
 
 
+def _schedule_changes(conference, since):
+    # Read the version before the slots, so anything committed in between is
+    # returned both now and in the next delta, rather than not at all.
+    version, prunedversion = VolunteerScheduleVersion.objects.filter(conference=conference).values_list('version', 'prunedversion').first() or (0, 0)
+
+    # Old slot deletions are pruned, so anybody who last looked before that
+    # gets the full schedule instead.
+    if since is not None and since < prunedversion:
+        since = None
+
+    slots = VolunteerSlot.objects.prefetch_related('volunteerassignment_set', 'volunteerassignment_set__reg').filter(conference=conference)
+    if since is not None:
+        slots = slots.filter(version__gt=since)
+        deleted = list(VolunteerSlotDeletion.objects.filter(conference=conference, version__gt=since).values_list('slotid', flat=True))
+    else:
+        deleted = []
+    slots = list(slots)
+
+    ret = {
+        'version': version,
+        'slots': [_slot_return_data(slot) for slot in slots],
+        'deleted': deleted,
+        'full': since is None,
+    }
+    # Stats only change when assignments do, and those change (or delete) the slot
+    if slots or deleted or since is None:
+        ret['stats'] = _get_volunteer_stats(conference)
+    return ret
+
+
 @login_required
 @transaction.atomic
 def volunteerschedule_api(request, urlname, adm=False):
@@ -102,10 +132,13 @@ def volunteerschedule_api(request, urlname, adm=False):
     is_admin = can_admin and adm
 
     if request.method == 'GET':
-        # GET just always returns the complete volunteer schedule
-        slots = VolunteerSlot.objects.prefetch_related('volunteerassignment_set', 'volunteerassignment_set__reg').filter(conference=conference)
-        return HttpResponse(json.dumps({
-            'slots': [_slot_return_data(slot) for slot in slots],
+        # GET returns the complete volunteer schedule, or if a version is given,
+        # the slots that have changed since that version.
+        if 'since' in request.GET:
+            return HttpResponse(json.dumps(_schedule_changes(conference, get_int_or_error(request.GET, 'since'))), content_type='application/json')
+
+        ret = _schedule_changes(conference, None)
+        ret.update({
             'volunteers': [{
                 'id': vol.id,
                 'name': vol.fullname,
@@ -115,8 +148,8 @@ def volunteerschedule_api(request, urlname, adm=False):
                 'isvolunteer': conference.volunteers.filter(pk=reg.pk).exists(),
                 'regid': reg.id,
             },
-            'stats': _get_volunteer_stats(conference),
-        }), content_type='application/json')
+        })
+        return HttpResponse(json.dumps(ret), content_type='application/json')
 
     if request.method != 'POST':
         raise Http404()
@@ -126,9 +159,11 @@ def volunteerschedule_api(request, urlname, adm=False):
 
     slotid = get_int_or_error(request.POST, 'slotid')
     volid = get_int_or_error(request.POST, 'volid')
+    since = get_int_or_error(request.POST, 'since') if 'since' in request.POST else None
 
-    # We should always have a valid slot
-    slot = get_object_or_404(VolunteerSlot, conference=conference, pk=slotid)
+    # We should always have a valid slot. Lock it, so the checks for it being
+    # full can't race with somebody else signing up for the same slot.
+    slot = get_object_or_404(VolunteerSlot.objects.select_for_update(), conference=conference, pk=slotid)
 
     code = None
     err = None
@@ -153,13 +188,11 @@ def volunteerschedule_api(request, urlname, adm=False):
             status=code,
         )
 
-    # Re-query the database to pick up any changes, and return the complete object
-    slot = VolunteerSlot.objects.prefetch_related('volunteerassignment_set', 'volunteerassignment_set__reg').filter(conference=conference, pk=slot.pk)[0]
-    return HttpResponse(json.dumps({
-        'err': None,
-        'slot': _slot_return_data(slot),
-        'stats': _get_volunteer_stats(conference),
-    }), content_type='application/json')
+    # Return everything that has changed since the client last looked, which
+    # includes the slot we just changed.
+    ret = _schedule_changes(conference, since)
+    ret['err'] = None
+    return HttpResponse(json.dumps(ret), content_type='application/json')
 
 
 @login_required
@@ -184,7 +217,14 @@ def volunteerschedule(request, urlname, adm=False):
     })
 
 
+def _lock_volunteer(reg):
+    # Lock the volunteer, so two concurrent signups for overlapping slots
+    # can't both pass the overlap check. Slots are always locked first.
+    ConferenceRegistration.objects.select_for_update(no_key=True).only('id').get(pk=reg.pk)
+
+
 def _signup(request, conference, reg, adm, slot):
+    _lock_volunteer(reg)
     if VolunteerAssignment.objects.filter(slot=slot, reg=reg).exists():
         return 409, "Already a volunteer for selected slot"
     elif slot.countvols >= slot.max_staff:
@@ -202,6 +242,7 @@ def _signup(request, conference, reg, adm, slot):
 
 def _add(request, conference, reg, adm, slot, volid):
     addreg = get_object_or_404(ConferenceRegistration, conference=conference, id=volid)
+    _lock_volunteer(addreg)
     if VolunteerAssignment.objects.filter(slot=slot, reg=addreg).exists():
         return 409, "Already a volunteer for selected slot"
     elif slot.countvols >= slot.max_staff:
@@ -13,6 +13,11 @@ class BaseBenefit(object):
     def render_claimdata(self, claimedbenefit, isadmin):
         return ''
 
+    def prefetch_claimdata(self, claimedbenefits):
+        # Called with all claims of this benefit before get_claimdata() is
+        # called on them, to allow loading any extra data in bulk.
+        pass
+
     def get_claimdata(self, claimedbenefit):
         return {}
 
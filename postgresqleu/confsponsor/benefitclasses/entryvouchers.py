@@ -1,6 +1,7 @@
 from django import forms
 from django.core.validators import MaxValueValidator, MinValueValidator, ValidationError
 from django.contrib.auth.models import User
+from django.db.models import Count
 
 import base64
 import os
@@ -128,10 +129,22 @@ class EntryVouchers(BaseBenefit):
         s.write("</table>")
         return s.getvalue()
 
+    def prefetch_claimdata(self, claimedbenefits):
+        self._usedcounts = dict(
+            PrepaidVoucher.objects.filter(
+                batch__in=[c.claimjson['batchid'] for c in claimedbenefits],
+                user__isnull=False,
+            ).values_list('batch').annotate(Count('id')).order_by()
+        )
+
     def get_claimdata(self, claimedbenefit):
+        if hasattr(self, '_usedcounts'):
+            used = self._usedcounts.get(claimedbenefit.claimjson['batchid'], 0)
+        else:
+            used = PrepaidVoucher.objects.filter(batch=claimedbenefit.claimjson['batchid'], user__isnull=False).count()
         return {
             'total': claimedbenefit.claimjson.get('numvouchers', 0),
-            'used': PrepaidVoucher.objects.filter(batch=claimedbenefit.claimjson['batchid'], user__isnull=False).count(),
+            'used': used,
         }
 
     def render_reportinfo(self, claimedbenefit):
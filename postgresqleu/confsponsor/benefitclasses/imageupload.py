@@ -154,11 +154,18 @@ class ImageUpload(BaseBenefit):
             return '<div class="sponsor-imagepreview"><span>Uploaded image: </span><img src="/events/sponsor/admin/imageview/{}/" /></div><div class="sponsor-imagepreview"><span>Preview on background: </span><img src="/events/sponsor/admin/imageview/{}/" style="background-color: {}" /></div>'.format(claimedbenefit.id, claimedbenefit.id, self.params.get('previewbackground'))
         return 'Uploaded image: <img src="/events/sponsor/admin/imageview/%s/" />' % claimedbenefit.id
 
+    def prefetch_claimdata(self, claimedbenefits):
+        self._tags = InlineEncodedStorage('benefit_image').get_tags([c.id for c in claimedbenefits])
+
     def get_claimdata(self, claimedbenefit):
+        if hasattr(self, '_tags'):
+            tag = self._tags.get(claimedbenefit.id, None)
+        else:
+            tag = InlineEncodedStorage('benefit_image').get_tag(claimedbenefit.id)
         return {
             'image': {
                 'suburl': '/{}'.format(claimedbenefit.id),
-                'tag': InlineEncodedStorage('benefit_image').get_tag(claimedbenefit.id),
+                'tag': tag,
             },
         }
 
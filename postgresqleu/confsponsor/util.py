@@ -1,4 +1,4 @@
-from django.db.models import Q
+from django.db.models import Q, Prefetch
 from django.shortcuts import get_object_or_404
 from django.conf import settings
 from django.utils import timezone
@@ -57,7 +57,7 @@ ORDER BY max(b.sortkey), a.overview_name""", {
                 'benefits': [dict(_get_benefit_data(b)) for b in lvl.sponsorshipbenefit_set.all()
                 ],
             }
-            for lvl in SponsorshipLevel.objects.filter(conference=conference, public=True)
+            for lvl in SponsorshipLevel.objects.filter(conference=conference, public=True).prefetch_related('sponsorshipbenefit_set')
         ],
         'sponsorbenefitsbylevel': [
             {
@@ -71,6 +71,35 @@ ORDER BY max(b.sortkey), a.overview_name""", {
 
 
 def sponsorclaimsdata(conference):
+    # Fetch all levels, confirmed sponsors and their claims in one query each,
+    # rather than walking the relations one sponsor at a time.
+    levels = list(SponsorshipLevel.objects.filter(conference=conference).prefetch_related(
+        Prefetch(
+            'sponsor_set',
+            queryset=Sponsor.objects.filter(confirmed=True).order_by('signupat').prefetch_related(
+                Prefetch(
+                    'sponsorclaimedbenefit_set',
+                    queryset=SponsorClaimedBenefit.objects.select_related('benefit').filter(declined=False, benefit__include_in_data=True).order_by('id'),
+                    to_attr='dataclaims',
+                ),
+            ),
+            to_attr='confirmedsponsors',
+        ),
+    ))
+
+    # Instantiate each benefit class only once per benefit instead of once
+    # per claim, and let it load whatever it needs for all claims at once.
+    benefitclasses = {}
+    claims_by_benefit = {}
+    for lvl in levels:
+        for s in lvl.confirmedsponsors:
+            for b in s.dataclaims:
+                claims_by_benefit.setdefault(b.benefit_id, []).append(b)
+                if b.benefit_id not in benefitclasses:
+                    benefitclasses[b.benefit_id] = get_benefit_class(b.benefit.benefit_class)(lvl, b.benefit.class_parameters)
+    for benefitid, claims in claims_by_benefit.items():
+        benefitclasses[benefitid].prefetch_claimdata(claims)
+
     return {
         'sponsors': {
             'bylevel': [
@@ -83,15 +112,15 @@ def sponsorclaimsdata(conference):
                             'name': s.displayname,
                             'confirmedat': s.confirmedat,
                             'signedupat': s.signupat
-                        } for s in lvl.sponsor_set.filter(confirmed=True).order_by('signupat')
+                        } for s in lvl.confirmedsponsors
                     ],
-                } for lvl in SponsorshipLevel.objects.filter(conference=conference)],
+                } for lvl in levels],
             'sponsors': {
                 s.displayname: {
                     'name': s.displayname,
                     'url': s.url,
                     'social': s.social,
-                    'level': s.level.levelname,
+                    'level': lvl.levelname,
                     'signedupat': s.signupat,
                     'confirmedat': s.confirmedat,
                     'benefits': [
@@ -100,10 +129,10 @@ def sponsorclaimsdata(conference):
                             'name': b.benefit.benefitname,
                             'confirmed': b.confirmed,
                             'class': all_benefits[b.benefit.benefit_class]['class'],
-                            'claim': get_benefit_class(b.benefit.benefit_class)(s.level, b.benefit.class_parameters).get_claimdata(b),
-                        } for b in s.sponsorclaimedbenefit_set.select_related('benefit').filter(declined=False, benefit__include_in_data=True).order_by('id')
+                            'claim': benefitclasses[b.benefit_id].get_claimdata(b),
+                        } for b in s.dataclaims
                     ]
-                } for s in Sponsor.objects.select_related('level').filter(conference=conference, confirmed=True)}
+                } for lvl in levels for s in lvl.confirmedsponsors}
         }
     }
 
@@ -2,7 +2,7 @@ from collections import OrderedDict
 from django.utils.text import Truncator
 
 from postgresqleu.util.backendforms import BackendForm
-from postgresqleu.elections.models import Election, Candidate
+from postgresqleu.elections.models import Election, Candidate, ElectionResult
 
 
 class BackendCandidateForm(BackendForm):
@@ -48,3 +48,9 @@ class BackendElectionForm(BackendForm):
     class Meta:
         model = Election
         fields = ['name', 'startdate', 'enddate', 'slots', 'intro', 'isactive', 'resultspublic', ]
+
+    def post_save(self):
+        # Changing the number of slots changes who is elected, so have the
+        # results recalculated the next time they are viewed.
+        ElectionResult.objects.filter(election=self.instance).delete()
+        Election.objects.filter(pk=self.instance.pk).update(resultsat=None)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0005_election_intro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionResult',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.IntegerField()),
+                ('width', models.IntegerField()),
+                ('elected', models.CharField(max_length=10)),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='elections.candidate')),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='elections.election')),
+            ],
+            options={
+                'unique_together': {('election', 'candidate')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elections', '0006_electionresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='resultsat',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE elections_election e SET resultsat=CURRENT_TIMESTAMP WHERE EXISTS (SELECT 1 FROM elections_electionresult r WHERE r.election_id=e.id)",
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -11,6 +11,9 @@ class Election(models.Model):
     isactive = models.BooleanField(null=False, default=False, verbose_name='Election active')
     resultspublic = models.BooleanField(null=False, default=False, verbose_name='Results public')
     intro = models.TextField(null=False, blank=True, verbose_name="Introduction text")
+    # Set when the results have been calculated and stored in ElectionResult,
+    # including when there were no results to store.
+    resultsat = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -34,3 +37,18 @@ class Vote(models.Model):
     voter = models.ForeignKey(Member, null=False, blank=False, on_delete=models.CASCADE)
     candidate = models.ForeignKey(Candidate, null=False, blank=False, on_delete=models.CASCADE)
     score = models.IntegerField(null=False, blank=False)
+
+
+class ElectionResult(models.Model):
+    # Results of a closed election, calculated the first time they are viewed
+    # since the votes can no longer change at that point.
+    election = models.ForeignKey(Election, null=False, blank=False, on_delete=models.CASCADE)
+    candidate = models.ForeignKey(Candidate, null=False, blank=False, on_delete=models.CASCADE)
+    score = models.IntegerField(null=False, blank=False)
+    width = models.IntegerField(null=False, blank=False)
+    elected = models.CharField(max_length=10, null=False, blank=False)
+
+    class Meta:
+        unique_together = (
+            ('election', 'candidate'),
+        )
@@ -1,10 +1,12 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import HttpResponseRedirect, Http404
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.utils import timezone
 
 from postgresqleu.util.time import today_global
-from postgresqleu.util.db import exec_to_dict
-from .models import Election, Member, Candidate, Vote
+from postgresqleu.util.db import exec_no_result
+from .models import Election, Member, Candidate, Vote, ElectionResult
 from .forms import VoteForm
 from datetime import timedelta
 
@@ -22,47 +24,70 @@ def home(request):
     })
 
 
-def election(request, electionid):
-    election = get_object_or_404(Election, pk=electionid)
-    if not election.isactive:
-        raise Http404("This election is not active")
+def _get_results(election):
+    # The results can't change once the election is closed, so they are only
+    # calculated once and then stored, and after that just read.
+    if not election.resultsat:
+        _calculate_results(election)
 
-    if election.startdate > today_global():
-        raise Http404("This election has not started yet")
+    return ElectionResult.objects.select_related('candidate').filter(election=election).order_by('-score', 'candidate__name')
 
-    if election.enddate < today_global():
-        # Election is closed, consider publishing the results
-        if not election.resultspublic:
-            # If user is an admin, show anyway, otherwise throw an error
-            if not request.user.is_superuser:
-                raise Http404("The results for this election aren't published yet.")
 
-        # Ok, so we do have the results. Use a custom query to make sure we get decently formatted data
+@transaction.atomic
+def _calculate_results(election):
+    # Lock the election and check again, so concurrent first views don't
+    # both store them.
+    if Election.objects.select_for_update().get(pk=election.pk).resultsat is None:
+        # Use a custom query to make sure we get decently formatted data
         # and no client-side ORM aggregation
-        scores = exec_to_dict("""WITH t AS (
- SELECT c.name, sum(v.score) AS score
+        exec_no_result("""WITH t AS (
+ SELECT c.id, sum(v.score) AS score
  FROM elections_candidate c
  INNER JOIN elections_vote v ON c.id=v.candidate_id
  WHERE v.election_id=%(election)s AND c.election_id=%(election)s
  GROUP BY c.id
  ), tt AS (
 SELECT
- name, score,
+ id, score,
  rank() OVER (ORDER BY score DESC) AS rank,
  count(1) OVER (PARTITION BY score) AS numingroup
  FROM t
 )
-SELECT name, score,
+INSERT INTO elections_electionresult (election_id, candidate_id, score, width, elected)
+SELECT %(election)s, id, score,
  %(barwidth)s * score / first_value(score) OVER (ORDER BY score DESC) AS width,
  CASE WHEN rank+numingroup-2 < %(slots)s THEN 'Elected'
       WHEN rank+numingroup-2 = %(slots)s AND numingroup>1 THEN 'Tied'
       ELSE 'Lost' END AS elected
-FROM tt
-ORDER BY 2 DESC""", {
+FROM tt""", {
             'election': election.pk,
             'slots': election.slots,
             'barwidth': 300,
         })
+        Election.objects.filter(pk=election.pk).update(resultsat=timezone.now())
+
+
+def election(request, electionid):
+    election = get_object_or_404(Election, pk=electionid)
+    if not election.isactive:
+        raise Http404("This election is not active")
+
+    if election.startdate > today_global():
+        raise Http404("This election has not started yet")
+
+    if election.enddate < today_global():
+        # Election is closed, consider publishing the results
+        if not election.resultspublic:
+            # If user is an admin, show anyway, otherwise throw an error
+            if not request.user.is_superuser:
+                raise Http404("The results for this election aren't published yet.")
+
+        scores = [{
+            'name': r.candidate.name,
+            'score': r.score,
+            'width': r.width,
+            'elected': r.elected,
+        } for r in _get_results(election)]
         if len(scores) == 0:
             raise Http404('No results found for this election')
 
@@ -13,6 +13,7 @@ from postgresqleu.invoices.util import register_bank_transaction
 from postgresqleu.invoices.models import InvoicePaymentMethod
 from postgresqleu.mailqueue.util import send_simple_mail
 from postgresqleu.gocardless.models import GocardlessTransaction
+from postgresqleu.util.db import bulk_insert_new
 
 from datetime import time
 from decimal import Decimal
@@ -44,38 +45,39 @@ class Command(BaseCommand):
     def handle_method(self, method):
         impl = method.get_implementation()
 
-        for t in impl.fetch_transactions():
-            trans, created = GocardlessTransaction.objects.get_or_create(
+        transactions = [
+            GocardlessTransaction(
                 paymentmethod=method,
                 transactionid=t['transactionId'],
-                defaults={
-                    'date': t['bookingDate'],
-                    'amount': Decimal(str(t['transactionAmount']['amount'])),
-                    'paymentref': ' '.join(t['remittanceInformationUnstructuredArray'])[:200],
-                    'transactionobject': t,
-                }
-            )
-            if created:
-                if method.config.get('notify_each_transaction', False):
-                    send_simple_mail(
-                        settings.INVOICE_SENDER_EMAIL,
-                        method.config['notification_receiver'],
-                        "Gocardless transaction received on {}".format(method.internaldescription),
-                        "A new gocardless transaction has been registered for {}:\n\nDate:   {}\nAmount: {}\nText:   {}\n".format(
-                            method.internaldescription,
-                            trans.date,
-                            trans.amount,
-                            trans.paymentref,
-                        ),
-                    )
+                date=t['bookingDate'],
+                amount=Decimal(str(t['transactionAmount']['amount'])),
+                paymentref=' '.join(t['remittanceInformationUnstructuredArray'])[:200],
+                transactionobject=t,
+            ) for t in impl.fetch_transactions()
+        ]
 
-                # Also register a pending bank transaction. This may immediately match an invoice
-                # if it was an invoice payment, in which case the entire process will complete..
-                if self.do_banktransactions:
-                    register_bank_transaction(
-                        method,
-                        trans.id,
+        # Only the transactions we haven't seen before get created
+        for trans in bulk_insert_new(GocardlessTransaction, transactions, ['paymentmethod', 'transactionid']):
+            if method.config.get('notify_each_transaction', False):
+                send_simple_mail(
+                    settings.INVOICE_SENDER_EMAIL,
+                    method.config['notification_receiver'],
+                    "Gocardless transaction received on {}".format(method.internaldescription),
+                    "A new gocardless transaction has been registered for {}:\n\nDate:   {}\nAmount: {}\nText:   {}\n".format(
+                        method.internaldescription,
+                        trans.date,
                         trans.amount,
                         trans.paymentref,
-                        trans.paymentref,
-                    )
+                    ),
+                )
+
+            # Also register a pending bank transaction. This may immediately match an invoice
+            # if it was an invoice payment, in which case the entire process will complete..
+            if self.do_banktransactions:
+                register_bank_transaction(
+                    method,
+                    trans.id,
+                    trans.amount,
+                    trans.paymentref,
+                    trans.paymentref,
+                )
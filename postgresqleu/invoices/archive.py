@@ -0,0 +1,74 @@
+# Build zip archives of invoice and receipt PDFs, typically for handing over
+# to the auditors at the end of the year.
+#
+# The archive is generated as a stream, reading the invoices through a
+# server side cursor, so neither the full set of PDFs nor the resulting
+# archive ever has to be held in memory.
+#
+import base64
+import zipfile
+
+from .models import Invoice
+
+
+# Size of the base64 encoded chunks to decode at a time. Must be a multiple
+# of 4 so each chunk decodes on its own.
+_DECODE_CHUNK_SIZE = 4 * 256 * 1024
+
+
+class _ZipStream(object):
+    # Write-only file object for zipfile, which collects the output until it
+    # is picked up by the generator. Since it can't seek, zipfile will write
+    # the sizes after the data instead of going back to update the headers.
+    def __init__(self):
+        self.buf = []
+
+    def write(self, b):
+        self.buf.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def get(self):
+        b = b''.join(self.buf)
+        self.buf = []
+        return b
+
+
+def get_archive_invoices(startdate, enddate, paymentmethod=None):
+    invoices = Invoice.objects.filter(
+        finalized=True,
+        deleted=False,
+        invoicedate__date__gte=startdate,
+        invoicedate__date__lte=enddate,
+    )
+    if paymentmethod:
+        invoices = invoices.filter(paidusing=paymentmethod)
+    return invoices
+
+
+def stream_invoice_archive(invoices, include_invoice=True, include_receipt=True):
+    fields = []
+    if include_invoice:
+        fields.append(('invoice', 'pdf_invoice'))
+    if include_receipt:
+        fields.append(('receipt', 'pdf_receipt'))
+
+    stream = _ZipStream()
+
+    # The PDFs are already compressed, so just store them.
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as zf:
+        for row in invoices.order_by('id').values_list('id', *[f for p, f in fields]).iterator(chunk_size=20):
+            for (prefix, field), pdf in zip(fields, row[1:]):
+                if not pdf:
+                    continue
+
+                with zf.open('{}_{}.pdf'.format(prefix, row[0]), 'w') as f:
+                    for i in range(0, len(pdf), _DECODE_CHUNK_SIZE):
+                        f.write(base64.b64decode(pdf[i:i + _DECODE_CHUNK_SIZE]))
+                        yield stream.get()
+
+    # Remaining data and the central directory are written when the archive
+    # is closed.
+    yield stream.get()
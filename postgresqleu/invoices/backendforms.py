@@ -1,7 +1,7 @@
 import django.forms
 
 from postgresqleu.util.backendforms import BackendForm, BackendBeforeNewForm
-from postgresqleu.util.widgets import TestButtonWidget
+from postgresqleu.util.widgets import TestButtonWidget, HtmlDateInput
 from postgresqleu.invoices.models import VatRate, VatValidationCache, InvoicePaymentMethod
 
 from postgresqleu.util.payment import payment_implementation_choices
@@ -106,3 +106,20 @@ class BankfilePaymentMethodChoiceForm(django.forms.Form):
         methods = kwargs.pop('methods')
         super().__init__(*args, **kwargs)
         self.fields['paymentmethod'].queryset = methods
+
+
+class InvoiceArchiveForm(django.forms.Form):
+    startdate = django.forms.DateField(required=True, label="Start date", widget=HtmlDateInput())
+    enddate = django.forms.DateField(required=True, label="End date", widget=HtmlDateInput())
+    paymentmethod = django.forms.ModelChoiceField(queryset=InvoicePaymentMethod.objects.all().order_by('internaldescription'), required=False, label="Payment method",
+                                                  help_text="Only include invoices paid using this payment method")
+    include_invoice = django.forms.BooleanField(required=False, initial=True, label="Include invoices")
+    include_receipt = django.forms.BooleanField(required=False, initial=True, label="Include receipts")
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('startdate') and cleaned_data.get('enddate') and cleaned_data['enddate'] < cleaned_data['startdate']:
+            self.add_error('enddate', 'End date must be after start date')
+        if not (cleaned_data.get('include_invoice') or cleaned_data.get('include_receipt')):
+            self.add_error('include_invoice', 'Must include at least one of invoices and receipts')
+        return cleaned_data
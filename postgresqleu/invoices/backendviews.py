@@ -1,5 +1,5 @@
 from django.core.exceptions import PermissionDenied
-from django.http import HttpResponseRedirect, Http404
+from django.http import HttpResponseRedirect, Http404, StreamingHttpResponse
 from django.utils.html import escape
 from django.shortcuts import get_object_or_404, render
 from django.contrib import messages
@@ -28,7 +28,9 @@ from postgresqleu.invoices.backendforms import BackendVatRateForm
 from postgresqleu.invoices.backendforms import BackendVatValidationCacheForm
 from postgresqleu.invoices.backendforms import BackendInvoicePaymentMethodForm
 from postgresqleu.invoices.backendforms import BankfilePaymentMethodChoiceForm
+from postgresqleu.invoices.backendforms import InvoiceArchiveForm
 from postgresqleu.invoices.util import register_bank_transaction
+from postgresqleu.invoices.archive import get_archive_invoices, stream_invoice_archive
 
 import re
 import base64
@@ -653,3 +655,32 @@ ORDER BY 1,2;
         'data': data,
         'helplink': 'payment',
     })
+
+
+def archive(request):
+    authenticate_backend_group(request, 'Invoice managers')
+
+    if request.method == 'POST':
+        form = InvoiceArchiveForm(data=request.POST)
+        if form.is_valid():
+            invoices = get_archive_invoices(form.cleaned_data['startdate'], form.cleaned_data['enddate'], form.cleaned_data['paymentmethod'])
+            resp = StreamingHttpResponse(
+                stream_invoice_archive(invoices, form.cleaned_data['include_invoice'], form.cleaned_data['include_receipt']),
+                content_type='application/zip',
+            )
+            resp['Content-Disposition'] = 'attachment; filename="invoices_{}_{}.zip"'.format(form.cleaned_data['startdate'], form.cleaned_data['enddate'])
+            return resp
+    else:
+        form = InvoiceArchiveForm()
+
+    return render(request, 'confreg/admin_backend_form.html', {
+        'basetemplate': 'adm/admin_base.html',
+        'form': form,
+        'whatverb': 'Export',
+        'what': 'invoice archive',
+        'savebutton': 'Download archive',
+        'cancelurl': '/admin/',
+        'cancelname': 'Back',
+        'topadmin': 'Invoices',
+        'helplink': 'payment',
+    })
@@ -60,7 +60,7 @@ class InvoiceForm(forms.ModelForm):
 
     class Meta:
         model = Invoice
-        exclude = ['finalized', 'pdf_invoice', 'pdf_receipt', 'paidat', 'paymentdetails', 'paidusing', 'processor', 'processorid', 'deleted', 'deletion_reason', 'refund', 'recipient_secret']
+        exclude = ['finalized', 'pdf_invoice', 'pdf_receipt', 'receipt_pending', 'paidat', 'paymentdetails', 'paidusing', 'processor', 'processorid', 'deleted', 'deletion_reason', 'refund', 'recipient_secret']
         widgets = {
             # Can't use HtmlDateInput since that truncates to just date
             #            'invoicedate': HtmlDateInput(),
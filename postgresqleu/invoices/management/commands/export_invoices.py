@@ -39,6 +39,13 @@ class Command(BaseCommand):
             )))
             sys.exit(1)
 
+        if options['receipt']:
+            noreceipt = [i.id for i in invoices if i.receipt_pending or not i.pdf_receipt]
+            if noreceipt:
+                # Receipts are generated in the background once the invoice is paid
+                print("Invoices with ids {} have no receipt yet".format(", ".join(str(i) for i in noreceipt)))
+                sys.exit(1)
+
         for i in invoices:
             if options['invoice']:
                 with open(os.path.join(options['directory'], 'invoice_{}.pdf'.format(i.id)), 'wb') as f:
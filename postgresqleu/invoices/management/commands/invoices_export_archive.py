@@ -0,0 +1,48 @@
+#
+# Export invoices and/or receipts for a date range to a zip archive
+#
+from django.core.management.base import BaseCommand, CommandError
+
+from datetime import date
+import sys
+
+from postgresqleu.invoices.models import InvoicePaymentMethod
+from postgresqleu.invoices.archive import get_archive_invoices, stream_invoice_archive
+
+
+class Command(BaseCommand):
+    help = 'Export invoices and receipts to a zip archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoice', action='store_true')
+        parser.add_argument('--receipt', action='store_true')
+        parser.add_argument('--paymentmethod', type=int, help='Only include invoices paid using the payment method with this id')
+        parser.add_argument('startdate', type=date.fromisoformat, help='First invoice date to include (YYYY-MM-DD)')
+        parser.add_argument('enddate', type=date.fromisoformat, help='Last invoice date to include (YYYY-MM-DD)')
+        parser.add_argument('filename', help='Zip file to write, or - for stdout')
+
+    def handle(self, *args, **options):
+        if not (options['invoice'] or options['receipt']):
+            raise CommandError("Must specify at least one of --invoice and --receipt")
+
+        if options['paymentmethod']:
+            try:
+                paymentmethod = InvoicePaymentMethod.objects.get(pk=options['paymentmethod'])
+            except InvoicePaymentMethod.DoesNotExist:
+                raise CommandError("Payment method {} not found".format(options['paymentmethod']))
+        else:
+            paymentmethod = None
+
+        invoices = get_archive_invoices(options['startdate'], options['enddate'], paymentmethod)
+
+        if options['filename'] == '-':
+            f = sys.stdout.buffer
+        else:
+            f = open(options['filename'], 'wb')
+
+        try:
+            for chunk in stream_invoice_archive(invoices, options['invoice'], options['receipt']):
+                f.write(chunk)
+        finally:
+            if f is not sys.stdout.buffer:
+                f.close()
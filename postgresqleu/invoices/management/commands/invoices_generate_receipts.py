@@ -0,0 +1,45 @@
+# Generate and send receipts for paid invoices.
+#
+# Receipts are not rendered as part of processing the payment, since that
+# happens in payment provider callbacks and bank matching jobs, where we
+# don't want to hold locks while rendering PDFs. Instead the invoice is
+# flagged, and this job is triggered once the payment has been committed.
+#
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from datetime import timedelta
+
+from postgresqleu.invoices.models import Invoice
+from postgresqleu.invoices.util import InvoiceWrapper
+
+
+class Command(BaseCommand):
+    help = 'Generate and send receipts for paid invoices'
+
+    class ScheduledJob:
+        scheduled_interval = timedelta(minutes=30)
+        internal = True
+
+        @classmethod
+        def should_run(self):
+            return Invoice.objects.filter(receipt_pending=True).exists()
+
+    def handle(self, *args, **options):
+        failed = 0
+        for invoiceid in Invoice.objects.filter(receipt_pending=True).order_by('paidat').values_list('id', flat=True):
+            # Each receipt is committed on its own, so a failure to render
+            # one of them does not hold up the others.
+            try:
+                with transaction.atomic():
+                    invoice = Invoice.objects.select_for_update().get(pk=invoiceid)
+                    if not invoice.receipt_pending:
+                        continue
+                    InvoiceWrapper(invoice).generate_receipt()
+            except Exception as e:
+                self.stderr.write("Failed to generate receipt for invoice #{}: {}".format(invoiceid, e))
+                failed += 1
+
+        if failed:
+            raise CommandError("Failed to generate {} receipts".format(failed))
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0021_alter_vatrate_vatpercent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='receipt_pending',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -136,6 +136,9 @@ class Invoice(models.Model):
 
     # Once an invoice is paid, a recipient is generated. PDF base64
     pdf_receipt = models.TextField(blank=True, null=False)
+    # The receipt is generated in the background once the payment has been
+    # committed, and sent to the recipient when it's ready.
+    receipt_pending = models.BooleanField(null=False, blank=False, default=False)
 
     # Information for accounting of this invoice. This is intentionally not
     # foreign keys - we'll just drop some such information into the system
@@ -16,6 +16,7 @@ from postgresqleu.mailqueue.util import send_template_mail, send_simple_mail
 from postgresqleu.accounting.util import create_accounting_entry
 from postgresqleu.util.currency import format_currency
 from postgresqleu.util.random import generate_random_token
+from postgresqleu.scheduler.util import trigger_immediate_job_run
 
 from .models import Invoice, InvoiceRow, InvoiceHistory, InvoiceLog
 from .models import InvoiceRefund
@@ -163,6 +164,14 @@ class InvoiceWrapper(object):
         except Exception as e:
             raise
 
+    def generate_receipt(self):
+        # Render the receipt for a paid invoice, and send it to the recipient.
+        # Called from the background job once the payment is committed.
+        self.invoice.pdf_receipt = base64.b64encode(self.render_pdf_receipt()).decode('ascii')
+        self.invoice.receipt_pending = False
+        self.invoice.save(update_fields=['pdf_receipt', 'receipt_pending'])
+        self.email_receipt()
+
     def email_receipt(self):
         # If no receipt exists yet, we have to bail too
         if not self.invoice.pdf_receipt:
@@ -385,9 +394,10 @@ class InvoiceManager(object):
                 logger("Failed to run invoice processor '%s': %s" % (invoice.processor, ex))
                 return (self.RESULT_PROCESSORFAIL, None, None)
 
-        # Generate a PDF receipt for this, since it's now paid
-        wrapper = InvoiceWrapper(invoice)
-        invoice.pdf_receipt = base64.b64encode(wrapper.render_pdf_receipt()).decode('ascii')
+        # A PDF receipt is generated, and sent, by a background job once
+        # this transaction has committed, so payment processing doesn't have
+        # to wait for the PDF rendering.
+        invoice.receipt_pending = True
 
         # Save and we're done!
         invoice.save()
@@ -445,9 +455,9 @@ class InvoiceManager(object):
 
         create_accounting_entry(accrows, leaveopen, urls)
 
-        # Send the receipt to the user if possible - that should make
-        # them happy :)
-        wrapper.email_receipt()
+        # Have the receipt generated and sent to the user - that should make
+        # them happy :) The job is only notified once we commit.
+        trigger_immediate_job_run('invoices_generate_receipts')
 
         # Write a log, because it's always nice..
         InvoiceHistory(invoice=invoice, txt='Processed payment').save()
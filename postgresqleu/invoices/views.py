@@ -427,6 +427,18 @@ def viewinvoicepdf_secret(request, invoiceid, invoicesecret):
     return r
 
 
+def _receipt_response(invoice):
+    if invoice.receipt_pending:
+        r = HttpResponse("The receipt for this invoice is being generated, please try again in a minute.", content_type='text/plain', status=503)
+        r['Retry-After'] = '60'
+        return r
+
+    r = HttpResponse(content_type='application/pdf')
+    r['Content-disposition'] = 'filename={}_receipt_{}.pdf'.format(settings.INVOICE_FILENAME_PREFIX, invoice.id)
+    r.write(base64.b64decode(invoice.pdf_receipt))
+    return r
+
+
 @login_required
 def viewreceipt(request, invoiceid):
     invoice = get_object_or_404(Invoice, pk=invoiceid)
@@ -434,18 +446,12 @@ def viewreceipt(request, invoiceid):
         # End users can only view their own invoices, but invoice managers can view all
         authenticate_backend_group(request, 'Invoice managers')
 
-    r = HttpResponse(content_type='application/pdf')
-    r['Content-disposition'] = 'filename={}_receipt_{}.pdf'.format(settings.INVOICE_FILENAME_PREFIX, invoice.id)
-    r.write(base64.b64decode(invoice.pdf_receipt))
-    return r
+    return _receipt_response(invoice)
 
 
 def viewreceipt_secret(request, invoiceid, invoicesecret):
     invoice = get_object_or_404(Invoice, pk=invoiceid, recipient_secret=invoicesecret)
-    r = HttpResponse(content_type='application/pdf')
-    r['Content-disposition'] = 'filename={}_receipt_{}.pdf'.format(settings.INVOICE_FILENAME_PREFIX, invoice.id)
-    r.write(base64.b64decode(invoice.pdf_receipt))
-    return r
+    return _receipt_response(invoice)
 
 
 @login_required
@@ -34,7 +34,7 @@ def _encoded_email_header(name, email):
     return email
 
 
-def send_simple_mail(sender, receiver, subject, msgtxt, attachments=None, bcc=None, sendername=None, receivername=None, suppress_auto_replies=True, is_auto_reply=False, sendat=None):
+def _queued_mails(sender, receiver, subject, msgtxt, attachments=None, bcc=None, sendername=None, receivername=None, suppress_auto_replies=True, is_auto_reply=False, sendat=None):
     # attachment format, each is a tuple of (name, mimetype,contents)
     # content should be *binary* and not base64 encoded, since we need to
     # use the base64 routines from the email library to get a properly
@@ -67,14 +67,13 @@ def send_simple_mail(sender, receiver, subject, msgtxt, attachments=None, bcc=No
             encoders.encode_base64(part)
             msg.attach(part)
 
-    # Just write it to the queue, so it will be transactionally rolled back
-    QueuedMail(
+    mails = [QueuedMail(
         sender=sender,
         receiver=receiver,
         subject=subject,
         fullmsg=msg.as_string(),
         sendtime=sendat or timezone.now(),
-    ).save()
+    ), ]
 
     # Any bcc is just entered as a separate email
     if bcc:
@@ -84,13 +83,39 @@ def send_simple_mail(sender, receiver, subject, msgtxt, attachments=None, bcc=No
             bcc = set((bcc, ))
 
         for b in bcc:
-            QueuedMail(
+            mails.append(QueuedMail(
                 sender=sender,
                 receiver=b,
                 subject=subject,
                 fullmsg=msg.as_string(),
                 sendtime=sendat or timezone.now(),
-            ).save()
+            ))
+
+    return mails
+
+
+def send_simple_mail(sender, receiver, subject, msgtxt, attachments=None, bcc=None, sendername=None, receivername=None, suppress_auto_replies=True, is_auto_reply=False, sendat=None):
+    # Just write it to the queue, so it will be transactionally rolled back
+    for m in _queued_mails(sender, receiver, subject, msgtxt, attachments, bcc, sendername, receivername, suppress_auto_replies, is_auto_reply, sendat):
+        m.save()
+
+
+def send_template_mails(sender, receivers, subject, templatename, sendername=None, suppress_auto_replies=True, sendat=None):
+    # Send the same template to many receivers, rendering them all first and
+    # then queueing them with a bulk insert. receivers is a list of tuples of
+    # (email, name, templateattr).
+    template = get_template(templatename)
+    settingsattr = settings_context()
+
+    mails = []
+    for receiver, receivername, templateattr in receivers:
+        context = {}
+        context.update(templateattr)
+        context.update(settingsattr)
+        mails.extend(_queued_mails(sender, receiver, subject, template.render(context),
+                                   sendername=sendername, receivername=receivername,
+                                   suppress_auto_replies=suppress_auto_replies, sendat=sendat))
+    QueuedMail.objects.bulk_create(mails, batch_size=1000)
 
 
 def send_mail(sender, receiver, subject, fullmsg):
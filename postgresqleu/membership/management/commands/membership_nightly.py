@@ -15,8 +15,9 @@ from django.utils import timezone
 from datetime import timedelta, time
 from datetime import time
 
-from postgresqleu.mailqueue.util import send_template_mail
-from postgresqleu.membership.models import Member, MemberLog, get_config
+from postgresqleu.mailqueue.util import send_template_mails
+from postgresqleu.membership.models import Member, get_config
+from postgresqleu.util.db import exec_no_result
 
 
 class Command(BaseCommand):
@@ -29,53 +30,64 @@ class Command(BaseCommand):
     @transaction.atomic
     def handle(self, *args, **options):
         cfg = get_config()
+        now = timezone.now()
 
         # Expire members (and let them know it happened)
-        expired = Member.objects.filter(paiduntil__lt=timezone.now())
-        for m in expired:
-            MemberLog(member=m, timestamp=timezone.now(), message='Membership expired').save()
-            # Generate an email to the user
-            send_template_mail(cfg.sender_email,
-                               m.user.email,
-                               "Your {0} membership has expired".format(settings.ORG_NAME),
-                               'membership/mail/expired.txt',
-                               {
-                                   'member': m,
-                               },
-                               sendername=cfg.sender_name,
-                               receivername=m.fullname,
+        expired = list(Member.objects.select_related('user').filter(paiduntil__lt=now))
+        if expired:
+            # Generate an email to the users
+            send_template_mails(cfg.sender_email,
+                                [(m.user.email, m.fullname, {'member': m}) for m in expired],
+                                "Your {0} membership has expired".format(settings.ORG_NAME),
+                                'membership/mail/expired.txt',
+                                sendername=cfg.sender_name,
             )
-            self.stdout.write("Expired member {0} (paid until {1})".format(m, m.paiduntil))
+            for m in expired:
+                self.stdout.write("Expired member {0} (paid until {1})".format(m, m.paiduntil))
+
             # An expired member has no membersince and no paiduntil.
-            m.membersince = None
-            m.paiduntil = None
-            m.save()
+            exec_no_result("""WITH expired AS (
+ UPDATE membership_member SET membersince=NULL, paiduntil=NULL
+ WHERE user_id=ANY(%(ids)s)
+ RETURNING user_id
+)
+INSERT INTO membership_memberlog (member_id, timestamp, message)
+SELECT user_id, %(now)s, 'Membership expired' FROM expired""", {
+                'ids': [m.pk for m in expired],
+                'now': now,
+            })
 
         # Send warnings to members about to expire. We explicitly avoid sending
         # a warning in the last 24 hours before expire, so we don't end up sending
         # both a warning and an expiry within minutes in case the cronjob runs on
         # slightly different times.
 
-        warning = Member.objects.filter(
-            Q(paiduntil__gt=timezone.now() - timedelta(days=1)) &
-            Q(paiduntil__lt=timezone.now() + timedelta(days=30)) &
+        warning = list(Member.objects.select_related('user').filter(
+            Q(paiduntil__gt=now - timedelta(days=1)) &
+            Q(paiduntil__lt=now + timedelta(days=30)) &
             (
-                Q(expiry_warning_sent__lt=timezone.now() - timedelta(days=10)) |
+                Q(expiry_warning_sent__lt=now - timedelta(days=10)) |
                 Q(expiry_warning_sent__isnull=True)
-                ))
-        for m in warning:
-            MemberLog(member=m, timestamp=timezone.now(), message='Membership expiry warning sent to %s' % m.user.email).save()
-            # Generate an email to the user
-            send_template_mail(cfg.sender_email,
-                               m.user.email,
-                               "Your {0} membership will expire soon".format(settings.ORG_NAME),
-                               'membership/mail/warning.txt',
-                               {
-                                   'member': m,
-                               },
-                               sendername=cfg.sender_name,
-                               receivername=m.fullname,
-                           )
-            self.stdout.write("Sent warning to member {0} (paid until {1}, last warned {2})".format(m, m.paiduntil, m.expiry_warning_sent))
-            m.expiry_warning_sent = timezone.now()
-            m.save()
+                )))
+        if warning:
+            # Generate an email to the users
+            send_template_mails(cfg.sender_email,
+                                [(m.user.email, m.fullname, {'member': m}) for m in warning],
+                                "Your {0} membership will expire soon".format(settings.ORG_NAME),
+                                'membership/mail/warning.txt',
+                                sendername=cfg.sender_name,
+            )
+            for m in warning:
+                self.stdout.write("Sent warning to member {0} (paid until {1}, last warned {2})".format(m, m.paiduntil, m.expiry_warning_sent))
+
+            exec_no_result("""WITH warned AS (
+ UPDATE membership_member SET expiry_warning_sent=%(now)s
+ WHERE user_id=ANY(%(ids)s)
+ RETURNING user_id
+)
+INSERT INTO membership_memberlog (member_id, timestamp, message)
+SELECT w.user_id, %(now)s, 'Membership expiry warning sent to ' || u.email
+FROM warned w INNER JOIN auth_user u ON u.id=w.user_id""", {
+                'ids': [m.pk for m in warning],
+                'now': now,
+            })
@@ -16,6 +16,7 @@ from datetime import datetime, timedelta
 import dateutil.parser
 from decimal import Decimal
 
+from postgresqleu.util.db import bulk_insert_new
 from postgresqleu.paypal.models import TransactionInfo
 from postgresqleu.paypal.util import PaypalAPI
 from postgresqleu.invoices.models import InvoicePaymentMethod
@@ -51,11 +52,10 @@ class Command(BaseCommand):
 
             api = PaypalAPI(method.get_implementation())
 
-            # Fetch all transactions from last sync, with a 3 day overlap
+            # Fetch all transactions from last sync, with a 3 day overlap. Most of
+            # them will already exist, and only the new ones are stored.
+            transactions = []
             for r in api.get_transaction_list(lastsync - timedelta(days=3)):
-                if TransactionInfo.objects.filter(paypaltransid=r['TRANSACTIONID']).exists():
-                    continue
-
                 t = TransactionInfo(paypaltransid=r['TRANSACTIONID'])
                 t.timestamp = datetime.strptime(r['TIMESTAMP'], '%Y-%m-%dT%H:%M:%S%z')
                 t.amount = Decimal(r['AMT'])
@@ -68,8 +68,9 @@ class Command(BaseCommand):
                 t.transtext = r['SUBJECT']
                 t.matched = False
                 t.paymentmethod = method
+                transactions.append(t)
 
-                t.save()
+            bulk_insert_new(TransactionInfo, transactions, ['paypaltransid'])
 
             # Update the sync timestamp
             method.status['lastsync'] = synctime
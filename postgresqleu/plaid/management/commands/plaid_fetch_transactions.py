@@ -13,6 +13,7 @@ from postgresqleu.invoices.util import register_bank_transaction
 from postgresqleu.invoices.models import InvoicePaymentMethod
 from postgresqleu.mailqueue.util import send_simple_mail
 from postgresqleu.plaid.models import PlaidTransaction
+from postgresqleu.util.db import bulk_insert_new
 
 from datetime import timedelta, datetime, time
 from decimal import Decimal
@@ -41,40 +42,40 @@ class Command(BaseCommand):
     def handle_method(self, method):
         impl = method.get_implementation()
 
-        for t in impl.sync_transactions():
-            # a sync_transactions should normally only get transactions to add, but there is at least a small chance
-            # that we can get the same one again, so we dupe-check it.
-            trans, created = PlaidTransaction.objects.get_or_create(
+        transactions = [
+            PlaidTransaction(
                 paymentmethod=method,
                 transactionid=t['transaction_id'],
-                defaults={
-                    'datetime': parse_datetime(t['datetime']) if t['datetime'] else make_aware(datetime.combine(parse_date(t['date']), time(0, 0))),
-                    'amount': -Decimal(str(t['amount'])),  # All plaid amounts are reported negative
-                    'paymentref': t['name'][:200].replace(',', ' '),
-                    'transactionobject': t,
-                }
-            )
-            if created:
-                if method.config.get('notify_each_transaction', False):
-                    send_simple_mail(
-                        settings.INVOICE_SENDER_EMAIL,
-                        method.config['notification_receiver'],
-                        "Plaid transaction received on {}".format(method.internaldescription),
-                        "A new plaid transaction has been registered for {}:\n\nDate:   {}\nAmount: {}\nText:   {}\n".format(
-                            method.internaldescription,
-                            trans.datetime,
-                            trans.amount,
-                            trans.paymentref,
-                        ),
-                    )
+                datetime=parse_datetime(t['datetime']) if t['datetime'] else make_aware(datetime.combine(parse_date(t['date']), time(0, 0))),
+                amount=-Decimal(str(t['amount'])),  # All plaid amounts are reported negative
+                paymentref=t['name'][:200].replace(',', ' '),
+                transactionobject=t,
+            ) for t in impl.sync_transactions()
+        ]
 
-                # Else register a pending bank transaction. This may immediately match an invoice
-                # if it was an invoice payment, in which case the entire process will complete..
-                if self.do_banktransactions:
-                    register_bank_transaction(
-                        method,
-                        trans.id,
+        # a sync_transactions should normally only get transactions to add, but there is at least a small chance
+        # that we can get the same one again, so we dupe-check it.
+        for trans in bulk_insert_new(PlaidTransaction, transactions, ['paymentmethod', 'transactionid']):
+            if method.config.get('notify_each_transaction', False):
+                send_simple_mail(
+                    settings.INVOICE_SENDER_EMAIL,
+                    method.config['notification_receiver'],
+                    "Plaid transaction received on {}".format(method.internaldescription),
+                    "A new plaid transaction has been registered for {}:\n\nDate:   {}\nAmount: {}\nText:   {}\n".format(
+                        method.internaldescription,
+                        trans.datetime,
                         trans.amount,
                         trans.paymentref,
-                        trans.paymentref,
-                    )
+                    ),
+                )
+
+            # Else register a pending bank transaction. This may immediately match an invoice
+            # if it was an invoice payment, in which case the entire process will complete..
+            if self.do_banktransactions:
+                register_bank_transaction(
+                    method,
+                    trans.id,
+                    trans.amount,
+                    trans.paymentref,
+                    trans.paymentref,
+                )
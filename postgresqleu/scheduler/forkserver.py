@@ -0,0 +1,46 @@
+#
+# Support for running external scheduled jobs in processes forked from a
+# pre-warmed server, instead of starting a new manage.py for each job.
+#
+# This module is preloaded into the multiprocessing forkserver process, so
+# Django, all the apps and all the job commands are loaded once there, and
+# every job is then forked from that process. The forkserver never opens a
+# database connection, so no connections are shared with the children.
+#
+
+import django
+from django.conf import settings
+from django.core.management import ManagementUtility, get_commands
+
+import importlib
+import multiprocessing
+import os
+import sys
+
+django.setup()
+
+# Import all our own management commands, which includes all the jobs.
+for _command, _app in get_commands().items():
+    if _app.startswith('postgresqleu'):
+        importlib.import_module('{}.management.commands.{}'.format(_app, _command))
+
+
+def get_forkserver_context():
+    ctx = multiprocessing.get_context('forkserver')
+    ctx.set_forkserver_preload([__name__, ])
+    return ctx
+
+
+def run_forked_job(command, outputfile):
+    # Runs in the forked child. Send both stdout and stderr to the output file
+    # (at the file descriptor level, so output from libraries is included), and
+    # then run the command the same way manage.py would, including exiting with
+    # a non-zero exit code on failure.
+    fd = os.open(outputfile, os.O_WRONLY | os.O_APPEND)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+
+    ManagementUtility([os.path.abspath("{0}/../manage.py".format(settings.PROJECT_ROOT)), command]).execute()
+    sys.stdout.flush()
+    sys.stderr.flush()
@@ -7,17 +7,19 @@
 #
 
 from django.core.management import load_command_class
-from django.db import connection
+from django.db import connection, connections
 from django.utils import timezone
 from django.conf import settings
 
 from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import time
 import io
 import sys
 import os
 import subprocess
 import select
+import tempfile
 import traceback
 
 from postgresqleu.util.reload import ReloadCommand
@@ -26,6 +28,11 @@ from postgresqleu.scheduler.util import reschedule_job
 from postgresqleu.scheduler.models import ScheduledJob, JobHistory, get_config
 
 
+# While jobs are running, wake up this often to check if more jobs have
+# become due (or have been triggered from the web interface).
+RUNNING_POLL_INTERVAL = 5
+
+
 class Command(ReloadCommand):
     help = 'Run all scheduled jobs'
 
@@ -38,6 +45,14 @@ class Command(ReloadCommand):
             os._exit(1)
 
     def inner_handle(self):
+        # Jobs are run from a pool of threads. External jobs just wait for their
+        # subprocess in the thread, and internal jobs get their own database
+        # connection. Everything else, including writing the job history, is
+        # done from the main thread.
+        self.executor = ThreadPoolExecutor(max_workers=settings.SCHEDULED_JOBS_MAX_CONCURRENT,
+                                           thread_name_prefix='scheduledjob')
+        self.running = {}
+
         with connection.cursor() as curs:
             curs.execute("LISTEN pgeu_scheduled_job")
             curs.execute("SET application_name = 'pgeu scheduled job runner'")
@@ -79,15 +94,30 @@ class Command(ReloadCommand):
 
     def run_pending_jobs(self):
         while True:
-            jobs = ScheduledJob.objects.filter(nextrun__lte=timezone.now(), enabled=True)
-            if not jobs:
+            jobs = list(ScheduledJob.objects.filter(nextrun__lte=timezone.now(), enabled=True).exclude(
+                id__in=[j.id for j, c, g in self.running.values()],
+            ).order_by('nextrun'))
+            if not jobs and not self.running:
                 # Nothing left to do!
                 return
 
+            busygroups = set(g for j, c, g in self.running.values())
             for job in jobs:
+                if len(self.running) >= settings.SCHEDULED_JOBS_MAX_CONCURRENT:
+                    # Any remaining jobs will be picked up when a running job finishes
+                    break
+
                 # Start by finding the command class itself
                 try:
                     cmd = load_command_class(job.app, job.command)
+
+                    # Jobs in the same group, which defaults to the app, never run in
+                    # parallel, so for example fetching transactions and verifying the
+                    # balance of a payment provider cannot interfere.
+                    group = getattr(cmd.ScheduledJob, 'concurrency_group', job.app)
+                    if group in busygroups:
+                        continue
+
                     if hasattr(cmd.ScheduledJob, 'should_run'):
                         # If method should_run exists, call it and figure out if the job should
                         # run. If we get an excpetion in this check, we make sure to run the job,
@@ -102,76 +132,100 @@ class Command(ReloadCommand):
                             sys.stderr.write("Exception when trying to figure out if '{0}' should run:\n{1}\n\nJob will be run.\n".format(job.description, e))
 
                     self.stderr.write("Running job {}".format(job.description))
-                    # Now figure out what type of job it is, and run it
-                    job.lastrunsuccess = self.run_job(job, cmd)
-                    job.lastrun = timezone.now()
-                    job.lastskip = None
-                    reschedule_job(job, save=True)
-
-                    # A job can define one or more other jobs to schedule immediately
-                    # after this job has completed.
-                    if hasattr(cmd.ScheduledJob, 'trigger_next_jobs'):
-                        if isinstance(cmd.ScheduledJob.trigger_next_jobs, str):
-                            nextjobs = [cmd.ScheduledJob.trigger_next_jobs, ]
-                        elif isinstance(cmd.ScheduledJob.trigger_next_jobs, list) or isinstance(cmd.ScheduledJob.trigger_next_jobs, tuple):
-                            nextjobs = cmd.ScheduledJob.trigger_next_jobs
-                        else:
-                            raise Exception("trigger_next_jobs must be string or iterable!")
-
-                        for j in nextjobs:
-                            try:
-                                pieces = j.split('.')
-                                sj = ScheduledJob.objects.get(app='.'.join(pieces[:-1]),
-                                                              command=pieces[-1])
-                                sj.nextrun = timezone.now()
-                                sj.save()
-                            except ScheduledJob.DoesNotExist:
-                                self.stderr.write("Could not find job {} to run after {}".format(j, job.description))
-                                # But it's not critical, so we don't bother notifying
-
+                    # Now figure out what type of job it is, and run it in the background
+                    self.running[self.executor.submit(self.run_job, job, cmd)] = (job, cmd, group)
+                    busygroups.add(group)
                 except Exception as e:
-                    # Hard exception at the top level will cause us to disbale
-                    # the job.
-                    job.lastrun = timezone.now()
-                    job.lastrunsuccess = False
-                    job.enabled = False
-                    job.nextrun = None
-                    job.save()
-                    JobHistory(job=job,
-                               time=timezone.now(),
-                               success=False,
-                               runtime=timedelta(),
-                               output="Internal exception:\n{0}\n\nJob has been disabled".format(e),
-                    ).save()
-                    self.send_notification_email("Exception running scheduled job",
-                                                 "Job has been disbaled.\nException:\n{0}\n".format(e))
+                    self.disable_job(job, e)
 
-    def run_job(self, job, cmd):
-        starttime = time.time()
-        if getattr(cmd.ScheduledJob, 'internal', False):
-            (output, success) = self.run_internal_job(job, cmd)
-        else:
-            (output, success) = self.run_external_job(job, cmd)
+            if self.running:
+                (done, notdone) = wait(self.running.keys(), timeout=RUNNING_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for f in done:
+                    self.finish_job(f)
+
+    def finish_job(self, future):
+        (job, cmd, group) = self.running.pop(future)
+        try:
+            (output, success, runtime) = future.result()
+
+            # Create a job history record, and then update the main job entry
+            JobHistory(job=job,
+                       time=timezone.now(),
+                       success=success,
+                       runtime=runtime,
+                       output=output.getvalue(),
+            ).save()
 
-        # Create a job history record. The caller will update the main job entry,
-        # but we want to store the output.
+            if success and job.notifyonsuccess and output.tell():
+                # Only send successful notification email if there was some output (this
+                # basically mimics what cron does, but we only do it selectively)
+                self.send_notification_email("scheduled job '{0}' completed".format(job.description),
+                                             output.getvalue())
+            elif not success:
+                self.send_notification_email("Scheduled job '{0}' failed".format(job.description),
+                                             output.getvalue())
+
+            job.lastrunsuccess = success
+            job.lastrun = timezone.now()
+            job.lastskip = None
+            reschedule_job(job, save=True)
+
+            # A job can define one or more other jobs to schedule immediately
+            # after this job has completed. They are picked up by the next
+            # round in run_pending_jobs, so they never start before this one
+            # has finished.
+            if hasattr(cmd.ScheduledJob, 'trigger_next_jobs'):
+                if isinstance(cmd.ScheduledJob.trigger_next_jobs, str):
+                    nextjobs = [cmd.ScheduledJob.trigger_next_jobs, ]
+                elif isinstance(cmd.ScheduledJob.trigger_next_jobs, list) or isinstance(cmd.ScheduledJob.trigger_next_jobs, tuple):
+                    nextjobs = cmd.ScheduledJob.trigger_next_jobs
+                else:
+                    raise Exception("trigger_next_jobs must be string or iterable!")
+
+                for j in nextjobs:
+                    try:
+                        pieces = j.split('.')
+                        sj = ScheduledJob.objects.get(app='.'.join(pieces[:-1]),
+                                                      command=pieces[-1])
+                        sj.nextrun = timezone.now()
+                        sj.save()
+                    except ScheduledJob.DoesNotExist:
+                        self.stderr.write("Could not find job {} to run after {}".format(j, job.description))
+                        # But it's not critical, so we don't bother notifying
+        except Exception as e:
+            self.disable_job(job, e)
+
+    def disable_job(self, job, e):
+        # Hard exception at the top level will cause us to disbale
+        # the job.
+        job.lastrun = timezone.now()
+        job.lastrunsuccess = False
+        job.enabled = False
+        job.nextrun = None
+        job.save()
         JobHistory(job=job,
                    time=timezone.now(),
-                   success=success,
-                   runtime=timedelta(seconds=time.time() - starttime),
-                   output=output.getvalue(),
+                   success=False,
+                   runtime=timedelta(),
+                   output="Internal exception:\n{0}\n\nJob has been disabled".format(e),
         ).save()
+        self.send_notification_email("Exception running scheduled job",
+                                     "Job has been disbaled.\nException:\n{0}\n".format(e))
 
-        if success and job.notifyonsuccess and output.tell():
-            # Only send successful notification email if there was some output (this
-            # basically mimics what cron does, but we only do it selectively)
-            self.send_notification_email("scheduled job '{0}' completed".format(job.description),
-                                         output.getvalue())
-        elif not success:
-            self.send_notification_email("Scheduled job '{0}' failed".format(job.description),
-                                         output.getvalue())
+    def run_job(self, job, cmd):
+        # This runs in a worker thread. The caller will create the job history
+        # record and update the main job entry from the main thread.
+        starttime = time.time()
+        try:
+            if getattr(cmd.ScheduledJob, 'internal', False):
+                (output, success) = self.run_internal_job(job, cmd)
+            else:
+                (output, success) = self.run_external_job(job, cmd)
+        finally:
+            # Internal jobs will have opened a database connection in this thread
+            connections.close_all()
 
-        return success
+        return (output, success, timedelta(seconds=time.time() - starttime))
 
     def run_internal_job(self, job, cmd):
         # Internal jobs are run in our own process and as such don't
@@ -199,6 +253,9 @@ class Command(ReloadCommand):
         timeout = getattr(cmd.ScheduledJob, 'timeout', 2)
         timeout_seconds = timeout * 60
 
+        if settings.SCHEDULED_JOBS_FORKSERVER:
+            return self.run_forked_job(job, timeout_seconds)
+
         fullout = io.StringIO()
         success = False
 
@@ -221,6 +278,42 @@ class Command(ReloadCommand):
 
         return (fullout, success)
 
+    def run_forked_job(self, job, timeout_seconds):
+        # Run the job in a process forked from the pre-warmed forkserver, which
+        # already has Django and all the apps loaded. It's still a separate process,
+        # so a crashing job cannot take down the runner, and we can kill it when
+        # the timeout expires.
+        from postgresqleu.scheduler.forkserver import get_forkserver_context, run_forked_job
+
+        fullout = io.StringIO()
+        success = False
+
+        with tempfile.NamedTemporaryFile(prefix='pgeu_job_') as f:
+            p = get_forkserver_context().Process(target=run_forked_job,
+                                                 args=(job.command, f.name),
+                                                 name=job.command)
+            p.start()
+            p.join(timeout_seconds)
+            if p.is_alive():
+                p.kill()
+                p.join()
+                fullout.write("Timeout of {0} seconds expired.".format(timeout_seconds))
+                return (fullout, success)
+
+            output = f.read().decode('utf8', errors='ignore')
+            if p.exitcode == 0:
+                fullout.write(output)
+                success = True
+            else:
+                if p.exitcode < 0:
+                    fullout.write("Killed by signal {0}\n\n".format(-p.exitcode))
+                else:
+                    fullout.write("Exit code {0}\n\n".format(p.exitcode))
+                fullout.write(output)
+                fullout.write("\n")
+
+        return (fullout, success)
+
     def send_notification_email(self, subject, contents):
         send_simple_mail(
             settings.SCHEDULED_JOBS_EMAIL_SENDER,
@@ -276,6 +276,30 @@ SCHEDULED_JOBS_EMAIL = DEFAULT_EMAIL
 # Email to send info about scheduled jobs from
 # SCHEDULED_JOBS_EMAIL_SENDER = DEFAULT_EMAIL
 
+# Maximum number of scheduled jobs to run at the same time. Jobs from the
+# same app are never run in parallel with each other.
+SCHEDULED_JOBS_MAX_CONCURRENT = 4
+
+# Run external scheduled jobs in processes forked from a server process that
+# has already loaded Django, instead of starting a new manage.py for each job.
+SCHEDULED_JOBS_FORKSERVER = False
+
+# Record the number of SQL queries and the database and total time for each
+# request, and return it in a Server-Timing header. It is also logged at INFO
+# level to the postgresqleu.util.middleware logger.
+REQUEST_INSTRUMENTATION = False
+# With request instrumentation enabled, log a warning for requests running more
+# than this many queries. Set to 0 to disable.
+REQUEST_QUERY_BUDGET = 100
+
+# Number of rendered markdown texts to keep in the in-process cache.
+MARKDOWN_CACHE_SIZE = 2048
+# Name of a django cache (in CACHES) to also store rendered markdown in, so it
+# can be shared between processes and survive restarts. None to disable.
+MARKDOWN_CACHE = None
+# Number of seconds to keep rendered markdown in the MARKDOWN_CACHE cache.
+MARKDOWN_CACHE_TIMEOUT = 7 * 24 * 3600
+
 # Treasurer email address. This is only used as pass-through to templates for
 # end-user reference, and never actually by the system to send and receive.
 TREASURER_EMAIL = DEFAULT_EMAIL
@@ -387,6 +411,10 @@ INVOICE_FILENAME_PREFIX = ORG_SHORTNAME.lower()
 if GLOBAL_LOGIN_USER:
     MIDDLEWARE.append('postgresqleu.util.middleware.GlobalLoginMiddleware')
 
+if REQUEST_INSTRUMENTATION:
+    # First, so the timing includes all other middleware
+    MIDDLEWARE.insert(0, 'postgresqleu.util.middleware.QueryInstrumentationMiddleware')
+
 if ENABLE_PG_COMMUNITY_AUTH:
     AUTHENTICATION_BACKENDS = (
         'postgresqleu.auth.AuthBackend',
@@ -12,7 +12,8 @@ from base64 import b64encode
 
 from postgresqleu.util.time import today_global
 from postgresqleu.util.crypto import rsa_sign_string_sha256
-from .models import TransferwiseRefund
+from postgresqleu.util.checksum import iban_valid
+from .models import TransferwiseRefund, TransferwiseValidatedIban
 
 
 class TransferwiseApi(object):
@@ -146,8 +147,18 @@ class TransferwiseApi(object):
         )['transactions']
 
     def validate_iban(self, iban):
+        iban = iban.replace(' ', '').upper()
+
+        # Anything that fails the checksum will not validate remotely either, and
+        # anything we have validated before we don't need to ask about again.
+        if not iban_valid(iban):
+            return False
+        if TransferwiseValidatedIban.objects.filter(iban=iban).exists():
+            return True
+
         try:
-            return self.get('validators/iban?iban={}'.format(iban))['validation'] == 'success'
+            if self.get('validators/iban?iban={}'.format(iban))['validation'] != 'success':
+                return False
         except requests.exceptions.HTTPError as e:
             # API returns http 400 on (some?) failed validations that are just not validating.
             # In those cases, just set it to not being valid.
@@ -157,6 +168,9 @@ class TransferwiseApi(object):
             # Bubble any other exceptions
             raise
 
+        TransferwiseValidatedIban.objects.get_or_create(iban=iban)
+        return True
+
     def get_structured_amount(self, amount):
         if amount['currency'] != settings.CURRENCY_ABBREV:
             raise Exception("Invalid currency {} found, exepcted {}".format(amount['currency'], settings.CURRENCY_ABBREV))
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transferwise', '0005_transferwise_monthly_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferwiseValidatedIban',
+            fields=[
+                ('iban', models.CharField(max_length=34, primary_key=True, serialize=False)),
+                ('validatedat', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunSQL(
+            """INSERT INTO transferwise_transferwisevalidatediban (iban, validatedat)
+SELECT upper(counterpart_account), max(datetime) FROM transferwise_transferwisetransaction
+WHERE counterpart_valid_iban AND length(counterpart_account) <= 34
+GROUP BY upper(counterpart_account)""",
+            migrations.RunSQL.noop,
+        ),
+    ]
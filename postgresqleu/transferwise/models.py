@@ -26,6 +26,16 @@ class TransferwiseTransaction(models.Model):
         return self.twreference
 
 
+class TransferwiseValidatedIban(models.Model):
+    # IBANs that have been validated by the TransferWise API, so they don't
+    # have to be validated again every time we see a transaction from them.
+    iban = models.CharField(max_length=34, null=False, blank=False, primary_key=True)
+    validatedat = models.DateTimeField(null=False, blank=False, auto_now_add=True)
+
+    def __str__(self):
+        return self.iban
+
+
 class TransferwiseRefund(models.Model):
     origtransaction = models.ForeignKey(TransferwiseTransaction, blank=False, null=False, related_name='refund_orig', on_delete=models.CASCADE)
     refundtransaction = models.OneToOneField(TransferwiseTransaction, blank=True, null=True, related_name='refund_refund', unique=True, on_delete=models.CASCADE)
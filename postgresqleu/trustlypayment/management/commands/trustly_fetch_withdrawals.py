@@ -18,6 +18,7 @@ from postgresqleu.invoices.util import register_pending_bank_matcher
 from postgresqleu.invoices.models import InvoicePaymentMethod
 from postgresqleu.trustlypayment.util import Trustly
 from postgresqleu.trustlypayment.models import TrustlyWithdrawal, TrustlyLog
+from postgresqleu.util.db import bulk_insert_new
 
 
 class Command(BaseCommand):
@@ -42,33 +43,32 @@ class Command(BaseCommand):
 
         transactions = trustly.getledgerforrange(datetime.today() - timedelta(days=7), datetime.today())
 
-        for t in transactions:
-            if t['accountname'] == 'BANK_WITHDRAWAL_QUEUED' and not t['orderid']:
-                # If it has an orderid, it's a refund, but if not, then it's a transfer out (probably)
-                w, created = TrustlyWithdrawal.objects.get_or_create(paymentmethod=method,
-                                                                     gluepayid=t['gluepayid'],
-                                                                     defaults={
-                                                                         'amount': -Decimal(t['amount']),
-                                                                         'message': t['messageid'],
-                                                                     },
-                )
-                w.save()
-
-                if created:
-                    TrustlyLog(message='New bank withdrawal of {0} found'.format(-Decimal(t['amount'])),
-                               paymentmethod=method).save()
-
-                    accstr = 'Transfer from Trustly to bank'
-                    accrows = [
-                        (pm.config('accounting_income'), accstr, -w.amount, None),
-                        (pm.config('accounting_transfer'), accstr, w.amount, None),
-                    ]
-                    entry = create_accounting_entry(accrows,
-                                                    True,
-                                                    [],
-                    )
-                    if is_managed_bank_account(pm.config('accounting_transfer')):
-                        register_pending_bank_matcher(pm.config('accounting_transfer'),
-                                                      '.*TRUSTLY.*{0}.*'.format(w.gluepayid),
-                                                      w.amount,
-                                                      entry)
+        withdrawals = [
+            TrustlyWithdrawal(
+                paymentmethod=method,
+                gluepayid=t['gluepayid'],
+                amount=-Decimal(t['amount']),
+                message=t['messageid'],
+            )
+            # If it has an orderid, it's a refund, but if not, then it's a transfer out (probably)
+            for t in transactions if t['accountname'] == 'BANK_WITHDRAWAL_QUEUED' and not t['orderid']
+        ]
+
+        for w in bulk_insert_new(TrustlyWithdrawal, withdrawals, ['paymentmethod', 'gluepayid']):
+            TrustlyLog(message='New bank withdrawal of {0} found'.format(w.amount),
+                       paymentmethod=method).save()
+
+            accstr = 'Transfer from Trustly to bank'
+            accrows = [
+                (pm.config('accounting_income'), accstr, -w.amount, None),
+                (pm.config('accounting_transfer'), accstr, w.amount, None),
+            ]
+            entry = create_accounting_entry(accrows,
+                                            True,
+                                            [],
+            )
+            if is_managed_bank_account(pm.config('accounting_transfer')):
+                register_pending_bank_matcher(pm.config('accounting_transfer'),
+                                              '.*TRUSTLY.*{0}.*'.format(w.gluepayid),
+                                              w.amount,
+                                              entry)
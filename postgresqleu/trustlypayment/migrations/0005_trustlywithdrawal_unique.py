@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 09:22
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0022_invoice_receipt_pending'),
+        ('trustlypayment', '0004_trustlywithdrawal'),
+    ]
+
+    operations = [
+        # Remove any duplicates that have made it in before the constraint
+        migrations.RunSQL(
+            """DELETE FROM trustlypayment_trustlywithdrawal w
+WHERE EXISTS (SELECT 1 FROM trustlypayment_trustlywithdrawal w2 WHERE w2.paymentmethod_id=w.paymentmethod_id AND w2.gluepayid=w.gluepayid AND w2.id < w.id)""",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='trustlywithdrawal',
+            unique_together={('paymentmethod', 'gluepayid')},
+        ),
+    ]
@@ -61,3 +61,8 @@ class TrustlyWithdrawal(models.Model):
     gluepayid = models.BigIntegerField(null=False, blank=False)
     amount = models.DecimalField(decimal_places=2, max_digits=20, null=False, blank=False)
     message = models.CharField(max_length=200, null=False, blank=True)
+
+    class Meta:
+        unique_together = (
+            ('paymentmethod', 'gluepayid'),
+        )
@@ -181,6 +181,7 @@ urlpatterns.extend([
     re_path(r'^events/admin/([^/]+)/reports/simple/$', postgresqleu.confreg.views.simple_report),
     re_path(r'^events/admin/([^/]+)/reports/feedback/$', postgresqleu.confreg.feedback.feedback_report),
     re_path(r'^events/admin/([^/]+)/reports/feedback/session/$', postgresqleu.confreg.feedback.feedback_sessions),
+    re_path(r'^events/admin/([^/]+)/reports/feedback/question/(\d+)/$', postgresqleu.confreg.feedback.feedback_report_question),
     re_path(r'^events/admin/([^/]+)/reports/schedule/$', postgresqleu.confreg.pdfschedule.pdfschedule),
     re_path(r'^events/admin/newconference/$', postgresqleu.confreg.backendviews.new_conference),
     re_path(r'^events/admin/meta/series/(.*/)?$', postgresqleu.confreg.backendviews.edit_series),
@@ -207,6 +208,8 @@ urlpatterns.extend([
     re_path(r'^events/admin/(\w+)/regdashboard/list/multicancel/$', postgresqleu.confreg.views.admin_registration_multicancel),
     re_path(r'^events/admin/(\w+)/regdashboard/list/multiresendwelcome/$', postgresqleu.confreg.views.admin_registration_multiresendwelcome),
     re_path(r'^events/admin/(\w+)/regdashboard/list/multiviewbadge/$', postgresqleu.confreg.backendviews.view_multi_registration_badge),
+    re_path(r'^events/admin/(\w+)/regdashboard/list/badgejob/(\d+)/$', postgresqleu.confreg.backendviews.view_badge_build_job),
+    re_path(r'^events/admin/(\w+)/regdashboard/list/badgejob/(\d+)/download/$', postgresqleu.confreg.backendviews.download_badge_build_job),
     re_path(r'^events/admin/(\w+)/regdashboard/list/(\d+)/confirm/$', postgresqleu.confreg.views.admin_registration_confirm),
     re_path(r'^events/admin/(\w+)/regdashboard/list/(\d+)/clearcode/$', postgresqleu.confreg.views.admin_registration_clearcode),
     re_path(r'^events/admin/(\w+)/regdashboard/list/(\d+)/ticket/$', postgresqleu.confreg.backendviews.view_registration_ticket),
@@ -325,6 +328,7 @@ urlpatterns.extend([
     re_path(r'^admin/invoices/vatcache/(.*/)?$', postgresqleu.invoices.backendviews.edit_vatvalidationcache),
     re_path(r'^admin/invoices/refunds/$', postgresqleu.invoices.backendviews.refunds),
     re_path(r'^admin/invoices/refundexposure/$', postgresqleu.invoices.backendviews.refundexposure),
+    re_path(r'^admin/invoices/archive/$', postgresqleu.invoices.backendviews.archive),
     re_path(r'^admin/invoices/banktransactions/$', postgresqleu.invoices.backendviews.banktransactions),
     re_path(r'^admin/invoices/banktransactions/(\d+)/$', postgresqleu.invoices.backendviews.banktransactions_match),
     re_path(r'^admin/invoices/banktransactions/(\d+)/(\d+)/$', postgresqleu.invoices.backendviews.banktransactions_match_invoice),
@@ -19,6 +19,8 @@ class _NewFormDataField(django.forms.Field):
 class BackendForm(ConcurrentProtectedModelForm):
     list_fields = None
     list_order_by = None
+    list_serverside = False  # Page, sort and search the list in SQL instead of in the browser
+    list_search_fields = None  # Fields for text search in serverside mode, default is all text columns
     queryset_select_related = []
     queryset_extra_fields = {}   # Goes into queryset.extra()
     queryset_extra_columns = []  # Just columns included in .only()
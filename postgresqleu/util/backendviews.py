@@ -1,13 +1,19 @@
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.db import transaction, DatabaseError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
 from django import forms
 from django.shortcuts import render, get_object_or_404
+from django.template.loader import render_to_string
 from django.urls import reverse, NoReverseMatch
 from django.http import HttpResponse, HttpResponseRedirect, Http404
 from django.contrib.admin.utils import NestedObjects
 from django.contrib import messages
 
+import json
+
 from postgresqleu.util.lists import flatten_list
+from postgresqleu.util.request import get_int_or_error
 from postgresqleu.confreg.util import get_authenticated_conference
 from postgresqleu.confreg.backendforms import BackendCopySelectConferenceForm
 
@@ -227,6 +233,127 @@ def backend_process_form(request, urlname, formclass, id, cancel_url='../', save
     })
 
 
+def _get_list_values(formclass, objects):
+    cache = {}
+    return [{
+        'id': o.pk,
+        'vals': [getattr(o, '_display_{0}'.format(f))(cache) if hasattr(o, '_display_{0}'.format(f)) else getattr(o, f) for f in formclass.list_fields],
+    } | dict(zip(["rowclass", "rowtitle"], formclass.get_rowclass_and_title(o, cache))) for o in objects]
+
+
+def _get_list_model_field(formclass, f):
+    # Get the model field for a list column, if it is a plain database column
+    # or foreign key. Returns None for properties and many-to-many fields.
+    try:
+        field = formclass.Meta.model._meta.get_field(f)
+    except Exception:
+        return None
+    if not field.concrete or field.many_to_many:
+        return None
+    return field
+
+
+def _filter_list_column(formclass, conference, objects, f, v):
+    # Filter on one of the column filter dropdowns. The value is the string
+    # representation of one of the options, or one of the special values.
+    if f in formclass.queryset_extra_fields:
+        objects = objects.annotate(**{'_filter_{}'.format(f): RawSQL(formclass.queryset_extra_fields[f], ())})
+        lookup = '_filter_{}'.format(f)
+        field = None
+    else:
+        field = _get_list_model_field(formclass, f)
+        if not field:
+            raise Http404("Cannot filter on this column")
+        lookup = f
+
+    if v in ('<Empty>', '<Any>'):
+        q = Q(**{'{}__isnull'.format(lookup): True})
+        if field is None or not (field.is_relation or field.get_internal_type() == 'BooleanField'):
+            q |= Q(**{lookup: ''})
+        return objects.filter(q) if v == '<Empty>' else objects.exclude(q)
+
+    if field is not None and field.get_internal_type() == 'BooleanField':
+        return objects.filter(**{lookup: v == 'true'})
+    if field is not None and field.is_relation:
+        options = formclass.get_column_filters(conference).get(formclass.get_field_verbose_name(f), [])
+        return objects.filter(**{'{}__in'.format(lookup): [o.pk for o in options if str(o) == v]})
+    return objects.filter(**{lookup: v})
+
+
+def _backend_list_serverside(request, formclass, objects, conference):
+    # Return one page of the list in the format used by the datatables
+    # "serverSide" mode, with the searching, sorting and paging done in SQL.
+    total = objects.count()
+
+    filtered = False
+    search = request.GET.get('search[value]', '').strip()
+    if search:
+        if formclass.list_search_fields is not None:
+            searchfields = formclass.list_search_fields
+        else:
+            searchfields = [f for f in formclass.list_fields if f in formclass.queryset_extra_fields or (
+                _get_list_model_field(formclass, f) and _get_list_model_field(formclass, f).get_internal_type() in ('CharField', 'TextField')
+            )]
+        q = Q()
+        for f in searchfields:
+            if f in formclass.queryset_extra_fields:
+                objects = objects.annotate(**{'_search_{}'.format(f): RawSQL(formclass.queryset_extra_fields[f], ())})
+                q |= Q(**{'_search_{}__icontains'.format(f): search})
+            else:
+                q |= Q(**{'{}__icontains'.format(f): search})
+        objects = objects.filter(q)
+        filtered = True
+
+    for i, f in enumerate(formclass.list_fields):
+        v = request.GET.get('columns[{}][search][value]'.format(i), '')
+        if v:
+            objects = _filter_list_column(formclass, conference, objects, f, v)
+            filtered = True
+
+    orderby = []
+    n = 0
+    while 'order[{}][column]'.format(n) in request.GET:
+        col = get_int_or_error(request.GET, 'order[{}][column]'.format(n))
+        if col < 0 or col >= len(formclass.list_fields):
+            raise Http404("Invalid column")
+        f = formclass.list_fields[col]
+        if f in formclass.queryset_extra_fields or _get_list_model_field(formclass, f):
+            orderby.append('{}{}'.format('-' if request.GET.get('order[{}][dir]'.format(n), '') == 'desc' else '', f))
+        n += 1
+    if orderby:
+        # Always end with the primary key, so paging is stable
+        objects = objects.order_by(*orderby, 'pk')
+
+    start = get_int_or_error(request.GET, 'start') if 'start' in request.GET else 0
+    length = min(max(get_int_or_error(request.GET, 'length', 100), 1), 1000)
+
+    context = {
+        'allow_email': formclass.allow_email,
+        'assignable_columns': formclass.get_assignable_columns(conference),
+    }
+    data = []
+    for o in _get_list_values(formclass, objects[start:start + length]):
+        row = dict((str(i), render_to_string('confreg/include/backend_list_cell.html', {
+            'v': v,
+            'first': i == 0,
+            'id': o['id'],
+        })) for i, v in enumerate(o['vals']))
+        if context['allow_email'] or context['assignable_columns']:
+            row[str(len(o['vals']))] = render_to_string('confreg/include/backend_list_checkboxes.html', dict(context, id=o['id']))
+        if o['rowclass']:
+            row['DT_RowClass'] = o['rowclass']
+        if o['rowtitle']:
+            row['DT_RowAttr'] = {'title': o['rowtitle']}
+        data.append(row)
+
+    return HttpResponse(json.dumps({
+        'draw': get_int_or_error(request.GET, 'draw') if 'draw' in request.GET else 0,
+        'recordsTotal': total,
+        'recordsFiltered': objects.count() if filtered else total,
+        'data': data,
+    }), content_type='application/json')
+
+
 def backend_list_editor(request, urlname, formclass, resturl, allow_new=True, allow_delete=True, allow_save=True, conference=None, breadcrumbs=[], bypass_conference_filter=False, instancemaker=None, return_url='../', topadmin=None, object_queryset=None):
     if not conference and not bypass_conference_filter:
         conference = get_authenticated_conference(request, urlname)
@@ -303,11 +430,13 @@ def backend_list_editor(request, urlname, formclass, resturl, allow_new=True, al
             else:
                 raise Http404()
 
-        cache = {}
-        values = [{
-            'id': o.pk,
-            'vals': [getattr(o, '_display_{0}'.format(f))(cache) if hasattr(o, '_display_{0}'.format(f)) else getattr(o, f) for f in formclass.list_fields],
-        } | dict(zip(["rowclass", "rowtitle"], formclass.get_rowclass_and_title(o, cache))) for o in objects]
+        if formclass.list_serverside:
+            if request.GET.get('format', None) == 'json':
+                return _backend_list_serverside(request, formclass, objects, conference)
+            # The rows are loaded using the json format by the browser
+            values = []
+        else:
+            values = _get_list_values(formclass, objects)
 
         return render(request, 'confreg/admin_backend_list.html', {
             'conference': conference,
@@ -329,6 +458,7 @@ def backend_list_editor(request, urlname, formclass, resturl, allow_new=True, al
             'assignable_columns': formclass.get_assignable_columns(conference),
             'breadcrumbs': breadcrumbs,
             'helplink': formclass.helplink,
+            'serverside': formclass.list_serverside,
         })
 
     if allow_new and resturl == 'new':
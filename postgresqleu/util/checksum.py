@@ -1,3 +1,5 @@
+import re
+
 from itertools import cycle
 
 
@@ -10,3 +12,32 @@ def luhn(s):
 
     f = sum(partial(int(c), f) for c, f in zip(s, factors))
     return -f % 10
+
+
+# Length of the IBAN for each country, from the SWIFT IBAN registry
+_iban_lengths = {
+    'AD': 24, 'AE': 23, 'AL': 28, 'AT': 20, 'AZ': 28, 'BA': 20, 'BE': 16, 'BG': 22,
+    'BH': 22, 'BI': 27, 'BR': 29, 'BY': 28, 'CH': 21, 'CR': 22, 'CY': 28, 'CZ': 24,
+    'DE': 22, 'DJ': 27, 'DK': 18, 'DO': 28, 'EE': 20, 'EG': 29, 'ES': 24, 'FI': 18,
+    'FK': 18, 'FO': 18, 'FR': 27, 'GB': 22, 'GE': 22, 'GI': 23, 'GL': 18, 'GR': 27,
+    'GT': 28, 'HR': 21, 'HU': 28, 'IE': 22, 'IL': 23, 'IQ': 23, 'IS': 26, 'IT': 27,
+    'JO': 30, 'KW': 30, 'KZ': 20, 'LB': 28, 'LC': 32, 'LI': 21, 'LT': 20, 'LU': 20,
+    'LV': 21, 'LY': 25, 'MC': 27, 'MD': 24, 'ME': 22, 'MK': 19, 'MN': 20, 'MR': 27,
+    'MT': 31, 'MU': 30, 'NI': 28, 'NL': 18, 'NO': 15, 'OM': 23, 'PK': 24, 'PL': 28,
+    'PS': 29, 'PT': 25, 'QA': 29, 'RO': 24, 'RS': 22, 'RU': 33, 'SA': 24, 'SC': 31,
+    'SD': 18, 'SE': 24, 'SI': 19, 'SK': 24, 'SM': 27, 'SO': 23, 'ST': 25, 'SV': 28,
+    'TL': 23, 'TN': 24, 'TR': 26, 'UA': 29, 'VA': 22, 'VG': 24, 'XK': 20, 'YE': 30,
+}
+_iban_re = re.compile(r'^[A-Z]{2}\d{2}[A-Z0-9]{11,30}$')
+
+
+def iban_valid(iban):
+    # Validate the structure and mod-97 checksum of an IBAN. Countries not in
+    # the length table are only checksum validated, so this can be used to
+    # rule out invalid numbers, but not to prove that the account exists.
+    iban = iban.replace(' ', '').upper()
+    if not _iban_re.match(iban):
+        return False
+    if _iban_lengths.get(iban[:2], len(iban)) != len(iban):
+        return False
+    return int(''.join(str(int(c, 36)) for c in iban[4:] + iban[:4])) % 97 == 1
@@ -1,14 +1,83 @@
-from django.db import connection
+from django.db import connection, connections
 from django.conf import settings
 import collections
+import contextlib
+import threading
+import time
 
+import psycopg2.extensions
 from psycopg2.extras import register_default_jsonb
 from psycopg2.tz import LocalTimezone
 
 
+_recorders = threading.local()
+
+
+class QueryRecorder(object):
+    # Record the number of times each SQL statement is run and the total time
+    # spent in the database while active. This covers both queries run through
+    # django, on all connections, and queries run on native cursors.
+    def __init__(self):
+        self.queries = collections.Counter()
+        self.dbtime = 0
+
+    @property
+    def numqueries(self):
+        return sum(self.queries.values())
+
+    def record(self, sql, duration):
+        self.queries[sql] += 1
+        self.dbtime += duration
+
+    def _execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - start)
+
+    def __enter__(self):
+        self._stack = contextlib.ExitStack()
+        for c in connections.all():
+            self._stack.enter_context(c.execute_wrapper(self._execute_wrapper))
+        if not hasattr(_recorders, 'active'):
+            _recorders.active = []
+        _recorders.active.append(self)
+        return self
+
+    def __exit__(self, *exc):
+        _recorders.active.remove(self)
+        self._stack.close()
+
+
+class _RecordingCursor(psycopg2.extensions.cursor):
+    def _record(self, sql, start):
+        duration = time.perf_counter() - start
+        for r in getattr(_recorders, 'active', []):
+            r.record(sql, duration)
+
+    def execute(self, sql, params=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self._record(sql, start)
+
+    def executemany(self, sql, params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, params)
+        finally:
+            self._record(sql, start)
+
+
 def get_native_cursor():
-    # Unwrap djangos many layers to get a raw psyopg2 cursor
-    curs = connection.cursor().cursor.connection.cursor()
+    # Unwrap djangos many layers to get a raw psyopg2 cursor. If any queries
+    # are being recorded, it has to report to them, since django won't see it.
+    if getattr(_recorders, 'active', None):
+        curs = connection.cursor().cursor.connection.cursor(cursor_factory=_RecordingCursor)
+    else:
+        curs = connection.cursor().cursor.connection.cursor()
     register_default_jsonb(curs, globally=False)
     return curs
 
@@ -86,6 +155,78 @@ def exec_to_grouped_dict(query, params=None):
     return full
 
 
+def bulk_insert_new(model, objects, keyfields):
+    """
+    Insert those of the model instances in objects that don't already exist
+    in the database, as identified by the values of the fields in keyfields.
+    This is intended for fetching transactions from a provider, where most of
+    the fetched ones are typically already known.
+
+    The existing keys are looked up with a single query, and the remaining
+    objects are inserted using INSERT ... ON CONFLICT DO NOTHING, which relies
+    on the key fields being covered by a unique constraint to be safe against
+    concurrent inserts, so that is required. Objects that were actually
+    inserted get their primary key set, and are returned in the same order as
+    they were passed in.
+    """
+    fields = [model._meta.get_field(f) for f in keyfields]
+
+    keynames = set(f.name for f in fields)
+    uniques = [(f.name, ) for f in model._meta.concrete_fields if f.unique]
+    uniques.extend(model._meta.unique_together)
+    uniques.extend(c.fields for c in model._meta.total_unique_constraints)
+    if not any(set(u) <= keynames for u in uniques):
+        raise Exception("Fields {} of {} are not covered by a unique constraint".format(", ".join(keyfields), model.__name__))
+
+    def _key(obj):
+        return tuple(f.to_python(getattr(obj, f.attname)) for f in fields)
+
+    # Remove any duplicates within the batch itself, keeping the first one
+    new = {}
+    for obj in objects:
+        new.setdefault(_key(obj), obj)
+    if not new:
+        return []
+
+    # Find the existing ones. This matches on each of the key fields separately,
+    # so it may return more rows than needed, but they are filtered below.
+    for k in model.objects.filter(**{
+            '{}__in'.format(f.attname): set(k[i] for k in new.keys()) for i, f in enumerate(fields)
+    }).values_list(*[f.attname for f in fields]):
+        new.pop(tuple(f.to_python(v) for f, v in zip(fields, k)), None)
+    if not new:
+        return []
+
+    insertfields = [f for f in model._meta.concrete_fields if f is not model._meta.auto_field]
+    qn = connection.ops.quote_name
+    inserted = []
+    objlist = list(new.values())
+    with connection.cursor() as curs:
+        for i in range(0, len(objlist), 1000):
+            chunk = objlist[i:i + 1000]
+            params = []
+            for obj in chunk:
+                params.extend([f.get_db_prep_save(f.pre_save(obj, True), connection) for f in insertfields])
+            curs.execute("INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING RETURNING {}, {}".format(
+                qn(model._meta.db_table),
+                ", ".join(qn(f.column) for f in insertfields),
+                ", ".join(["({})".format(", ".join(["%s"] * len(insertfields)))] * len(chunk)),
+                qn(model._meta.pk.column),
+                ", ".join(qn(f.column) for f in fields),
+            ), params)
+            pks = {tuple(f.to_python(v) for f, v in zip(fields, r[1:])): r[0] for r in curs.fetchall()}
+
+            for obj in chunk:
+                pk = pks.get(_key(obj), None)
+                if pk is not None:
+                    obj.pk = pk
+                    obj._state.adding = False
+                    obj._state.db = connection.alias
+                    inserted.append(obj)
+
+    return inserted
+
+
 class ensure_conference_timezone():
     """
     This context handler will set the timezone *in PostgreSQL* to the one from the
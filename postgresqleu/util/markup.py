@@ -1,10 +1,51 @@
+from django.conf import settings
+from django.core.cache import caches
+
+from collections import OrderedDict
+import hashlib
+import threading
+
 import markdown
 
 
+# Rendered markdown is cached by a hash of the source text and the extensions
+# used, since the same texts (such as session abstracts) are rendered over and
+# over again. The in-process tier is a bounded LRU, and if MARKDOWN_CACHE names
+# a django cache, that is used as a second tier shared between processes.
+_markdown_cache = OrderedDict()
+_markdown_cache_lock = threading.Lock()
+
+
+def render_markdown(value, extensions=(), cache=True):
+    if not cache:
+        return markdown.markdown(value, extensions=list(extensions))
+
+    key = hashlib.sha256('{}\0{}'.format(','.join(extensions), value).encode('utf8')).hexdigest()
+
+    with _markdown_cache_lock:
+        if key in _markdown_cache:
+            _markdown_cache.move_to_end(key)
+            return _markdown_cache[key]
+
+    html = None
+    if settings.MARKDOWN_CACHE:
+        html = caches[settings.MARKDOWN_CACHE].get('markdown_{}'.format(key))
+    if html is None:
+        html = markdown.markdown(value, extensions=list(extensions))
+        if settings.MARKDOWN_CACHE:
+            caches[settings.MARKDOWN_CACHE].set('markdown_{}'.format(key), html, settings.MARKDOWN_CACHE_TIMEOUT)
+
+    with _markdown_cache_lock:
+        _markdown_cache[key] = html
+        while len(_markdown_cache) > settings.MARKDOWN_CACHE_SIZE:
+            _markdown_cache.popitem(last=False)
+    return html
+
+
 # We do pure markdown and don't bother doing any filtering on the content
 # as for now anybody entering markdown is considered trusted.
-def pgmarkdown(value):
-    return markdown.markdown(value, extensions=['tables', ])
+def pgmarkdown(value, cache=True):
+    return render_markdown(value, ('tables', ), cache)
 
 
 # Wrapper class for a string that we want linebreaks to be visible in
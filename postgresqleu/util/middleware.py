@@ -4,8 +4,14 @@ from django.utils import timezone
 from django.conf import settings
 
 import base64
+import logging
+import time
 from urllib.parse import urlparse
 
+from postgresqleu.util.db import QueryRecorder
+
+log = logging.getLogger(__name__)
+
 
 class GlobalLoginMiddleware(object):
     def __init__(self, get_response):
@@ -67,3 +73,39 @@ class TzMiddleware(object):
     def __call__(self, request):
         timezone.deactivate()
         return self.get_response(request)
+
+
+# Record the number of SQL queries, the time spent in the database and the
+# total time for each request. This is returned in a Server-Timing header
+# (viewable in the browser developer tools) and logged, and a warning is
+# logged if the view runs more queries than REQUEST_QUERY_BUDGET.
+class QueryInstrumentationMiddleware(object):
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._instrumentation = {
+            'view': None,
+        }
+
+        start = time.perf_counter()
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        totaltime = (time.perf_counter() - start) * 1000
+
+        view = request._instrumentation['view'] or request.path
+        numqueries = recorder.numqueries
+        # The same SQL (with different parameters) run many times is a typical
+        # sign of queries being run in a loop.
+        repeated = sum(n - 1 for n in recorder.queries.values())
+        dbtime = recorder.dbtime * 1000
+
+        response['Server-Timing'] = 'db;desc="{} queries";dur={:.1f}, total;dur={:.1f}'.format(numqueries, dbtime, totaltime)
+        log.info("view=%s method=%s status=%s queries=%s repeated=%s dbtime=%.1f totaltime=%.1f", view, request.method, response.status_code, numqueries, repeated, dbtime, totaltime)
+        if settings.REQUEST_QUERY_BUDGET and numqueries > settings.REQUEST_QUERY_BUDGET:
+            log.warning("view=%s ran %s queries (%s repeated), exceeding the budget of %s", view, numqueries, repeated, settings.REQUEST_QUERY_BUDGET)
+
+        return response
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        request._instrumentation['view'] = '{}.{}'.format(callback.__module__, getattr(callback, '__qualname__', callback.__class__.__name__))
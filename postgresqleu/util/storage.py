@@ -1,6 +1,6 @@
 from django.db import connection
 
-from postgresqleu.util.db import exec_to_scalar
+from postgresqleu.util.db import exec_to_scalar, exec_to_keyed_scalar
 
 
 class InlineEncodedStorage(object):
@@ -35,6 +35,12 @@ class InlineEncodedStorage(object):
             'id': name,
         })
 
+    def get_tags(self, names):
+        return exec_to_keyed_scalar("SELECT storageid, encode(hashval, 'hex') FROM util_storage WHERE key=%(key)s AND storageid=ANY(%(ids)s)", {
+            'key': self.key,
+            'ids': list(names),
+        })
+
 
 def inlineencoded_upload_path(instance, filename):
     # Needs to exist for old migrations, but *NOT* in use
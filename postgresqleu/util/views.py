@@ -23,7 +23,8 @@ def markdown_preview(request):
     if request.headers.get('x-preview', None) != 'md':
         raise Http404()
 
-    return HttpResponse(pgmarkdown(request.body.decode('utf8', 'ignore')))
+    # Previews are of texts being edited, so don't fill the cache with them
+    return HttpResponse(pgmarkdown(request.body.decode('utf8', 'ignore'), cache=False))
 
 
 @csrf_exempt
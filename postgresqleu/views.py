@@ -11,9 +11,9 @@ from postgresqleu.invoices.models import InvoiceRefund
 
 from postgresqleu.util.db import exec_to_dict, conditional_exec_to_scalar
 from postgresqleu.util.time import today_global
+from postgresqleu.util.markup import render_markdown
 
 import datetime
-import markdown
 
 
 # Handle the frontpage
@@ -43,7 +43,7 @@ UNION ALL
 SELECT id, confurl, urlname, datetime, title, summary, priosort FROM conf
 ORDER BY priosort DESC, datetime DESC LIMIT 5""")
     for n in news:
-        n['summaryhtml'] = markdown.markdown(n['summary'])
+        n['summaryhtml'] = render_markdown(n['summary'])
         if n['confurl']:
             n['itemlink'] = '/events/{0}/news/{1}-{2}/'.format(
                 n['urlname'],
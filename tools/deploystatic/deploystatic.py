@@ -16,10 +16,14 @@ import unicodedata
 import io
 import subprocess
 import tarfile
+import tempfile
 import copy
+import hashlib
+import multiprocessing
 
 import markupsafe
 import jinja2
+import jinja2.meta
 import jinja2.sandbox
 try:
     from jinja2 import pass_context
@@ -138,6 +142,9 @@ class SourceWrapper(object):
 
     def copy_if_changed(self, relsource, fulldest):
         fullsrc = os.path.join(self.root, relsource)
+        # filecmp will consider files with the same size and mtime equal without
+        # reading them (and copy2 preserves the mtime), and files with a different
+        # size different, so the contents are only read when necessary.
         if (not os.path.exists(fulldest)) or (not filecmp.cmp(fullsrc, fulldest)):
             shutil.copy2(fullsrc, fulldest)
 
@@ -152,7 +159,9 @@ class SourceWrapper(object):
 # Wrap operations on a tarfile
 class TarWrapper(object):
     def __init__(self, tarstream):
-        self.tardata = io.BytesIO()
+        # Spool the tarfile to disk rather than memory, since we need random
+        # access to it but it can be large.
+        self.tardata = tempfile.TemporaryFile()
         shutil.copyfileobj(tarstream, self.tardata)
         self.tardata.seek(0)
         self.tarfile = tarfile.open(fileobj=self.tardata)
@@ -183,17 +192,31 @@ class TarWrapper(object):
             if os.path.dirname(k) == d:
                 yield os.path.basename(k)
 
-    def copy_if_changed(self, relsource, fulldest):
-        sourcedata = self.readfile(relsource)
+    def _is_unchanged(self, relsource, fulldest):
+        if not os.path.isfile(fulldest):
+            return False
+
+        # Different size means changed, without having to look at the contents
+        if os.path.getsize(fulldest) != self.tarstruct[relsource].size:
+            return False
+
+        # Same size, so compare the contents, one block at a time
+        src = self.tarfile.extractfile(relsource)
+        with open(fulldest, 'rb') as f:
+            while True:
+                a = src.read(65536)
+                b = f.read(65536)
+                if a != b:
+                    return False
+                if not a:
+                    return True
 
-        if os.path.isfile(fulldest):
-            with open(fulldest, 'rb') as f:
-                x = f.read()
-                if x == sourcedata:
-                    return
+    def copy_if_changed(self, relsource, fulldest):
+        if self._is_unchanged(relsource, fulldest):
+            return
 
         with open(fulldest, 'wb') as f:
-            f.write(sourcedata)
+            shutil.copyfileobj(self.tarfile.extractfile(relsource), f)
 
 
 class JinjaTarLoader(jinja2.BaseLoader):
@@ -259,14 +282,89 @@ def find_git_revision(path):
     return None
 
 
+# Track which templates and context variables each page depends on, so
+# pages can be skipped when none of their inputs have changed since the
+# last run.
+class DependencyTracker(object):
+    manifestname = '.deploystatic_manifest'
+
+    def __init__(self, env, source, destpath):
+        self.env = env
+        self.source = source
+        self.destpath = destpath
+        self.templates = {}
+
+        try:
+            with open(os.path.join(destpath, self.manifestname), encoding='utf8') as f:
+                self.oldmanifest = json.load(f)
+        except (IOError, ValueError):
+            self.oldmanifest = {}
+        self.manifest = {}
+
+    def _template_info(self, name):
+        if name not in self.templates:
+            src = self.source.readfile(os.path.join('templates', name))
+            if src is None:
+                # Not found, so let the actual rendering report the error
+                self.templates[name] = None
+            else:
+                try:
+                    ast = self.env.parse(src.decode('utf8'))
+                    self.templates[name] = (
+                        hashlib.sha256(src).hexdigest(),
+                        list(jinja2.meta.find_referenced_templates(ast)),
+                        jinja2.meta.find_undeclared_variables(ast),
+                    )
+                except jinja2.exceptions.TemplateSyntaxError:
+                    self.templates[name] = None
+        return self.templates[name]
+
+    def page_key(self, template, context):
+        # Return a hash of everything that can affect the output of this
+        # template, or None if that cannot be determined.
+        hashes = {}
+        variables = set()
+        tovisit = [template]
+        while tovisit:
+            t = tovisit.pop()
+            if t in hashes:
+                continue
+            info = self._template_info(t)
+            if info is None:
+                return None
+            (hashval, references, undeclared) = info
+            if None in references:
+                # Dynamically computed template name, so we can't know
+                return None
+            hashes[t] = hashval
+            variables.update(undeclared)
+            tovisit.extend(references)
+
+        return hashlib.sha256(json.dumps(
+            [
+                sorted(hashes.items()),
+                {k: context[k] for k in sorted(variables) if k in context},
+            ],
+            sort_keys=True,
+            default=str,
+        ).encode('utf8')).hexdigest()
+
+    def is_unchanged(self, destfile, key):
+        relname = os.path.relpath(destfile, self.destpath)
+        if key is None:
+            return False
+        self.manifest[relname] = key
+        return self.oldmanifest.get(relname, None) == key and os.path.isfile(destfile)
+
+    def write(self):
+        with open(os.path.join(self.destpath, self.manifestname), 'w', encoding='utf8') as f:
+            json.dump(self.manifest, f, sort_keys=True, indent=1)
+
+
 # Actual deployment function
-def deploy_template(env, template, destfile, context):
+def render_template(env, template, destfile, context):
     t = env.get_template(template)
-    try:
-        s = t.render(**context)
-    except jinja2.exceptions.TemplateSyntaxError as e:
-        print("ERROR: Jinja template syntax error in {}: {}".format(template, e))
-        sys.exit(1)
+    s = t.render(**context)
 
     # Only write the file if it has actually changed
     if os.path.isfile(destfile):
@@ -278,6 +376,46 @@ def deploy_template(env, template, destfile, context):
         f.write(s)
 
 
+def deploy_template(env, template, destfile, context):
+    try:
+        render_template(env, template, destfile, context)
+    except jinja2.exceptions.TemplateSyntaxError as e:
+        print("ERROR: Jinja template syntax error in {}: {}".format(template, e))
+        sys.exit(1)
+
+
+# Parallel deployment. Each worker process gets its own environment, with
+# all templates and the context loaded once when the worker starts.
+_worker = {}
+
+
+def _init_worker(templates, context):
+    _worker['env'] = DeploySandbox(loader=jinja2.DictLoader(templates))
+    _worker['env'].filters.update(global_filters)
+    _worker['context'] = context
+
+
+def _deploy_worker(job):
+    (template, destfile, page) = job
+    _worker['context']['page'] = page
+    try:
+        render_template(_worker['env'], template, destfile, _worker['context'])
+    except jinja2.exceptions.TemplateSyntaxError as e:
+        return "ERROR: Jinja template syntax error in {}: {}".format(template, e)
+    return None
+
+
+def _load_all_templates(source):
+    templates = {}
+    for relpath, fn in source.walkfiles('templates'):
+        try:
+            templates[os.path.join(relpath, fn)[len('templates/'):]] = source.readfile(os.path.join(relpath, fn)).decode('utf8')
+        except UnicodeDecodeError:
+            # Not a template
+            pass
+    return templates
+
+
 def _deploy_static(source, destpath):
     knownfiles = []
     # We could use copytree(), but we need to know which files are there so we can
@@ -302,6 +440,8 @@ def _get_all_parent_directories(dirlist):
 
 
 def remove_unknown(knownfiles, destpath):
+    knownfiles = set(knownfiles)
+
     # Build a list of known directories. This includes any directories with
     # files in them, but also parents of any such directories (recursively).
     knowndirs = set([os.path.dirname(f) for f in knownfiles])
@@ -330,6 +470,8 @@ if __name__ == "__main__":
     parser.add_argument('destpath', type=str, help='Destination absolute path (contents will be erased!)')
     parser.add_argument('--branch', type=str, help='Deploy directly from branch')
     parser.add_argument('--templates', action='store_true', help='Deploy templates (except pages) and static instead of pages')
+    parser.add_argument('--incremental', action='store_true', help='Only render pages whose templates or context have changed since the last run')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of parallel processes to render pages with')
 
     args = parser.parse_args()
 
@@ -427,19 +569,20 @@ if __name__ == "__main__":
     knownfiles = []
     knownfiles = _deploy_static(source, args.destpath)
 
+    if args.incremental:
+        tracker = DependencyTracker(env, source, args.destpath)
+        knownfiles.append(DependencyTracker.manifestname)
+    else:
+        tracker = None
+
     # If we have a .deploystaticmap, parse that one instead of the full list of
     # parsing everything.
+    pages = []
     fmap = source.readfile('templates/pages/.deploystaticmap')
     if fmap:
         for line in fmap.splitlines():
             (src, dest) = line.decode('utf8').split(':')
-            if not os.path.isdir(os.path.join(args.destpath, dest)):
-                os.makedirs(os.path.join(args.destpath, dest))
-            context['page'] = dest
-            deploy_template(env, os.path.join('pages', src),
-                            os.path.join(args.destpath, dest, 'index.html'),
-                            context)
-            knownfiles.append(os.path.join(dest, 'index.html'))
+            pages.append((os.path.join('pages', src), dest))
     else:
         for relpath, fn in source.walkfiles('templates/pages'):
             # We only process HTML files in templates
@@ -458,15 +601,32 @@ if __name__ == "__main__":
                 else:
                     destdir = '{0}/{1}'.format(relpath[len('templates/pages/'):], noext)
 
-            if not os.path.isdir(os.path.join(args.destpath, destdir)):
-                os.makedirs(os.path.join(args.destpath, destdir))
+            pages.append((os.path.join(relpath[len('templates/'):], fn), destdir))
 
-            context['page'] = destdir
+    torender = []
+    for template, destdir in pages:
+        if not os.path.isdir(os.path.join(args.destpath, destdir)):
+            os.makedirs(os.path.join(args.destpath, destdir))
 
-            deploy_template(env, os.path.join(relpath[len('templates/'):], fn),
-                            os.path.join(args.destpath, destdir, 'index.html'),
-                            context)
+        destfile = os.path.join(args.destpath, destdir, 'index.html')
+        context['page'] = destdir
+        if not (tracker and tracker.is_unchanged(destfile, tracker.page_key(template, context))):
+            torender.append((template, destfile, destdir))
+
+        knownfiles.append(os.path.join(destdir, 'index.html'))
+
+    if args.jobs > 1 and len(torender) > 1:
+        with multiprocessing.Pool(args.jobs, initializer=_init_worker, initargs=(_load_all_templates(source), context)) as pool:
+            for err in pool.imap_unordered(_deploy_worker, torender, chunksize=max(1, len(torender) // (args.jobs * 4))):
+                if err:
+                    print(err)
+                    sys.exit(1)
+    else:
+        for template, destfile, destdir in torender:
+            context['page'] = destdir
+            deploy_template(env, template, destfile, context)
 
-            knownfiles.append(os.path.join(destdir, 'index.html'))
+    if tracker:
+        tracker.write()
 
     remove_unknown(knownfiles, args.destpath)